@@ -0,0 +1,77 @@
+"""
+Costo de autenticación por petición en el API: sesión vs token firmado.
+
+    python -m benchmarks.auth_api --peticiones 500 --json bench_auth.json
+
+Cada petición es un GET a /api/estadisticas/: tras el calentamiento la vista
+responde desde la caché sin consultas propias, así que todo lo que se mide
+además del enrutado es autenticar. Con sesión cada petición lee
+django_session y auth_user; con token la firma se verifica en memoria y el
+usuario sale de la caché, sin consultas a la BD.
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.entorno import base_de_datos_temporal
+from benchmarks import resultados
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from productos.authentication import emitir_token
+
+URL = '/api/estadisticas/'
+
+
+def medir(client, peticiones, **cabeceras):
+    cache.clear()
+    client.get(URL, **cabeceras)  # calentamiento: caché de usuario y de estadísticas
+
+    tiempos = []
+    with CaptureQueriesContext(connection) as consultas:
+        for _ in range(peticiones):
+            inicio = time.perf_counter()
+            respuesta = client.get(URL, **cabeceras)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+            assert respuesta.status_code == 200, respuesta.status_code
+
+    return {
+        'peticiones': peticiones,
+        'media_ms': round(statistics.mean(tiempos), 3),
+        'mediana_ms': round(statistics.median(tiempos), 3),
+        'consultas_por_peticion': round(len(consultas) / peticiones, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--peticiones', type=int, default=500)
+    parser.add_argument('--json', help='Ruta donde guardar los resultados')
+    args = parser.parse_args()
+
+    with base_de_datos_temporal():
+        user = User.objects.create_user('bench_api', 'bench_api@example.com', 'Bench-clave-123')
+
+        sesion = Client()
+        sesion.force_login(user)
+        token = Client()
+
+        tabla = {
+            'sesion': medir(sesion, args.peticiones),
+            'token': medir(token, args.peticiones, HTTP_AUTHORIZATION=f'Token {emitir_token(user)}'),
+        }
+
+    for nombre, fila in tabla.items():
+        print(f"{nombre:<8} media {fila['media_ms']:>7.3f} ms  mediana {fila['mediana_ms']:>7.3f} ms  "
+              f"consultas/petición {fila['consultas_por_peticion']}")
+
+    if args.json:
+        resultados.guardar(args.json, 'auth_api', tabla, vars(args))
+
+
+if __name__ == '__main__':
+    main()
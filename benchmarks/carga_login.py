@@ -0,0 +1,62 @@
+"""
+Ráfaga de credential stuffing contra /login/ para medir el costo de CPU por
+lote de peticiones con y sin límite de peticiones.
+
+    python -m benchmarks.carga_login --peticiones 200 --lote 20
+
+Sin límite cada intento paga el hash de la contraseña, así que la CPU por lote
+es constante y alta. Con límite solo los primeros intentos llegan a
+``authenticate()``; el resto se rechaza con 429 y la CPU por lote cae a casi
+cero y se mantiene plana.
+"""
+import argparse
+import logging
+import time
+
+from benchmarks.entorno import base_de_datos_temporal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import Client, override_settings
+
+
+def rafaga(peticiones, lote):
+    client = Client(REMOTE_ADDR='203.0.113.7')
+    cpu_por_lote = []
+    estados = {}
+
+    for inicio in range(0, peticiones, lote):
+        cpu_inicio = time.process_time()
+        for i in range(inicio, min(inicio + lote, peticiones)):
+            respuesta = client.post('/login/', {'username': 'victima', 'password': f'intento-{i}'})
+            estados[respuesta.status_code] = estados.get(respuesta.status_code, 0) + 1
+        cpu_por_lote.append((time.process_time() - cpu_inicio) * 1000)
+
+    return cpu_por_lote, estados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--peticiones', type=int, default=200)
+    parser.add_argument('--lote', type=int, default=20)
+    args = parser.parse_args()
+
+    # Cada 429 genera un warning en django.request; no interesa en la salida
+    logging.getLogger('django.request').setLevel(logging.ERROR)
+
+    with base_de_datos_temporal():
+        User.objects.create_user('victima', 'victima@example.com', 'clave-Segura-123')
+
+        for activo in (False, True):
+            cache.clear()
+            with override_settings(RATELIMIT_ACTIVO=activo):
+                cpu_por_lote, estados = rafaga(args.peticiones, args.lote)
+
+            print(f"\n🛡️  Límite de peticiones {'ACTIVO' if activo else 'INACTIVO'}")
+            print(f"   Respuestas por código HTTP: {estados}")
+            print("   CPU por lote (ms): " + ', '.join(f'{ms:.0f}' for ms in cpu_por_lote))
+            print(f"   CPU total: {sum(cpu_por_lote):.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Escrituras concurrentes al carrito sobre SQLite: journal por defecto vs WAL.
+
+    python -m benchmarks.carrito_concurrente --hilos 8 --duracion 5 --json bench_carrito.json
+
+Cada hilo es un cliente con su propio usuario que hace POST
+/ajax/carrito/agregar/ en bucle sobre la misma BD en archivo. Se cuentan
+las escrituras confirmadas y las que fallaron (``database is locked``, que
+la vista devuelve como success=false) en cada configuración:
+
+- por_defecto: journal rollback, synchronous=FULL, transacciones DEFERRED
+- wal: los SQLITE_PRAGMAS de settings con transacciones DEFERRED
+- wal_immediate: los SQLITE_PRAGMAS y transaction_mode=IMMEDIATE (settings)
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from benchmarks.entorno import base_de_datos_temporal
+from benchmarks import resultados
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client, override_settings
+
+from productos.models import Categoria, ItemCarrito, Producto
+from productos.usuarios import crear_usuario
+
+URL = '/ajax/carrito/agregar/'
+
+ESCENARIOS = {
+    'por_defecto': ({'journal_mode': 'DELETE', 'synchronous': 'FULL'}, None),
+    'wal': (settings.SQLITE_PRAGMAS, None),
+    'wal_immediate': (settings.SQLITE_PRAGMAS, 'IMMEDIATE'),
+}
+
+
+def medir(usuarios, productos, duracion, pragmas, modo_transaccion):
+    opciones = connection.settings_dict.setdefault('OPTIONS', {})
+    opciones.pop('transaction_mode', None)
+    if modo_transaccion:
+        opciones['transaction_mode'] = modo_transaccion
+    ItemCarrito.objects.all().delete()
+    connection.close()
+
+    latencias, fallos = [], []
+    candado = threading.Lock()
+    barrera = threading.Barrier(len(usuarios))
+
+    def cliente(indice, usuario):
+        client = Client()
+        client.force_login(usuario)
+        propias, errores, n = [], 0, 0
+        barrera.wait()
+        fin = time.monotonic() + duracion
+        try:
+            while time.monotonic() < fin:
+                producto = productos[(indice + n) % len(productos)]
+                n += 1
+                inicio = time.perf_counter()
+                respuesta = client.post(URL, {'producto_id': producto, 'cantidad': 1}, content_type='application/json')
+                if respuesta.json().get('success'):
+                    propias.append((time.perf_counter() - inicio) * 1000)
+                else:
+                    errores += 1
+        finally:
+            connection.close()  # conexión propia del hilo
+        with candado:
+            latencias.extend(propias)
+            fallos.append(errores)
+
+    with override_settings(SQLITE_PRAGMAS=pragmas):
+        hilos = [threading.Thread(target=cliente, args=(i, u)) for i, u in enumerate(usuarios)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        connection.close()
+
+    return {
+        'hilos': len(usuarios),
+        'escrituras': len(latencias),
+        'escrituras_por_segundo': round(len(latencias) / duracion, 1),
+        'fallidas': sum(fallos),
+        'mediana_ms': round(statistics.median(latencias), 3) if latencias else None,
+        'p95_ms': round(statistics.quantiles(latencias, n=20)[-1], 3) if len(latencias) > 1 else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hilos', type=int, default=8)
+    parser.add_argument('--duracion', type=float, default=5, help='Segundos por escenario')
+    parser.add_argument('--json', help='Ruta donde guardar los resultados')
+    args = parser.parse_args()
+
+    if connection.vendor != 'sqlite':
+        parser.error('Este benchmark es para SQLite (GAMERLY_DB=sqlite)')
+
+    with base_de_datos_temporal(en_archivo=True):
+        categoria = Categoria.objects.create(nombre='Consolas')
+        productos = [p.pk for p in Producto.objects.bulk_create([
+            Producto(nombre=f'Producto {i}', descripcion='-', precio=100000, categoria=categoria, stock=10 ** 6)
+            for i in range(20)
+        ])]
+        usuarios = [crear_usuario(f'bench_carrito_{i}', f'bench_carrito_{i}@example.com', 'Bench-clave-123')
+                    for i in range(args.hilos)]
+
+        tabla = {
+            nombre: medir(usuarios, productos, args.duracion, pragmas, modo)
+            for nombre, (pragmas, modo) in ESCENARIOS.items()
+        }
+
+    for nombre, fila in tabla.items():
+        print(f"{nombre:<14} {fila['escrituras_por_segundo']:>8.1f} escrituras/s  fallidas {fila['fallidas']:>5}  "
+              f"mediana {fila['mediana_ms']} ms  p95 {fila['p95_ms']} ms")
+
+    if args.json:
+        resultados.guardar(args.json, 'carrito_concurrente', tabla, vars(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+Compara dos archivos de resultados (mismo formato de benchmarks.resultados) y
+marca regresiones en las métricas *_ms.
+
+    python -m benchmarks.comparar base.json nuevo.json --umbral 10
+
+Sale con código 1 si alguna métrica empeora más que ``--umbral`` por ciento.
+"""
+import argparse
+import json
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base')
+    parser.add_argument('nuevo')
+    parser.add_argument('--umbral', type=float, default=10.0, help='Porcentaje tolerado (default: 10)')
+    args = parser.parse_args()
+
+    with open(args.base, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(args.nuevo, encoding='utf-8') as f:
+        nuevo = json.load(f)
+
+    print(f"Comparando {base.get('commit')} → {nuevo.get('commit')} ({base['suite']})")
+    regresiones = 0
+    for nombre, metricas in nuevo['resultados'].items():
+        anteriores = base['resultados'].get(nombre)
+        if not anteriores:
+            print(f'  {nombre}: nuevo caso, sin referencia')
+            continue
+        for metrica, valor in metricas.items():
+            anterior = anteriores.get(metrica)
+            if not metrica.endswith('_ms') or not anterior or valor is None:
+                continue
+            cambio = (valor - anterior) / anterior * 100
+            marca = '❌' if cambio > args.umbral else ('✅' if cambio < -args.umbral else '  ')
+            regresiones += cambio > args.umbral
+            print(f'{marca} {nombre:<40} {metrica:<14} {anterior:>10.2f} → {valor:>10.2f} ({cambio:+.1f}%)')
+
+    sys.exit(1 if regresiones else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Latencia por petición abriendo una conexión nueva vs reutilizándola.
+
+    python -m benchmarks.conexiones --peticiones 300 --json bench_conexiones.json
+    GAMERLY_DB=mysql python -m benchmarks.conexiones      # contra MySQL/MariaDB local
+
+Simula lo que hace el handler real en cada petición: close_old_connections()
+en request_started y request_finished (el Client de pruebas lo desactiva).
+Con CONN_MAX_AGE=0 eso cierra la conexión al terminar y la siguiente
+petición vuelve a conectarse (y con MySQL: TCP, autenticación e
+init_command); con CONN_MAX_AGE>0 la conexión sobrevive, y con
+CONN_HEALTH_CHECKS se agrega un ping al retomarla en cada petición.
+
+Con SQLite la BD temporal va en un archivo; conectar es barato, así que la
+diferencia es mucho menor que con un servidor de BD.
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.entorno import base_de_datos_temporal
+from benchmarks import resultados
+
+from django.core.cache import cache
+from django.db import close_old_connections, connection
+from django.db.backends.signals import connection_created
+from django.test import Client
+
+from productos.models import Categoria, Producto
+
+URL = '/'
+
+ESCENARIOS = {
+    'sin_reutilizar': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False},
+    'reutilizar': {'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': False},
+    'reutilizar_health_check': {'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True},
+}
+
+
+def medir(client, peticiones, ajustes):
+    connection.close()
+    connection.settings_dict.update(ajustes)  # se leen al conectar
+
+    conexiones = []
+    contar = lambda sender, connection, **kwargs: conexiones.append(1)  # noqa: E731
+    connection_created.connect(contar)
+
+    tiempos = []
+    try:
+        for _ in range(peticiones):
+            cache.clear()  # que cada petición llegue a la BD
+            inicio = time.perf_counter()
+            close_old_connections()
+            respuesta = client.get(URL)
+            close_old_connections()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+            assert respuesta.status_code == 200, respuesta.status_code
+    finally:
+        connection_created.disconnect(contar)
+
+    return {
+        'peticiones': peticiones,
+        'media_ms': round(statistics.mean(tiempos), 3),
+        'mediana_ms': round(statistics.median(tiempos), 3),
+        'p95_ms': round(statistics.quantiles(tiempos, n=20)[-1], 3),
+        'conexiones_abiertas': len(conexiones),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--peticiones', type=int, default=300)
+    parser.add_argument('--json', help='Ruta donde guardar los resultados')
+    args = parser.parse_args()
+
+    with base_de_datos_temporal(en_archivo=True):
+        categoria = Categoria.objects.create(nombre='Consolas')
+        Producto.objects.bulk_create([
+            Producto(nombre=f'Producto {i}', descripcion='-', precio=100000, categoria=categoria,
+                     stock=5, destacado=i < 8)
+            for i in range(50)
+        ])
+
+        client = Client()
+        client.get(URL)  # calentamiento: plantillas y URLconf
+        tabla = {nombre: medir(client, args.peticiones, ajustes) for nombre, ajustes in ESCENARIOS.items()}
+
+    print(f'Motor: {connection.vendor}')
+    for nombre, fila in tabla.items():
+        print(f"{nombre:<24} media {fila['media_ms']:>7.3f} ms  mediana {fila['mediana_ms']:>7.3f} ms  "
+              f"p95 {fila['p95_ms']:>7.3f} ms  conexiones {fila['conexiones_abiertas']}")
+
+    if args.json:
+        resultados.guardar(args.json, 'conexiones', tabla, {**vars(args), 'motor': connection.vendor})
+
+
+if __name__ == '__main__':
+    main()
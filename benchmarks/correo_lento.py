@@ -0,0 +1,16 @@
+"""
+Backend de email para benchmarks: simula la latencia de un relay SMTP y guarda
+los mensajes en memoria. Usar con::
+
+    GAMERLY_EMAIL_BACKEND=benchmarks.correo_lento.EmailBackend GAMERLY_SMTP_LATENCIA=0.3
+"""
+import os
+import time
+
+from django.core.mail.backends.locmem import EmailBackend as LocMemEmailBackend
+
+
+class EmailBackend(LocMemEmailBackend):
+    def send_messages(self, messages):
+        time.sleep(float(os.environ.get('GAMERLY_SMTP_LATENCIA', '0.3')))
+        return super().send_messages(messages)
@@ -0,0 +1,14 @@
+"""Datos sintéticos para los benchmarks (delegan en productos.generador_datos)"""
+from django.contrib.auth.models import User
+
+from productos.generador_datos import GeneradorDatos
+
+PASSWORD = 'Bench-clave-123'
+
+
+def generar(categorias=10, productos=1000, usuarios=50, items_por_carrito=5, semilla=42):
+    """Crea el catálogo y usuarios bench_N con carrito; retorna los usuarios creados"""
+    generador = GeneradorDatos(semilla=semilla, lote=1000, prefijo='bench', password=PASSWORD)
+    generador.generar(categorias=categorias, productos=productos, usuarios=usuarios,
+                      max_items_carrito=items_por_carrito)
+    return list(User.objects.filter(username__startswith='bench_'))
@@ -0,0 +1,32 @@
+"""Utilidades compartidas por los scripts de benchmarks (ejecutar con ``python -m benchmarks.<script>``)"""
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tienda.settings')
+django.setup()
+
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+
+@contextmanager
+def base_de_datos_temporal(en_archivo=False):
+    """
+    Crea una BD de pruebas desechable para no tocar db.sqlite3. Con SQLite es
+    en memoria salvo ``en_archivo=True`` (cerrar una BD en memoria no la
+    cierra de verdad, así que no sirve para medir conexiones)
+    """
+    setup_test_environment()
+    nombre_original = connection.settings_dict['NAME']
+    if en_archivo and connection.vendor == 'sqlite':
+        connection.settings_dict['TEST']['NAME'] = str(Path(tempfile.mkdtemp()) / 'benchmark.sqlite3')
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(nombre_original, verbosity=0)
+        teardown_test_environment()
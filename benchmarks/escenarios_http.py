@@ -0,0 +1,155 @@
+"""
+Escenario HTTP estilo locust contra un servidor local: usuarios virtuales con
+sesión iniciada que recorren home, dashboard, /api/productos/ y los endpoints
+AJAX del carrito con pesos y tiempo de espera aleatorio.
+
+1. Preparar datos y sesiones en la BD que usa el servidor::
+
+    python -m benchmarks.escenarios_http preparar --generar --usuarios 50 --sesiones /tmp/sesiones.json
+
+2. Con el servidor levantado (runserver, gunicorn, uvicorn...)::
+
+    python -m benchmarks.escenarios_http correr --url http://127.0.0.1:8000 \\
+        --sesiones /tmp/sesiones.json --usuarios-virtuales 20 --duracion 30 --json bench_http.json
+"""
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+
+# nombre: (peso, método, ruta)
+TAREAS = {
+    'home': (3, 'GET', '/'),
+    'dashboard': (3, 'GET', '/dashboard/'),
+    'api_productos': (2, 'GET', '/api/productos/'),
+    'carrito_items': (2, 'GET', '/ajax/carrito/items/'),
+    'carrito_info': (2, 'GET', '/api/carrito-info/'),
+    'agregar_al_carrito': (1, 'POST', '/ajax/carrito/agregar/'),
+}
+
+
+def preparar(usuarios, ruta_sesiones, generar):
+    from benchmarks import entorno  # noqa: F401  (configura Django)
+    from benchmarks import datos
+    from django.conf import settings
+    from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+    from django.contrib.auth.models import User
+    from django.contrib.sessions.backends.db import SessionStore
+    from productos.models import Producto
+
+    if generar:
+        datos.generar(usuarios=usuarios)
+
+    sesiones = []
+    for user in User.objects.filter(username__startswith='bench_')[:usuarios]:
+        sesion = SessionStore()
+        sesion[SESSION_KEY] = str(user.pk)
+        sesion[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        sesion[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        sesion.create()
+        sesiones.append(sesion.session_key)
+
+    productos = list(Producto.objects.filter(estado='disponible', stock__gt=100).values_list('id', flat=True)[:200])
+    with open(ruta_sesiones, 'w', encoding='utf-8') as f:
+        json.dump({'sesiones': sesiones, 'productos': productos}, f)
+    print(f'✅ {len(sesiones)} sesiones y {len(productos)} productos guardados en {ruta_sesiones}')
+
+
+def correr(base_url, sesiones, productos, usuarios_virtuales, duracion, espera):
+    latencias = {nombre: [] for nombre in TAREAS}
+    errores = {nombre: 0 for nombre in TAREAS}
+    candado = threading.Lock()
+    nombres = list(TAREAS)
+    pesos = [TAREAS[nombre][0] for nombre in nombres]
+    fin = time.monotonic() + duracion
+
+    def usuario_virtual(indice):
+        rng = random.Random(indice)
+        cookie = f'sessionid={sesiones[indice % len(sesiones)]}'
+        while time.monotonic() < fin:
+            nombre = rng.choices(nombres, pesos)[0]
+            _, metodo, ruta = TAREAS[nombre]
+            cuerpo = None
+            if metodo == 'POST':
+                cuerpo = json.dumps({'producto_id': rng.choice(productos), 'cantidad': 1}).encode()
+            peticion = urllib.request.Request(f'{base_url}{ruta}', data=cuerpo, method=metodo,
+                                              headers={'Cookie': cookie, 'Content-Type': 'application/json'})
+            inicio = time.perf_counter()
+            try:
+                with urllib.request.urlopen(peticion, timeout=30) as respuesta:
+                    respuesta.read()
+                    ok = respuesta.status < 400
+            except (urllib.error.URLError, OSError):
+                ok = False
+            transcurrido = (time.perf_counter() - inicio) * 1000
+            with candado:
+                if ok:
+                    latencias[nombre].append(transcurrido)
+                else:
+                    errores[nombre] += 1
+            if espera:
+                time.sleep(rng.uniform(0, espera))
+
+    hilos = [threading.Thread(target=usuario_virtual, args=(i,)) for i in range(usuarios_virtuales)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    tabla = {}
+    for nombre, valores in latencias.items():
+        valores.sort()
+        tabla[nombre] = {
+            'peticiones': len(valores),
+            'errores': errores[nombre],
+            'rps': round(len(valores) / duracion, 2),
+            'p50_ms': round(statistics.median(valores), 1) if valores else None,
+            'p95_ms': round(valores[max(int(len(valores) * 0.95) - 1, 0)], 1) if valores else None,
+            'p99_ms': round(valores[max(int(len(valores) * 0.99) - 1, 0)], 1) if valores else None,
+        }
+    return tabla
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    p_preparar = sub.add_parser('preparar')
+    p_preparar.add_argument('--usuarios', type=int, default=50)
+    p_preparar.add_argument('--sesiones', required=True)
+    p_preparar.add_argument('--generar', action='store_true', help='Generar catálogo y usuarios sintéticos antes')
+
+    p_correr = sub.add_parser('correr')
+    p_correr.add_argument('--url', required=True)
+    p_correr.add_argument('--sesiones', required=True)
+    p_correr.add_argument('--usuarios-virtuales', type=int, default=20)
+    p_correr.add_argument('--duracion', type=float, default=30)
+    p_correr.add_argument('--espera', type=float, default=0.0, help='Espera máxima entre tareas (s)')
+    p_correr.add_argument('--json', help='Ruta donde guardar los resultados')
+
+    args = parser.parse_args()
+    if args.comando == 'preparar':
+        preparar(args.usuarios, args.sesiones, args.generar)
+        return
+
+    with open(args.sesiones, encoding='utf-8') as f:
+        datos_sesiones = json.load(f)
+    tabla = correr(args.url.rstrip('/'), datos_sesiones['sesiones'], datos_sesiones['productos'],
+                   args.usuarios_virtuales, args.duracion, args.espera)
+
+    for nombre, fila in tabla.items():
+        print(f"{nombre:<22} {fila['rps']:>8} req/s  p50 {fila['p50_ms']} ms  p95 {fila['p95_ms']} ms  "
+              f"errores {fila['errores']}")
+
+    if args.json:
+        from benchmarks import resultados
+        parametros = {k: v for k, v in vars(args).items() if k != 'comando'}
+        resultados.guardar(args.json, 'http', tabla, parametros)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Throughput de login concurrente: WSGI (vistas sync) contra ASGI (vistas async).
+
+1. Crear usuarios de prueba en la BD que usan los servidores::
+
+    python -m benchmarks.login_concurrente preparar --usuarios 100
+
+2. Levantar ambos perfiles con SMTP simulado y sin límite de peticiones::
+
+    export GAMERLY_EMAIL_BACKEND=benchmarks.correo_lento.EmailBackend GAMERLY_SMTP_LATENCIA=0.3
+    export GAMERLY_RATELIMIT_ACTIVO=0 GAMERLY_PBKDF2_ITERACIONES=10000 GAMERLY_WORKERS=2
+    gunicorn tienda.wsgi:application -c deploy/gunicorn_wsgi.conf.py &
+    gunicorn tienda.asgi:application -c deploy/gunicorn_asgi.conf.py &
+
+3. Medir::
+
+    python -m benchmarks.login_concurrente medir --url http://127.0.0.1:8001 --url http://127.0.0.1:8000
+
+Cada cliente virtual hace GET /login/ (cookie CSRF) y POST /login/; el login
+cuenta como exitoso si redirige a /verificar-token/ (código enviado).
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+
+PASSWORD = 'Bench-clave-123'
+
+
+class _SinRedirecciones(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def preparar(usuarios):
+    from benchmarks import entorno  # noqa: F401  (configura Django)
+    from django.contrib.auth.hashers import make_password
+    from django.contrib.auth.models import User
+    from productos.usuarios import crear_usuarios_en_bloque
+
+    hash_password = make_password(PASSWORD)
+    existentes = set(User.objects.filter(username__startswith='bench_').values_list('username', flat=True))
+    nuevos = [
+        User(username=f'bench_{i}', email=f'bench_{i}@example.com', password=hash_password)
+        for i in range(usuarios)
+        if f'bench_{i}' not in existentes
+    ]
+    # Con perfil y carrito, como cualquier usuario de la tienda
+    crear_usuarios_en_bloque(nuevos)
+    print(f'✅ {len(nuevos)} usuarios creados (bench_0..bench_{usuarios - 1})')
+
+
+def un_login(base_url, username):
+    cookies = CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(cookies), _SinRedirecciones)
+    opener.open(f'{base_url}/login/', timeout=30).read()
+    csrf = next(c.value for c in cookies if c.name == 'csrftoken')
+
+    datos = urllib.parse.urlencode({
+        'csrfmiddlewaretoken': csrf, 'username': username, 'password': PASSWORD,
+    }).encode()
+    peticion = urllib.request.Request(f'{base_url}/login/', data=datos, headers={'Referer': f'{base_url}/login/'})
+    try:
+        opener.open(peticion, timeout=30).read()
+        return False
+    except urllib.error.HTTPError as e:
+        return e.code == 302 and e.headers.get('Location', '').endswith('/verificar-token/')
+
+
+def medir_url(base_url, concurrencia, duracion, usuarios):
+    latencias, fallos = [], [0]
+    candado = threading.Lock()
+    fin = time.monotonic() + duracion
+
+    def cliente(indice):
+        n = 0
+        while time.monotonic() < fin:
+            username = f'bench_{(indice + n * concurrencia) % usuarios}'
+            inicio = time.perf_counter()
+            try:
+                ok = un_login(base_url, username)
+            except Exception:
+                ok = False
+            transcurrido = time.perf_counter() - inicio
+            with candado:
+                if ok:
+                    latencias.append(transcurrido)
+                else:
+                    fallos[0] += 1
+            n += 1
+
+    hilos = [threading.Thread(target=cliente, args=(i,)) for i in range(concurrencia)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    latencias.sort()
+    return {
+        'url': base_url,
+        'concurrencia': concurrencia,
+        'logins': len(latencias),
+        'fallos': fallos[0],
+        'logins_por_segundo': round(len(latencias) / duracion, 2),
+        'p50_ms': round(statistics.median(latencias) * 1000, 1) if latencias else None,
+        'p95_ms': round(latencias[int(len(latencias) * 0.95) - 1] * 1000, 1) if latencias else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    p_preparar = sub.add_parser('preparar')
+    p_preparar.add_argument('--usuarios', type=int, default=100)
+
+    p_medir = sub.add_parser('medir')
+    p_medir.add_argument('--url', action='append', required=True)
+    p_medir.add_argument('--concurrencia', type=int, default=50)
+    p_medir.add_argument('--duracion', type=float, default=20)
+    p_medir.add_argument('--usuarios', type=int, default=100)
+    p_medir.add_argument('--json', help='Ruta donde guardar los resultados')
+
+    args = parser.parse_args()
+    if args.comando == 'preparar':
+        preparar(args.usuarios)
+        return
+
+    resultados = []
+    for url in args.url:
+        resultado = medir_url(url.rstrip('/'), args.concurrencia, args.duracion, args.usuarios)
+        resultados.append(resultado)
+        print(f"🎯 {resultado['url']}: {resultado['logins_por_segundo']} logins/s "
+              f"(p50 {resultado['p50_ms']} ms, p95 {resultado['p95_ms']} ms, fallos {resultado['fallos']})")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
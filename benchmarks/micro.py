@@ -0,0 +1,89 @@
+"""
+Micro-benchmarks (estilo pytest-benchmark) de las rutas calientes del modelo:
+total del carrito, serializers y formateo de precios.
+
+    python -m benchmarks.micro --productos 2000 --json bench_micro.json
+
+Corre sobre una BD temporal con datos sintéticos; cada caso se repite
+``--rondas`` veces y se reportan min/media/mediana/desviación en ms.
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.entorno import base_de_datos_temporal
+from benchmarks import datos, resultados
+
+from django.db.models import Count
+from productos.models import Producto, Categoria, Carrito
+from productos.serializers import ProductoSerializer, ProductoListSerializer, CategoriaSerializer
+
+
+def benchmark(funcion, rondas, calentamiento=1):
+    """Ejecuta ``funcion`` y retorna estadísticas en milisegundos"""
+    for _ in range(calentamiento):
+        funcion()
+
+    tiempos = []
+    for _ in range(rondas):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+
+    return {
+        'rondas': rondas,
+        'min_ms': round(min(tiempos), 3),
+        'media_ms': round(statistics.mean(tiempos), 3),
+        'mediana_ms': round(statistics.median(tiempos), 3),
+        'desviacion_ms': round(statistics.stdev(tiempos), 3) if rondas > 1 else 0.0,
+    }
+
+
+def casos(limite_productos):
+    carrito = Carrito.objects.annotate(n_items=Count('items')).order_by('-n_items').first()
+    productos = list(Producto.objects.select_related('categoria', 'creado_por')[:limite_productos])
+    categorias = Categoria.objects.all()
+
+    def formatear_precios():
+        for producto in productos:
+            producto.precio_formateado
+            producto.precio_normal_formateado
+            producto.precio_oferta_formateado
+            producto.precio_solo_numero
+
+    return {
+        'carrito.total_precio': carrito.total_precio,
+        'carrito.total_items': carrito.total_items,
+        'carrito.total_precio_formateado': carrito.total_precio_formateado,
+        f'ProductoListSerializer[{len(productos)}]': lambda: ProductoListSerializer(productos, many=True).data,
+        f'ProductoSerializer[{len(productos)}]': lambda: ProductoSerializer(productos, many=True).data,
+        'CategoriaSerializer[todas]': lambda: CategoriaSerializer(categorias, many=True).data,
+        f'formatear_precios[{len(productos)}]': formatear_precios,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--categorias', type=int, default=20)
+    parser.add_argument('--productos', type=int, default=2000)
+    parser.add_argument('--items-por-carrito', type=int, default=20)
+    parser.add_argument('--rondas', type=int, default=20)
+    parser.add_argument('--json', help='Ruta donde guardar los resultados')
+    args = parser.parse_args()
+
+    with base_de_datos_temporal():
+        datos.generar(categorias=args.categorias, productos=args.productos, usuarios=5,
+                      items_por_carrito=args.items_por_carrito)
+
+        tabla = {}
+        for nombre, funcion in casos(limite_productos=500).items():
+            tabla[nombre] = benchmark(funcion, args.rondas)
+            print(f"{nombre:<40} media {tabla[nombre]['media_ms']:>9.3f} ms  "
+                  f"min {tabla[nombre]['min_ms']:>9.3f} ms  ±{tabla[nombre]['desviacion_ms']:.3f}")
+
+    if args.json:
+        resultados.guardar(args.json, 'micro', tabla, vars(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+"""Formato JSON común de resultados, para comparar entre commits con benchmarks.comparar"""
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+
+def commit_actual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def guardar(ruta, suite, resultados, parametros=None):
+    """``resultados`` es {nombre: {metrica: valor}}; las métricas *_ms se comparan"""
+    documento = {
+        'suite': suite,
+        'commit': commit_actual(),
+        'fecha': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'parametros': parametros or {},
+        'resultados': resultados,
+    }
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(documento, f, indent=2, ensure_ascii=False)
+    print(f'💾 Resultados guardados en {ruta}')
@@ -0,0 +1,55 @@
+"""
+Serialización de una lista grande de productos: JSONRenderer de DRF vs
+JSONRapidoRenderer (orjson), por separado del costo del serializer.
+
+    python -m benchmarks.serializacion --productos 5000 --json bench_serializacion.json
+"""
+import argparse
+import json
+
+from benchmarks.entorno import base_de_datos_temporal
+from benchmarks import datos, resultados
+from benchmarks.micro import benchmark
+
+from rest_framework.renderers import JSONRenderer
+
+from productos.models import Producto
+from productos.renderers import JSONRapidoRenderer, orjson
+from productos.serializers import ProductoListSerializer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--productos', type=int, default=5000)
+    parser.add_argument('--rondas', type=int, default=20)
+    parser.add_argument('--json', help='Ruta donde guardar los resultados')
+    args = parser.parse_args()
+
+    if orjson is None:
+        print('⚠️  orjson no está instalado: JSONRapidoRenderer usa el renderer de DRF')
+
+    with base_de_datos_temporal():
+        datos.generar(productos=args.productos, usuarios=1, items_por_carrito=0)
+        productos = list(Producto.objects.select_related('categoria')[:args.productos])
+        data = ProductoListSerializer(productos, many=True).data
+
+        drf, rapido = JSONRenderer(), JSONRapidoRenderer()
+        assert json.loads(drf.render(data)) == json.loads(rapido.render(data))
+
+        n = len(productos)
+        tabla = {
+            f'ProductoListSerializer[{n}]': benchmark(lambda: ProductoListSerializer(productos, many=True).data,
+                                                      args.rondas),
+            f'JSONRenderer[{n}]': benchmark(lambda: drf.render(data), args.rondas),
+            f'JSONRapidoRenderer[{n}]': benchmark(lambda: rapido.render(data), args.rondas),
+        }
+
+    for nombre, fila in tabla.items():
+        print(f"{nombre:<34} media {fila['media_ms']:>9.3f} ms  min {fila['min_ms']:>9.3f} ms")
+
+    if args.json:
+        resultados.guardar(args.json, 'serializacion', tabla, vars(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+# Perfil ASGI: vistas de login/2FA, recuperación y carrito en su versión async.
+#
+#   gunicorn tienda.asgi:application -c deploy/gunicorn_asgi.conf.py
+#
+# Cada worker uvicorn atiende muchas peticiones concurrentes mientras esperan
+# al SMTP o a la BD, en lugar de bloquear un worker completo por petición.
+import multiprocessing
+import os
+
+bind = os.environ.get('GAMERLY_BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('GAMERLY_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'uvicorn_worker.UvicornWorker'
+timeout = 30
+keepalive = 5
+
+raw_env = [
+    'DJANGO_SETTINGS_MODULE=tienda.settings',
+    'GAMERLY_VISTAS_ASYNC=1',
+]
+
+
+# Métricas de todos los workers en /metrics (productos/metricas.py). Un
+# directorio por master: on_starting lo vacía, así que compartirlo con el otro
+# perfil borraría los volcados de sus workers vivos
+os.environ.setdefault('GAMERLY_METRICAS_DIR', '/tmp/gamerly-metricas-asgi')
+
+
+def on_starting(server):
+    from productos.metricas import limpiar_directorio
+    limpiar_directorio(os.environ['GAMERLY_METRICAS_DIR'])
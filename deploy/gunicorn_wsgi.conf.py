@@ -0,0 +1,26 @@
+# Perfil WSGI (referencia para comparar con deploy/gunicorn_asgi.conf.py).
+#
+#   gunicorn tienda.wsgi:application -c deploy/gunicorn_wsgi.conf.py
+import multiprocessing
+import os
+
+bind = os.environ.get('GAMERLY_BIND', '127.0.0.1:8001')
+workers = int(os.environ.get('GAMERLY_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'sync'
+timeout = 30
+
+raw_env = [
+    'DJANGO_SETTINGS_MODULE=tienda.settings',
+    'GAMERLY_VISTAS_ASYNC=0',
+]
+
+
+# Métricas de todos los workers en /metrics (productos/metricas.py). Un
+# directorio por master: on_starting lo vacía, así que compartirlo con el otro
+# perfil borraría los volcados de sus workers vivos
+os.environ.setdefault('GAMERLY_METRICAS_DIR', '/tmp/gamerly-metricas-wsgi')
+
+
+def on_starting(server):
+    from productos.metricas import limpiar_directorio
+    limpiar_directorio(os.environ['GAMERLY_METRICAS_DIR'])
@@ -0,0 +1,119 @@
+"""
+Login con 2FA y recuperación de contraseña, compartidos por views.py y
+views_async.py.
+
+Cada función agrupa lo que toca la BD o renderiza plantillas, así que una
+vista async la ejecuta con un solo ``sync_to_async`` y solo espera aparte el
+envío del correo (``correo.enviar_correo_async``). Los correos se retornan
+como kwargs de ``send_mail``.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sites.shortcuts import get_current_site
+from django.template.loader import render_to_string
+
+from .models import TokenLogin, TokenRecuperacion
+from .ratelimit import limpiar_limite
+
+# Cupo de intentos de login (el mismo para la vista sync y la async); un 2FA
+# correcto reinicia el del usuario, el de la IP sigue contando
+LOGIN_ALCANCE = 'login'
+LOGIN_LIMITE = 10
+LOGIN_VENTANA = 300
+
+MENSAJE_CREDENCIALES = 'Usuario o contraseña incorrectos'
+MENSAJE_SIN_EMAIL = 'Tu cuenta no tiene email configurado. Contacta al administrador.'
+MENSAJE_ERROR_CODIGO = 'Error al enviar el código. Intenta nuevamente.'
+MENSAJE_SIN_LOGIN_PENDIENTE = 'No hay un login pendiente.'
+MENSAJE_USUARIO_NO_ENCONTRADO = 'Usuario no encontrado.'
+MENSAJE_ERROR_VERIFICACION = 'Error al verificar el código'
+
+MENSAJE_RECUPERACION_SIN_DATOS = 'Por favor ingresa tu email o nombre de usuario'
+MENSAJE_RECUPERACION_ENVIADA = 'Si el usuario existe, se ha enviado un email con instrucciones.'
+MENSAJE_RECUPERACION_SIN_EMAIL = 'Este usuario no tiene email configurado.'
+MENSAJE_RECUPERACION_OK = 'Se ha enviado un email con instrucciones para recuperar tu contraseña.'
+MENSAJE_RECUPERACION_ERROR_INTERNO = 'Error interno. Por favor intenta más tarde.'
+MENSAJE_RECUPERACION_ERROR_ENVIO = 'Error al enviar el email. Por favor intenta más tarde.'
+
+
+def mensaje_codigo_enviado(user):
+    return f'✅ Se ha enviado un código de verificación a {user.email}'
+
+
+def mensaje_bienvenida(user):
+    return f'¡Bienvenido, {user.first_name or user.username}!'
+
+
+def usuario_pendiente(user_id):
+    """Usuario del login a medio camino (``pending_user_id`` de la sesión) o None"""
+    if user_id is None:
+        return None
+    return User.objects.filter(id=user_id).first()
+
+
+def correo_codigo_login(user, ip_address, reenvio=False):
+    """Emite un código nuevo para ``user`` y retorna el correo que lo lleva"""
+    codigo = TokenLogin.emitir_codigo(user, ip_address)
+    context = {
+        'user': user,
+        'token': codigo,
+        'ip_address': ip_address,
+    }
+    return {
+        'subject': 'Nuevo código de verificación - GAMERLY' if reenvio else 'Código de verificación - GAMERLY',
+        'message': f'Tu {"nuevo " if reenvio else ""}código de verificación es: {codigo}',
+        'from_email': settings.EMAIL_HOST_USER,
+        'recipient_list': [user.email],
+        'html_message': render_to_string('auth/email_token_login.html', context),
+        'fail_silently': False,
+    }
+
+
+def verificar_codigo_login(user, codigo):
+    """
+    None si el código es correcto (y reinicia el cupo de login del usuario);
+    si no, el mensaje de error para el usuario
+    """
+    codigo = (codigo or '').strip()
+    if not codigo:
+        return 'Por favor ingresa el código'
+    if TokenLogin.intentos_agotados(user):
+        return '❌ Demasiados intentos fallidos. Espera unos minutos antes de volver a intentarlo.'
+    if not TokenLogin.verificar(user, codigo):
+        return '❌ Código inválido o expirado'
+
+    limpiar_limite(LOGIN_ALCANCE, LOGIN_VENTANA, user.username)
+    return None
+
+
+def preparar_recuperacion(request, email_or_username):
+    """
+    Busca el usuario por email (si contiene @) o por nombre de usuario y
+    retorna ``(user, correo)``: user None si no existe, correo None si no
+    tiene email
+    """
+    campo = 'email' if '@' in email_or_username else 'username'
+    user = User.objects.filter(**{campo: email_or_username}).first()
+    if user is None or not user.email:
+        return user, None
+    return user, correo_recuperacion(request, user)
+
+
+def correo_recuperacion(request, user):
+    """Crea el token de recuperación de ``user`` y retorna el correo con el enlace"""
+    token_obj = TokenRecuperacion.crear_token(user)
+    context = {
+        'user': user,
+        'domain': get_current_site(request).domain,
+        'site_name': 'GAMERLY',
+        'token': token_obj.token,
+        'protocol': 'https' if request.is_secure() else 'http',
+    }
+    return {
+        'subject': 'Recuperación de contraseña - GAMERLY',
+        'message': 'Versión en texto plano: Para recuperar tu contraseña, usa el enlace en la versión HTML de este email.',
+        'from_email': settings.EMAIL_HOST_USER,
+        'recipient_list': [user.email],
+        'html_message': render_to_string('auth/email_recuperacion.html', context),
+        'fail_silently': False,
+    }
@@ -1,6 +1,10 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.db.models import Count
 from django.utils.html import format_html
-from .models import Producto, Categoria, PerfilUsuario, Carrito, ItemCarrito
+from . import masivo
+from .models import Producto, Categoria, PerfilUsuario, Carrito, ItemCarrito, suma_items, suma_precio
 
 # Personalización del sitio de administración
 admin.site.site_header = "🎮 GAMERLY Administration"
@@ -22,12 +26,46 @@ class BaseGamingAdmin:
         js = ('admin/js/gaming-admin.js',)
 
 
+class CategoriaFiltro(admin.SimpleListFilter):
+    """
+    Filtro por categoría que no carga todas las categorías: muestra las
+    ``MAXIMO`` con más productos y la seleccionada.
+    """
+    title = 'categoría'
+    parameter_name = 'categoria__id__exact'
+    ruta = 'productos'  # de Categoria al modelo del changelist
+    MAXIMO = 15
+
+    def lookups(self, request, model_admin):
+        categorias = list(
+            Categoria.objects.annotate(n=Count(self.ruta)).order_by('-n', 'nombre')
+            .values_list('id', 'nombre')[:self.MAXIMO]
+        )
+        seleccionada = self.value()
+        if seleccionada and seleccionada.isdigit() and int(seleccionada) not in {pk for pk, _ in categorias}:
+            categorias += list(Categoria.objects.filter(pk=seleccionada).values_list('id', 'nombre'))
+        return [(str(pk), nombre) for pk, nombre in categorias]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.parameter_name: self.value()})
+        return queryset
+
+
+class CategoriaItemFiltro(CategoriaFiltro):
+    parameter_name = 'producto__categoria__id__exact'
+    ruta = 'productos__itemcarrito'
+
+
 @admin.register(Categoria)
 class CategoriaAdmin(BaseGamingAdmin, admin.ModelAdmin):
     list_display = ['nombre_con_emoji', 'descripcion_corta', 'estado_visual', 'productos_count', 'fecha_creacion']
     list_filter = ['activo', 'fecha_creacion']
     search_fields = ['nombre']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(_productos_count=Count('productos'))
+
     def nombre_con_emoji(self, obj):
         return format_html(
             '<span style="font-weight: bold; color: #8b5cf6;">🏷️ {}</span>',
@@ -57,7 +95,7 @@ class CategoriaAdmin(BaseGamingAdmin, admin.ModelAdmin):
     estado_visual.short_description = 'Estado'
 
     def productos_count(self, obj):
-        count = obj.productos.count()
+        count = obj._productos_count
         if count > 0:
             return format_html(
                 '<span style="background: #8b5cf6; color: white; padding: 2px 8px; border-radius: 10px; font-weight: bold;">📦 {}</span>',
@@ -66,15 +104,63 @@ class CategoriaAdmin(BaseGamingAdmin, admin.ModelAdmin):
         return format_html('<span style="color: #6b7280;">Sin productos</span>')
 
     productos_count.short_description = 'Productos'
+    productos_count.admin_order_field = '_productos_count'
+
+
+class ProductoActionForm(ActionForm):
+    """Valor que acompaña a las acciones masivas (porcentaje, monto, stock o estado)"""
+    valor = forms.DecimalField(required=False, label='Valor', max_digits=12, decimal_places=2)
+    estado = forms.ChoiceField(required=False, label='Estado', choices=[('', '---------')] + Producto.ESTADOS)
+
+
+def accion_masiva(operacion, descripcion, campo=None, valor=None):
+    """
+    Acción del admin que aplica ``masivo.<operacion>`` a los productos
+    seleccionados con un solo UPDATE. ``campo`` es el campo del action form
+    que trae el valor; si no, se usa ``valor`` fijo.
+    """
+    def accion(modeladmin, request, queryset):
+        dato = valor
+        if campo:
+            # Solo interesa el campo de la acción; el resto del form lo valida el admin
+            try:
+                dato = modeladmin.action_form.base_fields[campo].clean(request.POST.get(campo))
+            except forms.ValidationError:
+                dato = None
+            if dato in (None, ''):
+                modeladmin.message_user(request, f'❌ Indica el {campo} para "{descripcion}"', messages.ERROR)
+                return
+        try:
+            actualizados = masivo.aplicar(queryset, operacion, dato)
+        except masivo.OperacionInvalida as e:
+            modeladmin.message_user(request, f'❌ {e}', messages.ERROR)
+            return
+        modeladmin.message_user(request, f'✅ {descripcion}: {actualizados} productos actualizados', messages.SUCCESS)
+
+    accion.__name__ = f'accion_{operacion}' if valor is None else f'accion_{operacion}_{str(valor).lower()}'
+    return admin.action(description=descripcion, permissions=['change'])(accion)
 
 
 @admin.register(Producto)
 class ProductoAdmin(BaseGamingAdmin, admin.ModelAdmin):
+    action_form = ProductoActionForm
+    actions = [
+        accion_masiva('descuento_porcentaje', 'Aplicar descuento (%% en Valor)', campo='valor'),
+        accion_masiva('descuento_fijo', 'Aplicar descuento fijo ($ en Valor)', campo='valor'),
+        accion_masiva('quitar_oferta', 'Quitar oferta'),
+        accion_masiva('fijar_stock', 'Fijar stock (Valor)', campo='valor'),
+        accion_masiva('sumar_stock', 'Sumar al stock (Valor, negativo para restar)', campo='valor'),
+        accion_masiva('destacar', 'Marcar como destacados', valor=True),
+        accion_masiva('destacar', 'Quitar de destacados', valor=False),
+        accion_masiva('cambiar_estado', 'Cambiar estado (Estado)', campo='estado'),
+    ]
     list_display = ['imagen_miniatura', 'nombre_con_emoji', 'categoria_visual', 'precio', 'precio_visual', 'stock',
                     'stock_visual', 'estado_badge', 'destacado', 'destacado_star']
-    list_filter = ['categoria', 'estado', 'destacado', 'fecha_creacion']
+    list_filter = [CategoriaFiltro, 'estado', 'destacado', 'fecha_creacion']
     search_fields = ['nombre', 'descripcion']
     list_editable = ['stock', 'destacado']
+    list_select_related = ['categoria']
+    autocomplete_fields = ['categoria', 'creado_por']
     readonly_fields = ['imagen_preview', 'fecha_creacion', 'fecha_actualizacion']
 
     fieldsets = (
@@ -210,6 +296,8 @@ class PerfilUsuarioAdmin(BaseGamingAdmin, admin.ModelAdmin):
     list_filter = ['tipo_usuario', 'fecha_registro']
     search_fields = ['usuario__username', 'usuario__email']
     readonly_fields = ['fecha_registro']
+    list_select_related = ['usuario']
+    autocomplete_fields = ['usuario']
 
     fieldsets = (
         ('👤 Información de Usuario', {
@@ -264,6 +352,10 @@ class ItemCarritoInline(admin.TabularInline):
     extra = 0
     readonly_fields = ['fecha_agregado', 'subtotal_visual']
     fields = ['producto', 'cantidad', 'subtotal_visual', 'fecha_agregado']
+    autocomplete_fields = ['producto']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('producto')
 
     def subtotal_visual(self, obj):
         subtotal_formateado = f"{int(obj.subtotal()):,}".replace(',', '.')
@@ -282,6 +374,12 @@ class CarritoAdmin(BaseGamingAdmin, admin.ModelAdmin):
     search_fields = ['usuario__username', 'usuario__email']
     readonly_fields = ['fecha_creacion', 'fecha_actualizacion']
     inlines = [ItemCarritoInline]
+    autocomplete_fields = ['usuario']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('usuario').annotate(
+            _total_items=suma_items(), _total_precio=suma_precio()
+        )
 
     def usuario_info(self, obj):
         return format_html(
@@ -295,30 +393,34 @@ class CarritoAdmin(BaseGamingAdmin, admin.ModelAdmin):
     usuario_info.short_description = 'Usuario'
 
     def items_count(self, obj):
-        count = obj.total_items()
+        count = obj._total_items
         return format_html(
             '<span style="background: #8b5cf6; color: white; padding: 4px 12px; border-radius: 15px; font-weight: bold;">📦 {} items</span>',
             count
         )
 
     items_count.short_description = 'Items'
+    items_count.admin_order_field = '_total_items'
 
     def total_visual(self, obj):
-        total_formateado = f"{int(obj.total_precio()):,}".replace(',', '.')
+        total_formateado = f"{int(obj._total_precio):,}".replace(',', '.')
         return format_html(
             '<span style="font-weight: bold; color: #10b981; font-size: 1.2em;">${} COL</span>',
             total_formateado
         )
 
     total_visual.short_description = 'Total'
+    total_visual.admin_order_field = '_total_precio'
 
 
 @admin.register(ItemCarrito)
 class ItemCarritoAdmin(BaseGamingAdmin, admin.ModelAdmin):
     list_display = ['carrito_info', 'producto_info', 'cantidad', 'subtotal_visual', 'fecha_agregado']
-    list_filter = ['fecha_agregado', 'producto__categoria']
+    list_filter = ['fecha_agregado', CategoriaItemFiltro]
     search_fields = ['carrito__usuario__username', 'producto__nombre']
     readonly_fields = ['fecha_agregado', 'subtotal_visual']
+    list_select_related = ['carrito__usuario', 'producto']
+    autocomplete_fields = ['carrito', 'producto']
 
     def carrito_info(self, obj):
         return format_html(
@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class ProductosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'productos'
+
+    def ready(self):
+        from . import authentication  # noqa: F401  (señales que invalidan la caché de usuarios del API)
+        from . import sqlite  # noqa: F401  (pragmas al abrir cada conexión SQLite)
+        from . import perfilado  # noqa: F401  (captura de SQL de las peticiones perfiladas)
+        from . import consultas_lentas  # noqa: F401  (registro de consultas sobre CONSULTAS_LENTAS_MS)
+
+        # Instanciar los validadores al arrancar carga la lista de contraseñas
+        # comunes una sola vez, fuera del camino de la primera petición
+        from django.contrib.auth.password_validation import get_default_password_validators
+        get_default_password_validators()
@@ -0,0 +1,125 @@
+"""
+Autenticación por token firmado para clientes máquina (app móvil, feeds).
+
+El token es ``TimestampSigner.sign_object({'u': id, 'h': huella})``: no se
+guarda en la BD, se verifica con SECRET_KEY y caduca a los
+``API_TOKEN_VIGENCIA`` segundos. La huella deriva de
+``PerfilUsuario.version_credenciales``, que sube al cambiar la contraseña:
+eso revoca todos los tokens del usuario. No deriva del hash, porque el
+rehash del login (hashers.py) lo cambia sin que cambie la contraseña.
+
+De cada User la caché (``API_TOKEN_CACHE_SEGUNDOS``) guarda solo el id, los
+flags de acceso y la huella, nunca el hash de la contraseña; se invalida al
+guardarlo o borrarlo. Una petición con token válido no toca la BD ni la
+tabla de sesiones. Uso::
+
+    Authorization: Token <token>
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import cache
+from django.db import router
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils.crypto import constant_time_compare, salted_hmac
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+from . import metricas
+from .models import PerfilUsuario
+
+PALABRA_CLAVE = 'Token'
+SAL = 'productos.authentication.TokenFirmadoAuthentication'
+
+
+def _firmador():
+    return signing.TimestampSigner(salt=SAL)
+
+
+def _huella(usuario_id, version):
+    return salted_hmac(SAL, f'{usuario_id}:{version or 0}', algorithm='sha256').hexdigest()[:20]
+
+
+def _clave_usuario(usuario_id):
+    return f'api:usuario:{usuario_id}'
+
+
+def emitir_token(user):
+    """Token firmado para ``user``"""
+    version = PerfilUsuario.objects.filter(usuario_id=user.pk).values_list('version_credenciales', flat=True).first()
+    return _firmador().sign_object({'u': user.pk, 'h': _huella(user.pk, version)})
+
+
+CAMPOS_EN_CACHE = ('id', 'is_active', 'is_staff', 'is_superuser')
+
+
+def usuario_en_cache(usuario_id):
+    """
+    ``(user, huella)`` por id, desde la caché o (una vez) desde la BD; None si
+    no existe. El User solo trae CAMPOS_EN_CACHE: el resto queda diferido y se
+    lee de la BD si alguien lo usa, y save() solo escribe esos campos
+    """
+    clave = _clave_usuario(usuario_id)
+    datos = cache.get(clave)
+    metricas.registrar_cache('usuarios_api', datos is not None)
+    if datos is None:
+        fila = User.objects.filter(pk=usuario_id).values(*CAMPOS_EN_CACHE, 'perfilusuario__version_credenciales').first()
+        if fila is None:
+            return None
+        datos = {campo: fila[campo] for campo in CAMPOS_EN_CACHE}
+        datos['huella'] = _huella(usuario_id, fila['perfilusuario__version_credenciales'])
+        cache.set(clave, datos, getattr(settings, 'API_TOKEN_CACHE_SEGUNDOS', 300))
+
+    # from_db espera los valores en el orden de los campos del modelo
+    campos = [f.attname for f in User._meta.concrete_fields if f.attname in CAMPOS_EN_CACHE]
+    user = User.from_db(router.db_for_read(User), campos, [datos[campo] for campo in campos])
+    return user, datos['huella']
+
+
+@receiver(post_save, sender=User)
+def invalidar_usuario_guardado(sender, instance, created, **kwargs):
+    # set_password() + save() deja ``_password`` puesto hasta después del
+    # post_save; el rehash de check_password() lo limpia antes de guardar
+    if not created and getattr(instance, '_password', None) is not None:
+        PerfilUsuario.objects.filter(usuario_id=instance.pk).update(
+            version_credenciales=F('version_credenciales') + 1)
+    cache.delete(_clave_usuario(instance.pk))
+
+
+@receiver(post_delete, sender=User)
+def invalidar_usuario_borrado(sender, instance, **kwargs):
+    cache.delete(_clave_usuario(instance.pk))
+
+
+class TokenFirmadoAuthentication(BaseAuthentication):
+    """Autenticación sin estado: firma + caché, sin consultas por petición"""
+
+    def authenticate(self, request):
+        partes = get_authorization_header(request).split()
+        if not partes or partes[0].lower() != PALABRA_CLAVE.lower().encode():
+            return None
+        if len(partes) != 2:
+            raise exceptions.AuthenticationFailed('Encabezado de token inválido.')
+
+        try:
+            datos = _firmador().unsign_object(
+                partes[1].decode(), max_age=getattr(settings, 'API_TOKEN_VIGENCIA', 7 * 24 * 3600)
+            )
+        except signing.SignatureExpired:
+            raise exceptions.AuthenticationFailed('Token expirado.')
+        except (signing.BadSignature, UnicodeDecodeError, ValueError):
+            raise exceptions.AuthenticationFailed('Token inválido.')
+
+        encontrado = usuario_en_cache(datos.get('u'))
+        if encontrado is None:
+            raise exceptions.AuthenticationFailed('Token inválido.')
+        user, huella = encontrado
+        if not user.is_active or not constant_time_compare(datos.get('h', ''), huella):
+            raise exceptions.AuthenticationFailed('Token inválido.')
+
+        return user, partes[1].decode()
+
+    def authenticate_header(self, request):
+        return PALABRA_CLAVE
@@ -0,0 +1,148 @@
+"""
+Operaciones AJAX del carrito, compartidas por views.py y views_async.py.
+
+Cada operación recibe el usuario (y el cuerpo JSON o el item) y retorna el
+dict de la respuesta. ``respuesta_json`` la ejecuta y convierte los errores
+en ``{'success': False, 'message': ...}``; una vista async la llama con un
+solo ``sync_to_async`` en lugar de un salto al hilo por cada consulta.
+"""
+import json
+import logging
+
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+
+from . import metricas
+from .models import Producto, Carrito, ItemCarrito, suma_items, suma_precio
+
+logger = logging.getLogger(__name__)
+
+METODO_NO_PERMITIDO = {'success': False, 'message': 'Método no permitido'}
+
+
+class OperacionRechazada(Exception):
+    """El mensaje llega tal cual al cliente"""
+
+
+def resumen(carrito_id):
+    """Unidades y total del carrito en una consulta"""
+    with metricas.cronometro('carrito_total'):
+        totales = Carrito.objects.filter(pk=carrito_id).aggregate(
+            carrito_items=suma_items(), carrito_total=suma_precio())
+    return {'carrito_items': totales['carrito_items'], 'carrito_total': int(totales['carrito_total'])}
+
+
+def agregar(usuario, cuerpo):
+    data = json.loads(cuerpo)
+    cantidad = int(data.get('cantidad', 1))
+    producto = get_object_or_404(Producto, id=data.get('producto_id'), estado='disponible')
+
+    if cantidad > producto.stock:
+        raise OperacionRechazada(f'Solo hay {producto.stock} unidades disponibles')
+
+    carrito = usuario.carrito
+    item, item_created = ItemCarrito.objects.get_or_create(
+        carrito=carrito,
+        producto=producto,
+        defaults={'cantidad': cantidad}
+    )
+
+    if not item_created:
+        # Si el item ya existe, aumentar la cantidad
+        nueva_cantidad = item.cantidad + cantidad
+        if nueva_cantidad > producto.stock:
+            raise OperacionRechazada(f'Solo puedes agregar {producto.stock - item.cantidad} unidades más')
+        item.cantidad = nueva_cantidad
+        item.save()
+
+    return {
+        'success': True,
+        'message': f'{producto.nombre} agregado al carrito',
+        **resumen(carrito.pk),
+    }
+
+
+def actualizar(usuario, cuerpo, item_id):
+    nueva_cantidad = int(json.loads(cuerpo).get('cantidad', 1))
+    item = get_object_or_404(ItemCarrito.objects.select_related('producto'), id=item_id, carrito__usuario=usuario)
+
+    if nueva_cantidad > item.producto.stock:
+        raise OperacionRechazada(f'Solo hay {item.producto.stock} unidades disponibles')
+    if nueva_cantidad <= 0:
+        raise OperacionRechazada('La cantidad debe ser mayor a 0')
+
+    item.cantidad = nueva_cantidad
+    item.save()
+
+    return {
+        'success': True,
+        'message': 'Cantidad actualizada correctamente',
+        'item_subtotal': int(item.subtotal()),
+        **resumen(item.carrito_id),
+    }
+
+
+def eliminar(usuario, item_id):
+    item = get_object_or_404(ItemCarrito.objects.select_related('producto'), id=item_id, carrito__usuario=usuario)
+    item.delete()
+    logger.debug('Item %s (%s) eliminado del carrito', item_id, item.producto.nombre)
+
+    return {
+        'success': True,
+        'message': f'{item.producto.nombre} eliminado del carrito',
+        **resumen(item.carrito_id),
+    }
+
+
+def vaciar(usuario):
+    ItemCarrito.objects.filter(carrito__usuario=usuario).delete()
+    return {
+        'success': True,
+        'message': 'Carrito limpiado correctamente',
+        'carrito_items': 0,
+        'carrito_total': 0
+    }
+
+
+def items(usuario):
+    """Items del carrito para el dropdown, con los totales calculados sobre la misma lectura"""
+    items_data = []
+    total_items = 0
+    total_precio = 0
+    for item in ItemCarrito.objects.filter(carrito__usuario=usuario).select_related('producto__categoria'):
+        subtotal = item.subtotal()
+        total_items += item.cantidad
+        total_precio += subtotal
+        items_data.append({
+            'id': item.id,
+            'producto_id': item.producto.id,
+            'nombre': item.producto.nombre,
+            'precio': int(item.producto.precio_actual()),
+            'cantidad': item.cantidad,
+            'subtotal': int(subtotal),
+            'imagen_url': item.producto.imagen.url if item.producto.imagen else None,
+            'categoria': item.producto.categoria.nombre,
+        })
+
+    return {
+        'success': True,
+        'items': items_data,
+        'total_items': total_items,
+        'total_precio': int(total_precio),
+        'items_count': len(items_data),
+        'has_more': False
+    }
+
+
+def respuesta_json(descripcion, operacion, *args):
+    """JsonResponse con el resultado de ``operacion(*args)`` o con el error"""
+    try:
+        return JsonResponse(operacion(*args))
+    except OperacionRechazada as e:
+        return JsonResponse({'success': False, 'message': str(e)})
+    except Exception as e:
+        logger.exception('Error al %s', descripcion)
+        return JsonResponse({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        })
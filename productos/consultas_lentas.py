@@ -0,0 +1,135 @@
+"""
+Registro de consultas lentas agrupadas por huella.
+
+Un execute_wrapper en cada conexión mide todas las consultas; las que pasan
+de ``CONSULTAS_LENTAS_MS`` se acumulan en la caché bajo la huella de su SQL
+normalizado (literales y listas ``IN`` reemplazados), con::
+
+    veces, suma_ms, max_ms, ultima, vista, origen, sql, ejemplo
+
+``vista`` es el nombre de URL de la petición en curso (o ``-`` fuera de una
+petición) y ``origen`` las últimas líneas de ``productos/`` en la pila.
+El reporte sale con ``python manage.py consultas_lentas`` y en
+/admin/consultas-lentas/. Con LocMemCache cada proceso tiene su propio
+registro: para verlo desde el comando hace falta la caché compartida
+(GAMERLY_REDIS_URL).
+
+La acumulación es leer-modificar-escribir en la caché, sin bloqueo: con
+mucha concurrencia algún conteo puede perderse, pero el orden del top-N se
+mantiene.
+"""
+import hashlib
+import logging
+import re
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .instrumentacion import vista_actual
+from .perfilado import origen_en_app
+
+logger = logging.getLogger(__name__)
+
+PREFIJO = 'consultas_lentas:'
+CLAVE_INDICE = f'{PREFIJO}indice'
+ORDENES = {'suma_ms': 'tiempo total', 'max_ms': 'peor caso', 'veces': 'veces'}
+
+_registrando = ContextVar('gamerly_consulta_lenta', default=False)
+
+_LITERAL_TEXTO = re.compile(r"'(?:[^']|'')*'")
+_LITERAL_NUMERO = re.compile(r'\b\d+(?:\.\d+)?\b')
+_LISTA_IN = re.compile(r'\bIN\s*\(\s*(?:(?:%s|\?)\s*,\s*)*(?:%s|\?)\s*\)', re.IGNORECASE)
+_ESPACIOS = re.compile(r'\s+')
+
+
+def umbral():
+    return getattr(settings, 'CONSULTAS_LENTAS_MS', None)
+
+
+def normalizar(sql):
+    """SQL sin literales ni largo de listas IN: las variantes de una misma consulta quedan iguales"""
+    sql = _LITERAL_TEXTO.sub('?', sql)
+    sql = _LITERAL_NUMERO.sub('?', sql)
+    sql = _LISTA_IN.sub('IN (...)', sql)
+    return _ESPACIOS.sub(' ', sql).strip()
+
+
+def huella(sql):
+    return hashlib.sha1(normalizar(sql).encode()).hexdigest()[:16]
+
+
+# ---------- captura ----------
+
+@receiver(connection_created)
+def vigilar_consultas(sender, connection, **kwargs):
+    if _medir not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_medir)
+
+
+def _medir(execute, sql, params, many, context):
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        ms = (time.perf_counter() - inicio) * 1000
+        limite_ms = umbral()
+        # Con una caché en BD, registrar también consulta: no volver a entrar
+        if limite_ms is not None and ms >= limite_ms and not _registrando.get():
+            token = _registrando.set(True)
+            try:
+                registrar(sql, ms)
+            except Exception:
+                logger.exception('No se pudo registrar la consulta lenta')
+            finally:
+                _registrando.reset(token)
+
+
+def registrar(sql, ms, vista=None, origen=None):
+    if vista is None:
+        vista = vista_actual() or '-'
+    if origen is None:
+        origen = origen_en_app()
+
+    clave = huella(sql)
+    segundos = getattr(settings, 'CONSULTAS_LENTAS_CACHE_SEGUNDOS', 86400)
+    entrada = cache.get(PREFIJO + clave) or {
+        'huella': clave, 'sql': normalizar(sql), 'veces': 0, 'suma_ms': 0.0, 'max_ms': 0.0,
+    }
+    entrada['veces'] += 1
+    entrada['suma_ms'] = round(entrada['suma_ms'] + ms, 3)
+    if ms >= entrada['max_ms']:
+        # Vista, origen y SQL de ejemplo del peor caso
+        entrada.update(max_ms=round(ms, 3), vista=vista, origen=origen, ejemplo=sql[:2000])
+    entrada['ultima'] = timezone.now().isoformat(timespec='seconds')
+    cache.set(PREFIJO + clave, entrada, segundos)
+
+    # El índice se reescribe siempre para que no caduque antes que sus entradas
+    indice = cache.get(CLAVE_INDICE) or set()
+    indice.add(clave)
+    cache.set(CLAVE_INDICE, indice, segundos)
+
+    logger.warning('Consulta lenta (%.1f ms) en %s', ms, vista,
+                   extra={'huella': clave, 'consulta_ms': round(ms, 3), 'vista': vista, 'origen': origen})
+
+
+# ---------- reporte ----------
+
+def reporte(limite=20, orden='suma_ms'):
+    """Las ``limite`` huellas con mayor ``orden`` (suma_ms, max_ms o veces)"""
+    if orden not in ORDENES:
+        raise ValueError(f'Orden inválido: {orden}')
+    indice = cache.get(CLAVE_INDICE) or set()
+    entradas = cache.get_many([PREFIJO + clave for clave in indice]).values()
+    for entrada in entradas:
+        entrada['promedio_ms'] = round(entrada['suma_ms'] / entrada['veces'], 3)
+    return sorted(entradas, key=lambda entrada: entrada[orden], reverse=True)[:limite]
+
+
+def limpiar():
+    indice = cache.get(CLAVE_INDICE) or set()
+    cache.delete_many([PREFIJO + clave for clave in indice] + [CLAVE_INDICE])
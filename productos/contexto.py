@@ -0,0 +1,103 @@
+"""
+Contexto del usuario por petición: perfil, rol y resumen del carrito.
+
+Se carga una sola vez (perezosamente) con una consulta que une User,
+PerfilUsuario, Carrito y los items del carrito, y queda guardado en el
+propio objeto ``user``. Así ``es_admin()``, el dashboard, los viewsets y
+los tags del carrito no repiten consultas dentro de la misma petición::
+
+    request.contexto_usuario.es_admin
+    request.contexto_usuario.total_items
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.contrib.auth.models import User
+from django.utils.functional import SimpleLazyObject
+
+from . import metricas
+from .models import PerfilUsuario, Carrito, suma_items, suma_precio
+from .roles import guardar_rol
+
+ATRIBUTO_CACHE = '_contexto_usuario'
+
+
+@dataclass
+class ContextoUsuario:
+    perfil: PerfilUsuario = None
+    carrito: Carrito = None
+    es_admin: bool = False
+    total_items: int = 0
+    total_precio: Decimal = Decimal('0.00')
+
+
+CONTEXTO_ANONIMO = ContextoUsuario()
+
+
+def _cargar(user):
+    fila = User.objects.select_related('perfilusuario', 'carrito').annotate(
+        _total_items=suma_items('carrito__items__'),
+        _total_precio=suma_precio('carrito__items__'),
+    ).get(pk=user.pk)
+
+    perfil = getattr(fila, 'perfilusuario', None)
+    carrito = getattr(fila, 'carrito', None)
+
+    # Dejar perfil y carrito en la caché de relaciones del user de la petición:
+    # request.user.perfilusuario / .carrito ya no consultan la BD
+    if perfil is not None:
+        user.perfilusuario = perfil
+    if carrito is not None:
+        user.carrito = carrito
+    # De paso, el rol queda en caché para roles.es_admin()
+    guardar_rol(user.pk, perfil.tipo_usuario if perfil is not None else None)
+
+    return ContextoUsuario(
+        perfil=perfil,
+        carrito=carrito,
+        es_admin=user.is_superuser or (perfil is not None and perfil.tipo_usuario == 'admin'),
+        total_items=fila._total_items,
+        total_precio=fila._total_precio,
+    )
+
+
+def contexto_de(user):
+    """Contexto del usuario, cargado como máximo una vez por objeto ``user``"""
+    if user is None or not user.is_authenticated:
+        return CONTEXTO_ANONIMO
+
+    contexto = getattr(user, ATRIBUTO_CACHE, None)
+    metricas.registrar_cache('contexto_usuario', contexto is not None)
+    if contexto is None:
+        with metricas.cronometro('contexto_usuario'):
+            contexto = _cargar(user)
+        setattr(user, ATRIBUTO_CACHE, contexto)
+    return contexto
+
+
+def invalidar_contexto(user):
+    """Descarta el contexto cargado (p. ej. tras modificar el carrito en la misma petición)"""
+    if user is not None and hasattr(user, ATRIBUTO_CACHE):
+        delattr(user, ATRIBUTO_CACHE)
+
+
+class ContextoUsuarioMiddleware:
+    """
+    Expone ``request.contexto_usuario``. No hace consultas por sí mismo: el
+    contexto se carga la primera vez que alguien lo lee. Debe ir después de
+    AuthenticationMiddleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.contexto_usuario = SimpleLazyObject(lambda: contexto_de(request.user))
+        # En modo async get_response devuelve la corrutina y Django la espera
+        return self.get_response(request)
@@ -0,0 +1,50 @@
+"""Envío de correo para vistas async y backend que mide el envío"""
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.mail import get_connection, send_mail
+from django.core.mail.backends.base import BaseEmailBackend
+
+from . import metricas
+from .instrumentacion import medir
+
+
+async def enviar_correo_async(**kwargs):
+    """
+    ``send_mail`` en el pool de hilos (thread_sensitive=False): la espera del
+    SMTP no bloquea el event loop ni el hilo compartido del código sync.
+    """
+    return await sync_to_async(send_mail, thread_sensitive=False)(**kwargs)
+
+
+class EmailBackendMedido(BaseEmailBackend):
+    """
+    Delega en ``EMAIL_BACKEND_REAL``, suma el tiempo de envío a ``correo_ms``
+    de la petición y alimenta las métricas de latencia y fallos de correo.
+    """
+
+    def __init__(self, fail_silently=False, **kwargs):
+        super().__init__(fail_silently=fail_silently)
+        self.real = get_connection(settings.EMAIL_BACKEND_REAL, fail_silently=fail_silently, **kwargs)
+
+    def open(self):
+        return self.real.open()
+
+    def close(self):
+        return self.real.close()
+
+    def send_messages(self, email_messages):
+        inicio = time.perf_counter()
+        enviados = 0
+        try:
+            with medir('correo'):
+                enviados = self.real.send_messages(email_messages) or 0
+            return enviados
+        finally:
+            # Con fail_silently el backend devuelve menos enviados en vez de lanzar
+            fallidos = len(email_messages or ()) - enviados
+            metricas.correo_segundos.observar(time.perf_counter() - inicio,
+                                              resultado='error' if fallidos else 'ok')
+            if fallidos > 0:
+                metricas.correo_fallos.inc(fallidos)
@@ -0,0 +1,69 @@
+"""
+KPIs del catálogo en una sola consulta agrupada por categoría.
+
+Lo usan el dashboard de administrador, /api/estadisticas/ y el índice del
+admin. El resultado se guarda en la caché ``ESTADISTICAS_CACHE_SEGUNDOS`` y
+se descarta al guardar o borrar productos y categorías
+(models.invalidar_estadisticas).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import Coalesce, NullIf
+
+from . import metricas
+from .models import Categoria
+
+CLAVE_CACHE = 'estadisticas:catalogo'
+
+
+def _conteo(**filtro):
+    return Count('productos', filter=Q(**{f'productos__{campo}': valor for campo, valor in filtro.items()}))
+
+
+def calcular():
+    """Calcula las estadísticas sin pasar por la caché"""
+    precio_actual = Coalesce(NullIf(F('productos__precio_oferta'), 0), F('productos__precio'))
+    filas = list(
+        Categoria.objects.order_by('nombre').values('id', 'nombre', 'activo').annotate(
+            total=Count('productos'),
+            disponibles=_conteo(estado='disponible'),
+            agotados=_conteo(estado='agotado'),
+            descontinuados=_conteo(estado='descontinuado'),
+            sin_stock=_conteo(stock=0),
+            destacados=_conteo(destacado=True, estado='disponible'),
+            valor_inventario=Coalesce(
+                Sum(precio_actual * F('productos__stock'), output_field=DecimalField(max_digits=18, decimal_places=2)),
+                0, output_field=DecimalField(max_digits=18, decimal_places=2),
+            ),
+        )
+    )
+
+    totales = {
+        campo: sum(fila[campo] for fila in filas)
+        for campo in ['total', 'disponibles', 'agotados', 'descontinuados', 'sin_stock', 'destacados',
+                      'valor_inventario']
+    }
+    return {
+        'productos': totales,
+        'categorias': {
+            'total': len(filas),
+            'activas': sum(1 for fila in filas if fila['activo']),
+        },
+        'por_categoria': filas,
+    }
+
+
+def obtener():
+    """Estadísticas cacheadas con TTL corto"""
+    datos = cache.get(CLAVE_CACHE)
+    metricas.registrar_cache('estadisticas', datos is not None)
+    if datos is None:
+        with metricas.cronometro('estadisticas'):
+            datos = calcular()
+        cache.set(CLAVE_CACHE, datos, getattr(settings, 'ESTADISTICAS_CACHE_SEGUNDOS', 60))
+    return datos
+
+
+def invalidar():
+    cache.delete(CLAVE_CACHE)
@@ -0,0 +1,107 @@
+"""
+Pub/sub en proceso para empujar cambios a las conexiones SSE.
+
+Las señales de los modelos publican en canales (``carrito:<carrito_id>``,
+``producto:<producto_id>``) desde cualquier hilo; cada suscripción vive en
+el event loop de su conexión y recibe los eventos por una cola acotada
+(``call_soon_threadsafe``).
+
+Es local al proceso: con varios workers un evento solo llega a las
+conexiones del worker que hizo el cambio. Por eso el stream SSE además
+revisa el estado en cada latido, y los demás workers se enteran con esa
+demora como máximo.
+"""
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_suscriptores = {}  # canal -> set de Suscripcion
+_candado = threading.Lock()
+
+
+def canal_carrito(carrito_id):
+    return f'carrito:{carrito_id}'
+
+
+def canal_producto(producto_id):
+    return f'producto:{producto_id}'
+
+
+class Suscripcion:
+    """Cola de eventos de un conjunto de canales; usar como context manager"""
+
+    def __init__(self, canales=(), maximo=100):
+        self.loop = asyncio.get_running_loop()
+        self.cola = asyncio.Queue(maxsize=maximo)
+        self.canales = set()
+        self.cambiar(canales)
+
+    def cambiar(self, canales):
+        """Reemplaza los canales escuchados (p. ej. cuando cambian los productos del carrito)"""
+        canales = set(canales)
+        with _candado:
+            for canal in self.canales - canales:
+                suscriptores = _suscriptores.get(canal)
+                if suscriptores:
+                    suscriptores.discard(self)
+                    if not suscriptores:
+                        del _suscriptores[canal]
+            for canal in canales - self.canales:
+                _suscriptores.setdefault(canal, set()).add(self)
+        self.canales = canales
+
+    def cerrar(self):
+        self.cambiar(())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def _entregar(self, evento):
+        # Corre en el loop de la suscripción; si el cliente no consume se
+        # descarta el evento más viejo
+        if self.cola.full():
+            self.cola.get_nowait()
+        self.cola.put_nowait(evento)
+
+    async def siguiente(self, timeout):
+        """Próximo evento, o None si no llegó ninguno en ``timeout`` segundos"""
+        try:
+            return await asyncio.wait_for(self.cola.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def pendientes(self):
+        """Vacía la cola sin esperar"""
+        eventos = []
+        while not self.cola.empty():
+            eventos.append(self.cola.get_nowait())
+        return eventos
+
+
+def publicar(canal, evento):
+    """Entrega ``evento`` (dict) a los suscriptores de ``canal``; seguro desde cualquier hilo"""
+    with _candado:
+        suscriptores = list(_suscriptores.get(canal, ()))
+    for suscripcion in suscriptores:
+        try:
+            suscripcion.loop.call_soon_threadsafe(suscripcion._entregar, evento)
+        except RuntimeError:
+            # Loop cerrado: la conexión terminó sin llegar a desuscribirse
+            logger.debug('Suscripción descartada en %s', canal)
+            suscripcion.cerrar()
+
+
+def hay_suscriptores(canal):
+    return canal in _suscriptores
+
+
+def productos_escuchados():
+    """Ids de los productos con al menos una conexión SSE escuchando"""
+    prefijo = canal_producto('')
+    with _candado:
+        return [int(canal[len(prefijo):]) for canal in _suscriptores if canal.startswith(prefijo)]
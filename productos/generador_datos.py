@@ -0,0 +1,131 @@
+"""
+Generador de datos sintéticos a escala de producción (manage.py generar_datos).
+
+Todo se inserta con bulk_create por lotes dentro de transacciones; los
+usuarios pasan por usuarios.crear_usuarios_en_bloque para que perfiles y
+carritos se creen en el mismo lote. Con la misma semilla se obtiene exactamente el mismo catálogo.
+"""
+import random
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .models import Categoria, Producto, Carrito, ItemCarrito
+from .usuarios import crear_usuarios_en_bloque
+
+PALABRAS_PRODUCTO = [
+    'Teclado', 'Mouse', 'Headset', 'Monitor', 'Silla', 'Control', 'Consola', 'Tarjeta gráfica',
+    'Procesador', 'SSD', 'Micrófono', 'Webcam', 'Mousepad', 'Volante', 'Gafas VR',
+]
+ADJETIVOS = ['Pro', 'Ultra', 'RGB', 'Inalámbrico', 'Mecánico', 'Elite', 'Lite', 'X', 'Max', 'Gamer']
+
+
+class GeneradorDatos:
+    def __init__(self, semilla=42, lote=5000, prefijo='sintetico', password='Gamerly-sintetico-1', salida=None):
+        self.rng = random.Random(semilla)
+        self.lote = lote
+        self.prefijo = prefijo
+        self.password = password
+        self.salida = salida or (lambda mensaje: None)
+
+    def _en_lotes(self, modelo, objetos):
+        """Inserta un iterable de objetos por lotes, sin materializarlo completo"""
+        total, lote = 0, []
+        for objeto in objetos:
+            lote.append(objeto)
+            if len(lote) >= self.lote:
+                total += self._insertar(modelo, lote)
+                lote = []
+        if lote:
+            total += self._insertar(modelo, lote)
+        return total
+
+    def _insertar(self, modelo, lote):
+        with transaction.atomic():
+            modelo.objects.bulk_create(lote, batch_size=self.lote)
+        self.salida(f'  {modelo.__name__}: +{len(lote)}')
+        return len(lote)
+
+    # ---------- catálogo ----------
+
+    def categorias(self, cantidad):
+        inicio = Categoria.objects.filter(nombre__startswith=f'{self.prefijo} ').count()
+        self._en_lotes(Categoria, (
+            Categoria(nombre=f'{self.prefijo} {i}', descripcion='Categoría sintética', activo=self.rng.random() > 0.1)
+            for i in range(inicio, inicio + cantidad)
+        ))
+        return list(Categoria.objects.filter(nombre__startswith=f'{self.prefijo} ').values_list('id', flat=True))
+
+    def _producto(self, indice, categoria_ids):
+        rng = self.rng
+        # Precios en miles de pesos con cola larga: la mayoría baratos, pocos muy caros
+        precio = Decimal(int(min(rng.lognormvariate(12, 1.0), 15_000_000) // 1000 * 1000) or 1000)
+        precio_oferta = None
+        if rng.random() < 0.25:
+            precio_oferta = (precio * Decimal(rng.choice([60, 70, 75, 80, 85, 90])) / 100).quantize(Decimal('1'))
+
+        stock = 0 if rng.random() < 0.1 else int(rng.expovariate(1 / 40)) + 1
+        if rng.random() < 0.02:
+            estado = 'descontinuado'
+        elif stock == 0:
+            estado = 'agotado'
+        else:
+            estado = 'disponible'
+
+        return Producto(
+            nombre=f'{rng.choice(PALABRAS_PRODUCTO)} {rng.choice(ADJETIVOS)} {indice}',
+            descripcion='Producto sintético generado para pruebas de carga',
+            precio=precio,
+            precio_oferta=precio_oferta,
+            categoria_id=rng.choice(categoria_ids),
+            stock=stock,
+            estado=estado,
+            destacado=rng.random() < 0.03,
+        )
+
+    def productos(self, cantidad, categoria_ids):
+        return self._en_lotes(Producto, (self._producto(i, categoria_ids) for i in range(cantidad)))
+
+    # ---------- usuarios ----------
+
+    def usuarios(self, cantidad):
+        """Crea usuarios con perfil y carrito; retorna los ids de sus carritos"""
+        inicio = User.objects.filter(username__startswith=f'{self.prefijo}_').count()
+        hash_password = make_password(self.password)  # un solo hash para todos
+
+        usuario_ids, lote = [], []
+        for i in range(inicio, inicio + cantidad):
+            lote.append(User(username=f'{self.prefijo}_{i}', email=f'{self.prefijo}_{i}@example.com',
+                             first_name='Usuario', last_name=f'Sintético {i}', password=hash_password))
+            if len(lote) >= self.lote or i == inicio + cantidad - 1:
+                usuario_ids += crear_usuarios_en_bloque(lote, batch_size=self.lote)
+                self.salida(f'  User + PerfilUsuario + Carrito: +{len(lote)}')
+                lote = []
+
+        return list(Carrito.objects.filter(usuario_id__in=usuario_ids).values_list('id', flat=True))
+
+    def carritos(self, carrito_ids, producto_ids, max_items):
+        def items():
+            for carrito_id in carrito_ids:
+                cantidad_items = self.rng.randint(0, max_items)
+                for producto_id in self.rng.sample(producto_ids, min(cantidad_items, len(producto_ids))):
+                    yield ItemCarrito(carrito_id=carrito_id, producto_id=producto_id,
+                                      cantidad=self.rng.randint(1, 3))
+
+        return self._en_lotes(ItemCarrito, items())
+
+    def generar(self, categorias, productos, usuarios, max_items_carrito):
+        categoria_ids = self.categorias(categorias)
+        self.productos(productos, categoria_ids)
+        carrito_ids = self.usuarios(usuarios)
+
+        producto_ids = list(Producto.objects.filter(estado='disponible').values_list('id', flat=True))
+        items = self.carritos(carrito_ids, producto_ids, max_items_carrito) if producto_ids else 0
+        return {
+            'categorias': categorias,
+            'productos': productos,
+            'usuarios': usuarios,
+            'items_carrito': items,
+        }
@@ -0,0 +1,25 @@
+"""
+Hashers con costo configurable por entorno.
+
+Mantienen el mismo ``algorithm`` que los de Django, así los hashes existentes
+siguen verificando. Cuando el costo configurado cambia, ``must_update``
+devuelve True y Django regenera el hash en el siguiente login correcto.
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, ScryptPasswordHasher
+
+
+class PBKDF2GamerlyHasher(PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 con iteraciones tomadas de GAMERLY_PBKDF2_ITERACIONES"""
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'GAMERLY_PBKDF2_ITERACIONES', PBKDF2PasswordHasher.iterations)
+
+
+class ScryptGamerlyHasher(ScryptPasswordHasher):
+    """Scrypt con factor de trabajo (N) tomado de GAMERLY_SCRYPT_N"""
+
+    @property
+    def work_factor(self):
+        return getattr(settings, 'GAMERLY_SCRYPT_N', ScryptPasswordHasher.work_factor)
@@ -0,0 +1,273 @@
+"""
+Instrumentación por petición: request id, tiempos por fase y logs JSON.
+
+``InstrumentacionMiddleware`` abre una ``Medicion`` por petición (en un
+ContextVar, así la ven también los hilos de sync_to_async) y al terminar
+escribe en el logger ``productos.peticiones`` una línea con::
+
+    request_id, metodo, ruta, vista, estado, total_ms, vista_ms,
+    db_ms, db_consultas, plantillas_ms, correo_ms
+
+Las fases se miden donde ocurren: las consultas con un execute_wrapper en
+cada conexión, las plantillas con el backend ``PlantillasMedidas`` y el
+correo con ``correo.EmailBackendMedido``. ``vista_ms`` es el resto.
+
+Todas las peticiones alimentan además los histogramas de ``metricas``.
+
+Solo se registra una fracción ``LOG_PETICIONES_MUESTREO`` de las peticiones;
+las lentas (``LOG_PETICIONES_LENTAS_MS``) y los errores 5xx siempre. Los
+registros pasan por ``ManejadorEnCola``: el hilo de la petición solo
+formatea y encola, la escritura a stderr la hace un hilo aparte.
+
+Este módulo se carga al configurar el logging, antes que las apps: no debe
+importar modelos.
+"""
+import json
+import logging
+import queue
+import random
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates
+
+from . import metricas
+
+logger = logging.getLogger('productos.peticiones')
+
+CABECERA = 'X-Request-ID'
+_REQUEST_ID_VALIDO = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+_medicion = ContextVar('gamerly_medicion', default=None)
+
+
+@dataclass
+class Medicion:
+    request_id: str
+    request: object = None
+    inicio: float = field(default_factory=time.perf_counter)
+    db_ms: float = 0.0
+    db_consultas: int = 0
+    plantillas_ms: float = 0.0
+    correo_ms: float = 0.0
+    en_curso: set = field(default_factory=set)
+
+
+def medicion_actual():
+    return _medicion.get()
+
+
+def request_id_actual():
+    medicion = _medicion.get()
+    return medicion.request_id if medicion is not None else None
+
+
+def vista_actual():
+    """Nombre de URL de la petición en curso; None antes de resolverla o fuera de una petición"""
+    medicion = _medicion.get()
+    coincidencia = getattr(medicion.request, 'resolver_match', None) if medicion is not None else None
+    return coincidencia.view_name if coincidencia is not None else None
+
+
+@contextmanager
+def medir(fase):
+    """Suma la duración del bloque a ``<fase>_ms`` de la petición en curso (sin contar anidados)"""
+    medicion = _medicion.get()
+    if medicion is None or fase in medicion.en_curso:
+        yield
+        return
+    medicion.en_curso.add(fase)
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicion.en_curso.discard(fase)
+        atributo = f'{fase}_ms'
+        setattr(medicion, atributo, getattr(medicion, atributo) + (time.perf_counter() - inicio) * 1000)
+
+
+# ---------- fases ----------
+
+@receiver(connection_created)
+def medir_consultas(sender, connection, **kwargs):
+    if _medir_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_medir_consulta)
+
+
+def _medir_consulta(execute, sql, params, many, context):
+    medicion = _medicion.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicion.db_ms += (time.perf_counter() - inicio) * 1000
+        medicion.db_consultas += 1
+
+
+class _PlantillaMedida:
+    def __init__(self, plantilla):
+        self.plantilla = plantilla
+
+    def render(self, context=None, request=None):
+        with medir('plantillas'):
+            return self.plantilla.render(context, request)
+
+    def __getattr__(self, nombre):
+        return getattr(self.plantilla, nombre)
+
+
+class PlantillasMedidas(DjangoTemplates):
+    """Backend DjangoTemplates que mide el render de cada plantilla"""
+
+    def from_string(self, template_code):
+        return _PlantillaMedida(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _PlantillaMedida(super().get_template(template_name))
+
+
+# ---------- logging ----------
+
+# Atributos propios de LogRecord; el resto viene de extra={...}
+_ATRIBUTOS_ESTANDAR = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class FormatoJSON(logging.Formatter):
+    """Una línea JSON por registro; los campos de ``extra`` van al primer nivel"""
+
+    def format(self, record):
+        datos = {
+            'fecha': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'mensaje': record.getMessage(),
+        }
+        for clave, valor in vars(record).items():
+            if clave not in _ATRIBUTOS_ESTANDAR and not clave.startswith('_'):
+                datos[clave] = valor
+        if record.exc_info:
+            datos['excepcion'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            datos['pila'] = self.formatStack(record.stack_info)
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class FiltroRequestId(logging.Filter):
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = request_id_actual() or '-'
+        return True
+
+
+class ManejadorEnCola(QueueHandler):
+    """
+    Formatea en el hilo que registra y encola; un hilo aparte escribe en
+    stderr. Así una petición no espera por la escritura a la consola.
+    """
+
+    def __init__(self):
+        cola = queue.SimpleQueue()
+        super().__init__(cola)
+        salida = logging.StreamHandler()
+        salida.setFormatter(logging.Formatter('%(message)s'))
+        self.listener = QueueListener(cola, salida)
+        self.listener.start()
+
+    def close(self):
+        # logging.shutdown() (al salir) y dictConfig (al reconfigurar) cierran
+        # el handler: se escribe lo pendiente y termina el hilo
+        if self.listener._thread is not None:
+            self.listener.stop()
+        super().close()
+
+
+# ---------- middleware ----------
+
+def _request_id(request):
+    recibido = request.headers.get(CABECERA, '')
+    return recibido if _REQUEST_ID_VALIDO.match(recibido) else uuid.uuid4().hex
+
+
+class InstrumentacionMiddleware:
+    """Request id (cabecera X-Request-ID) y línea de tiempos por petición; va primero en MIDDLEWARE"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _iniciar(self, request):
+        medicion = Medicion(request_id=_request_id(request), request=request)
+        request.request_id = medicion.request_id
+        return medicion, _medicion.set(medicion)
+
+    def _terminar(self, request, respuesta, medicion):
+        respuesta[CABECERA] = medicion.request_id
+        total_ms = (time.perf_counter() - medicion.inicio) * 1000
+        coincidencia = getattr(request, 'resolver_match', None)
+        vista = coincidencia.view_name if coincidencia else None
+
+        metricas.registrar_peticion(
+            vista or metricas.SIN_VISTA, request.method, respuesta.status_code,
+            total_ms / 1000, medicion.db_consultas, medicion.db_ms / 1000,
+        )
+
+        lenta = total_ms >= getattr(settings, 'LOG_PETICIONES_LENTAS_MS', 1000)
+        if not (lenta or respuesta.status_code >= 500
+                or random.random() < getattr(settings, 'LOG_PETICIONES_MUESTREO', 1.0)):
+            return respuesta
+
+        usuario = getattr(request, '_cached_user', None)  # sin forzar la carga del usuario
+        logger.log(
+            logging.WARNING if lenta else logging.INFO,
+            '%s %s %s %.1f ms', request.method, request.path, respuesta.status_code, total_ms,
+            extra={
+                'request_id': medicion.request_id,
+                'metodo': request.method,
+                'ruta': request.path,
+                'vista': vista,
+                'estado': respuesta.status_code,
+                'usuario_id': usuario.pk if usuario is not None and usuario.is_authenticated else None,
+                'total_ms': round(total_ms, 2),
+                'vista_ms': round(max(total_ms - medicion.db_ms - medicion.plantillas_ms - medicion.correo_ms, 0), 2),
+                'db_ms': round(medicion.db_ms, 2),
+                'db_consultas': medicion.db_consultas,
+                'plantillas_ms': round(medicion.plantillas_ms, 2),
+                'correo_ms': round(medicion.correo_ms, 2),
+            },
+        )
+        return respuesta
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        medicion, token = self._iniciar(request)
+        try:
+            respuesta = self.get_response(request)
+        finally:
+            _medicion.reset(token)
+        return self._terminar(request, respuesta, medicion)
+
+    async def __acall__(self, request):
+        medicion, token = self._iniciar(request)
+        try:
+            respuesta = await self.get_response(request)
+        finally:
+            _medicion.reset(token)
+        return self._terminar(request, respuesta, medicion)
@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from productos import consultas_lentas
+
+
+class Command(BaseCommand):
+    help = 'Top de consultas lentas agrupadas por huella (ver productos/consultas_lentas.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20,
+                            help='Cuántas huellas mostrar (default: 20)')
+        parser.add_argument('--orden', choices=list(consultas_lentas.ORDENES), default='suma_ms',
+                            help='suma_ms (default), max_ms o veces')
+        parser.add_argument('--sql', action='store_true',
+                            help='Mostrar el SQL de ejemplo completo del peor caso')
+        parser.add_argument('--limpiar', action='store_true',
+                            help='Borrar lo acumulado después de mostrarlo')
+
+    def handle(self, *args, **options):
+        if 'locmem' in settings.CACHES['default']['BACKEND'].lower():
+            self.stdout.write(self.style.WARNING(
+                '⚠️ LocMemCache es por proceso: este comando no ve lo registrado por el servidor '
+                '(configurar GAMERLY_REDIS_URL)'))
+
+        entradas = consultas_lentas.reporte(options['top'], options['orden'])
+        if not entradas:
+            self.stdout.write('No hay consultas lentas registradas')
+            return
+
+        self.stdout.write(f"{'Huella':<17} {'veces':>7} {'total ms':>10} {'prom. ms':>9} {'máx. ms':>9}  vista")
+        for entrada in entradas:
+            self.stdout.write(
+                f"{entrada['huella']:<17} {entrada['veces']:>7} {entrada['suma_ms']:>10.1f} "
+                f"{entrada['promedio_ms']:>9.1f} {entrada['max_ms']:>9.1f}  {entrada['vista']}"
+            )
+            self.stdout.write(f"    {entrada['sql'][:160]}")
+            for linea in entrada['origen']:
+                self.stdout.write(f'    ↳ {linea}')
+            if options['sql']:
+                self.stdout.write(f"    {entrada['ejemplo']}")
+
+        if options['limpiar']:
+            consultas_lentas.limpiar()
+            self.stdout.write(self.style.SUCCESS('✅ Registro de consultas lentas vaciado'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from productos.replicas import replicas_configuradas
+
+
+class Command(BaseCommand):
+    help = 'Copia la BD SQLite principal a los archivos de DATABASE_REPLICAS (réplicas locales de prueba)'
+
+    def handle(self, *args, **options):
+        principal = connections['default']
+        if principal.vendor != 'sqlite':
+            raise CommandError('Solo para SQLite: con MySQL la replicación la hace el servidor')
+        if not replicas_configuradas():
+            raise CommandError('No hay réplicas configuradas (GAMERLY_DB_REPLICAS)')
+
+        principal.ensure_connection()
+        for alias in replicas_configuradas():
+            replica = connections[alias]
+            replica.close()
+            replica.ensure_connection()
+            # API de backup de sqlite3: copia consistente aunque haya escrituras en curso
+            principal.connection.backup(replica.connection)
+            replica.close()
+            self.stdout.write(self.style.SUCCESS(f"✅ {alias}: {replica.settings_dict['NAME']}"))
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from productos.generador_datos import GeneradorDatos
+
+
+class Command(BaseCommand):
+    help = 'Genera categorías, productos, usuarios (con perfil y carrito) e items sintéticos en bloque'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categorias', type=int, default=50)
+        parser.add_argument('--productos', type=int, default=100_000)
+        parser.add_argument('--usuarios', type=int, default=10_000)
+        parser.add_argument('--max-items-carrito', type=int, default=5)
+        parser.add_argument('--semilla', type=int, default=42, help='Semilla del generador aleatorio')
+        parser.add_argument('--lote', type=int, default=5000, help='Filas por bulk_create')
+        parser.add_argument('--prefijo', default='sintetico', help='Prefijo de usuarios y categorías')
+        parser.add_argument('--silencioso', action='store_true', help='No mostrar el progreso por lote')
+
+    def handle(self, *args, **options):
+        generador = GeneradorDatos(
+            semilla=options['semilla'],
+            lote=options['lote'],
+            prefijo=options['prefijo'],
+            salida=None if options['silencioso'] else self.stdout.write,
+        )
+
+        inicio = time.perf_counter()
+        totales = generador.generar(
+            categorias=options['categorias'],
+            productos=options['productos'],
+            usuarios=options['usuarios'],
+            max_items_carrito=options['max_items_carrito'],
+        )
+        duracion = time.perf_counter() - inicio
+
+        resumen = ', '.join(f'{valor} {nombre}' for nombre, valor in totales.items())
+        self.stdout.write(self.style.SUCCESS(f'✅ Generados {resumen} en {duracion:.1f} s'))
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from productos import sincronizacion
+
+
+class Command(BaseCommand):
+    help = ('Borra las marcas de ProductoEliminado más viejas que SINCRONIZACION_RETENCION_DIAS '
+            '(ver productos/sincronizacion.py); pensado para un cron diario')
+
+    def handle(self, *args, **options):
+        borradas = sincronizacion.limpiar_eliminados()
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {borradas} marcas de borrado eliminadas (retención: {settings.SINCRONIZACION_RETENCION_DIAS} días)'))
@@ -0,0 +1,47 @@
+import statistics
+import time
+
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Mide el tiempo de hash por hasher configurado para dimensionar los workers de login'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=5,
+                            help='Hashes por hasher (default: 5)')
+        parser.add_argument('--logins-por-segundo', type=float, default=None,
+                            help='Throughput de login objetivo para estimar núcleos necesarios')
+
+    def handle(self, *args, **options):
+        repeticiones = options['repeticiones']
+        objetivo = options['logins_por_segundo']
+
+        self.stdout.write(f"{'Hasher':<45} {'ms/hash':>10} {'desv.':>8} {'hash/s/núcleo':>14}")
+        for indice, hasher in enumerate(get_hashers()):
+            nombre = f"{type(hasher).__name__}{' (preferido)' if indice == 0 else ''}"
+            try:
+                salt = hasher.salt()
+                hasher.encode('calentamiento-123', salt)
+            except ValueError as e:
+                # Hashers cuya librería (argon2-cffi, bcrypt) no está instalada
+                self.stdout.write(self.style.WARNING(f'{nombre:<45} omitido: {e}'))
+                continue
+
+            tiempos = []
+            for i in range(repeticiones):
+                inicio = time.perf_counter()
+                hasher.encode(f'password-{i}', salt)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+
+            media = statistics.mean(tiempos)
+            desviacion = statistics.stdev(tiempos) if len(tiempos) > 1 else 0.0
+            self.stdout.write(f'{nombre:<45} {media:>10.1f} {desviacion:>8.1f} {1000 / media:>14.1f}')
+
+            if objetivo and indice == 0:
+                nucleos = objetivo * media / 1000
+                self.stdout.write(self.style.SUCCESS(
+                    f'  → {objetivo:g} logins/s con el hasher preferido requieren ~{nucleos:.1f} núcleos '
+                    f'dedicados solo al hash'
+                ))
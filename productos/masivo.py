@@ -0,0 +1,144 @@
+"""
+Cambios masivos de precio de oferta, stock, destacado y estado.
+
+Cada operación es un único ``UPDATE`` con expresiones ``F()`` sobre el
+queryset filtrado (acciones del admin y POST /api/productos/masivo/), en
+lugar de guardar fila por fila. ``update()`` no dispara señales ni
+``auto_now``, así que aquí se hace una vez por lote lo que las señales
+hacen por producto: se actualiza ``fecha_actualizacion`` (para
+/api/productos/cambios/), se invalidan las estadísticas y se avisa por SSE
+a quienes tienen alguno de los productos en el carrito.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, Value
+from django.db.models.functions import Greatest, Round
+from django.utils import timezone
+
+from . import eventos, estadisticas
+from .models import Producto
+
+_DECIMAL = DecimalField(max_digits=10, decimal_places=2)
+
+
+class OperacionInvalida(ValueError):
+    pass
+
+
+def _decimal(valor, minimo=None, maximo=None):
+    try:
+        valor = Decimal(str(valor))
+    except (ArithmeticError, ValueError, TypeError):
+        raise OperacionInvalida('Se requiere un valor numérico')
+    if not valor.is_finite() or (minimo is not None and valor <= minimo) or (maximo is not None and valor >= maximo):
+        raise OperacionInvalida(f'Valor fuera de rango: {valor}')
+    return valor
+
+
+def _entero(valor):
+    valor = _decimal(valor)
+    if valor != valor.to_integral_value():
+        raise OperacionInvalida('Se requiere un número entero')
+    return int(valor)
+
+
+def _escuchados(queryset):
+    """Ids del lote que alguien sigue por SSE; se leen antes del UPDATE, que puede sacarlos del filtro"""
+    ids = eventos.productos_escuchados()
+    if not ids:
+        return []
+    return list(queryset.filter(pk__in=ids).values_list('id', flat=True))
+
+
+def _actualizar(queryset, avisar_stock=False, **valores):
+    escuchados = _escuchados(queryset) if avisar_stock else []
+
+    # Un UPDATE ya es atómico; si hay una transacción abierta, caché y avisos esperan al commit
+    actualizados = queryset.update(fecha_actualizacion=timezone.now(), **valores)
+    transaction.on_commit(lambda: _despues_del_lote(escuchados))
+    return actualizados
+
+
+def _despues_del_lote(escuchados):
+    estadisticas.invalidar()
+    for producto in Producto.objects.filter(pk__in=escuchados).values('id', 'stock', 'estado'):
+        eventos.publicar(eventos.canal_producto(producto['id']), {
+            'tipo': 'stock', 'producto_id': producto['id'], 'stock': producto['stock'], 'estado': producto['estado'],
+        })
+
+
+def _sin_orden(queryset):
+    # El orden y los select_related del changelist no aplican a un UPDATE
+    return queryset.order_by().select_related(None)
+
+
+# ---------- operaciones ----------
+
+def descuento_porcentaje(queryset, porcentaje):
+    """precio_oferta = precio menos ``porcentaje``%, redondeado al peso"""
+    factor = (100 - _decimal(porcentaje, minimo=0, maximo=100)) / 100
+    return _actualizar(
+        _sin_orden(queryset),
+        precio_oferta=Round(F('precio') * Value(factor, output_field=_DECIMAL), output_field=_DECIMAL),
+    )
+
+
+def descuento_fijo(queryset, monto):
+    """precio_oferta = precio - ``monto``; los productos que valen ``monto`` o menos no cambian"""
+    monto = _decimal(monto, minimo=0)
+    return _actualizar(
+        _sin_orden(queryset).filter(precio__gt=monto),
+        precio_oferta=F('precio') - Value(monto, output_field=_DECIMAL),
+    )
+
+
+def quitar_oferta(queryset, valor=None):
+    return _actualizar(_sin_orden(queryset).exclude(precio_oferta=None), precio_oferta=None)
+
+
+def fijar_stock(queryset, stock):
+    stock = _entero(stock)
+    if stock < 0:
+        raise OperacionInvalida('El stock no puede ser negativo')
+    return _actualizar(_sin_orden(queryset), avisar_stock=True, stock=stock)
+
+
+def sumar_stock(queryset, cantidad):
+    """Suma (o resta, si es negativa) ``cantidad`` al stock sin bajar de 0"""
+    return _actualizar(_sin_orden(queryset), avisar_stock=True,
+                       stock=Greatest(F('stock') + _entero(cantidad), 0))
+
+
+def destacar(queryset, valor=True):
+    if valor is None:
+        valor = True
+    if not isinstance(valor, bool):
+        raise OperacionInvalida('destacar requiere true o false')
+    return _actualizar(_sin_orden(queryset), destacado=valor)
+
+
+def cambiar_estado(queryset, estado):
+    if estado not in dict(Producto.ESTADOS):
+        raise OperacionInvalida(f'Estado inválido: {estado}')
+    return _actualizar(_sin_orden(queryset), avisar_stock=True, estado=estado)
+
+
+OPERACIONES = {
+    'descuento_porcentaje': descuento_porcentaje,
+    'descuento_fijo': descuento_fijo,
+    'quitar_oferta': quitar_oferta,
+    'fijar_stock': fijar_stock,
+    'sumar_stock': sumar_stock,
+    'destacar': destacar,
+    'cambiar_estado': cambiar_estado,
+}
+
+
+def aplicar(queryset, operacion, valor=None):
+    """Aplica ``operacion`` (clave de OPERACIONES) y retorna cuántos productos cambiaron"""
+    try:
+        funcion = OPERACIONES[operacion]
+    except KeyError:
+        raise OperacionInvalida(f'Operación desconocida: {operacion}')
+    return funcion(queryset, valor)
@@ -0,0 +1,376 @@
+"""
+Métricas en proceso con formato de texto de Prometheus (GET /metrics).
+
+Registro propio, sin dependencias: contadores e histogramas con etiquetas,
+protegidos por un candado. Se alimentan desde:
+
+- InstrumentacionMiddleware: latencia de la vista por nombre de URL,
+  consultas y tiempo de BD por petición
+- correo.EmailBackendMedido: latencia y fallos del envío de correo
+- estadisticas, roles y authentication: aciertos/fallos de sus cachés
+- ``cronometro()``: operaciones puntuales (totales del carrito, KPIs)
+
+Con varios workers de gunicorn cada proceso tiene su propio registro. Si
+``METRICAS_DIR`` está configurado, cada proceso vuelca su registro a
+``<METRICAS_DIR>/<pid>-<inicio>.json`` como máximo cada ``METRICAS_VOLCADO_SEGUNDOS``
+(y al salir), y /metrics suma los volcados de todos los procesos. La
+escritura va en un hilo aparte, nunca en el de la petición ni en el event
+loop. Los volcados de workers ya terminados se suman en ``agregado.json`` y
+se borran, para que los contadores no retrocedan sin que el directorio crezca
+con cada reinicio de worker; el directorio se vacía al arrancar gunicorn
+(``limpiar_directorio`` en los .conf.py de deploy/).
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: sin compactar volcados
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200)
+AGREGADO = 'agregado.json'  # suma de los volcados de workers terminados
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+SIN_VISTA = '<sin_ruta>'  # 404 de URL inexistente: la ruta cruda dispararía la cardinalidad
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, registro, nombre, ayuda, etiquetas):
+        self.registro = registro
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.series = {}
+
+    def _clave(self, valores):
+        return tuple(str(valores.get(etiqueta, '')) for etiqueta in self.etiquetas)
+
+
+class Contador(_Metrica):
+    tipo = 'counter'
+
+    def inc(self, cantidad=1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self.registro.candado:
+            self.series[clave] = self.series.get(clave, 0) + cantidad
+
+    def exportar(self):
+        return [[list(clave), valor] for clave, valor in self.series.items()]
+
+    @staticmethod
+    def sumar(a, b):
+        return a + b
+
+    def lineas(self, series):
+        for clave, valor in series:
+            yield f'{self.nombre}{_etiquetas(self.etiquetas, clave)} {_numero(valor)}'
+
+
+class Histograma(_Metrica):
+    tipo = 'histogram'
+
+    def __init__(self, registro, nombre, ayuda, etiquetas, buckets=BUCKETS_SEGUNDOS):
+        super().__init__(registro, nombre, ayuda, etiquetas)
+        self.buckets = tuple(buckets)
+
+    def observar(self, valor, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self.registro.candado:
+            serie = self.series.get(clave)
+            if serie is None:
+                serie = self.series[clave] = {'buckets': [0] * len(self.buckets), 'suma': 0, 'cuenta': 0}
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie['buckets'][i] += 1
+                    break
+            serie['suma'] += valor
+            serie['cuenta'] += 1
+
+    def exportar(self):
+        return [[list(clave), {**serie, 'buckets': list(serie['buckets'])}] for clave, serie in self.series.items()]
+
+    @staticmethod
+    def sumar(a, b):
+        return {
+            'buckets': [x + y for x, y in zip(a['buckets'], b['buckets'])],
+            'suma': a['suma'] + b['suma'],
+            'cuenta': a['cuenta'] + b['cuenta'],
+        }
+
+    def lineas(self, series):
+        for clave, serie in series:
+            acumulado = 0
+            for limite, cantidad in zip(self.buckets, serie['buckets']):
+                acumulado += cantidad
+                yield f'{self.nombre}_bucket{_etiquetas(self.etiquetas + ("le",), clave + [_numero(limite)])} {acumulado}'
+            yield f'{self.nombre}_bucket{_etiquetas(self.etiquetas + ("le",), clave + ["+Inf"])} {serie["cuenta"]}'
+            yield f'{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {_numero(serie["suma"])}'
+            yield f'{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {serie["cuenta"]}'
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def _etiquetas(nombres, valores):
+    if not nombres:
+        return ''
+    pares = (f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores))
+    return '{' + ','.join(pares) + '}'
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class Registro:
+    def __init__(self):
+        self.candado = threading.Lock()
+        self.metricas = {}
+        self._ultimo_volcado = 0.0
+        self._archivo = None  # (pid, nombre): tras un fork el worker usa su propio archivo
+        self._candado_volcado = threading.Lock()
+        self._hilo_volcado = None
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        return self._agregar(Contador(self, nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_SEGUNDOS):
+        return self._agregar(Histograma(self, nombre, ayuda, etiquetas, buckets))
+
+    def _agregar(self, metrica):
+        self.metricas[metrica.nombre] = metrica
+        return metrica
+
+    def exportar(self):
+        with self.candado:
+            return {nombre: metrica.exportar() for nombre, metrica in self.metricas.items()}
+
+    def limpiar(self):
+        with self.candado:
+            for metrica in self.metricas.values():
+                metrica.series.clear()
+
+    # ---------- multiproceso ----------
+
+    def _nombre_volcado(self):
+        # El pid solo no basta: un worker nuevo puede heredar el pid de uno
+        # muerto y pisar su archivo, y los contadores retrocederían
+        pid = os.getpid()
+        if self._archivo is None or self._archivo[0] != pid:
+            self._archivo = (pid, f'{pid}-{time.time_ns()}.json')
+        return self._archivo[1]
+
+    def volcar(self, forzar=False):
+        """
+        Escribe el registro de este proceso en METRICAS_DIR (si está
+        configurado), en segundo plano salvo con ``forzar`` (al salir)
+        """
+        directorio = getattr(settings, 'METRICAS_DIR', None)
+        if not directorio:
+            return
+        ahora = time.monotonic()
+        if not forzar and ahora - self._ultimo_volcado < getattr(settings, 'METRICAS_VOLCADO_SEGUNDOS', 5):
+            return
+        self._ultimo_volcado = ahora
+
+        # La foto se toma aquí (bajo el candado, sin E/S); el JSON y el disco,
+        # en otro hilo
+        argumentos = (directorio, self._nombre_volcado(), self.exportar())
+        if forzar:
+            self._escribir(*argumentos)
+        else:
+            self._hilo_volcado = threading.Thread(target=self._escribir, args=argumentos,
+                                                  name='metricas-volcado', daemon=True)
+            self._hilo_volcado.start()
+
+    def _escribir(self, directorio, nombre, datos):
+        with self._candado_volcado:
+            try:
+                os.makedirs(directorio, exist_ok=True)
+                _escribir_json(os.path.join(directorio, nombre), datos)
+            except OSError:
+                logger.warning('No se pudo volcar las métricas en %s', directorio, exc_info=True)
+
+    def _volcados(self):
+        """Registros exportados de todos los procesos; el propio, en vivo"""
+        directorio = getattr(settings, 'METRICAS_DIR', None)
+        volcados = [self.exportar()]
+        if not directorio or not os.path.isdir(directorio):
+            return volcados
+        propio = self._nombre_volcado()
+        self._compactar(directorio, propio)
+
+        with _candado_directorio(directorio, exclusivo=False):
+            for nombre in os.listdir(directorio):
+                if nombre.endswith('.json') and nombre != propio:
+                    datos = _leer_json(os.path.join(directorio, nombre))
+                    if datos is not None:
+                        volcados.append(datos)
+        return volcados
+
+    def _compactar(self, directorio, propio):
+        """Suma los volcados de workers terminados en AGREGADO y los borra"""
+        with _candado_directorio(directorio, exclusivo=True) as bloqueado:
+            if not bloqueado:
+                return
+            muertos = _volcados_terminados(directorio, propio)
+            if not muertos:
+                return
+            ruta_agregado = os.path.join(directorio, AGREGADO)
+            volcados = [_leer_json(ruta_agregado) or {}] + [_leer_json(ruta) or {} for ruta in muertos]
+            _escribir_json(ruta_agregado, self._exportar_suma(volcados))
+            for ruta in muertos:
+                os.remove(ruta)
+
+    def _sumar(self, volcados):
+        """{nombre: {clave: valor}} con las series de todos los volcados sumadas"""
+        sumadas = {}
+        for nombre, metrica in self.metricas.items():
+            series = sumadas[nombre] = {}
+            for volcado in volcados:
+                for clave, valor in volcado.get(nombre, ()):
+                    clave = tuple(clave)
+                    series[clave] = metrica.sumar(series[clave], valor) if clave in series else valor
+        return sumadas
+
+    def _exportar_suma(self, volcados):
+        return {nombre: [[list(clave), valor] for clave, valor in series.items()]
+                for nombre, series in self._sumar(volcados).items()}
+
+    def texto(self):
+        """Formato de exposición de Prometheus con todos los procesos sumados"""
+        sumadas = self._sumar(self._volcados())
+        lineas = []
+        for nombre, metrica in self.metricas.items():
+            lineas.append(f'# HELP {nombre} {metrica.ayuda}')
+            lineas.append(f'# TYPE {nombre} {metrica.tipo}')
+            lineas.extend(metrica.lineas([list(clave), valor] for clave, valor in sorted(sumadas[nombre].items())))
+        return '\n'.join(lineas) + '\n'
+
+
+def _leer_json(ruta):
+    try:
+        with open(ruta, encoding='utf-8') as archivo:
+            return json.load(archivo)
+    except (OSError, ValueError):
+        return None  # borrado o reemplazado justo ahora
+
+
+def _escribir_json(ruta, datos):
+    temporal = f'{ruta}.{os.getpid()}.tmp'
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(datos, archivo)
+    os.replace(temporal, ruta)  # atómico: quien lee nunca ve un archivo a medias
+
+
+@contextmanager
+def _candado_directorio(directorio, exclusivo):
+    """
+    flock sobre ``<directorio>/.candado``: la compactación (exclusivo) no se
+    cruza con una lectura, que sumaría un volcado dos veces. Sin fcntl el
+    candado no se toma y ``exclusivo`` entrega False (no se compacta)
+    """
+    if fcntl is None:
+        yield not exclusivo
+        return
+    with open(os.path.join(directorio, '.candado'), 'a') as candado:
+        fcntl.flock(candado, fcntl.LOCK_EX if exclusivo else fcntl.LOCK_SH)
+        try:
+            yield True
+        finally:
+            fcntl.flock(candado, fcntl.LOCK_UN)
+
+
+def _proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # existe, de otro usuario
+    return True
+
+
+def _volcados_terminados(directorio, propio):
+    """
+    Rutas de los volcados de procesos que ya no existen, o de un proceso
+    anterior con el mismo pid (el vivo es el de inicio más reciente)
+    """
+    por_pid = {}
+    for nombre in os.listdir(directorio):
+        if not nombre.endswith('.json') or nombre == propio:
+            continue
+        pid, _, inicio = nombre[:-len('.json')].partition('-')
+        if pid.isdigit() and inicio.isdigit():
+            por_pid.setdefault(int(pid), []).append((int(inicio), nombre))
+
+    propio_pid, _, propio_inicio = propio[:-len('.json')].partition('-')
+    por_pid.setdefault(int(propio_pid), []).append((int(propio_inicio), propio))
+
+    terminados = []
+    for pid, archivos in por_pid.items():
+        archivos.sort()
+        vigente = archivos[-1][1] if _proceso_vivo(pid) else None
+        terminados += [os.path.join(directorio, nombre) for _, nombre in archivos if nombre not in (vigente, propio)]
+    return terminados
+
+
+def limpiar_directorio(directorio):
+    """Borra los volcados de una ejecución anterior (hook on_starting de gunicorn)"""
+    if not directorio or not os.path.isdir(directorio):
+        return
+    for nombre in os.listdir(directorio):
+        if nombre.endswith(('.json', '.tmp')):
+            os.remove(os.path.join(directorio, nombre))
+
+
+REGISTRO = Registro()
+atexit.register(REGISTRO.volcar, forzar=True)
+
+peticiones_segundos = REGISTRO.histograma(
+    'gamerly_peticion_segundos', 'Latencia de la petición por nombre de URL', ['vista', 'metodo', 'estado'])
+db_consultas = REGISTRO.histograma(
+    'gamerly_peticion_db_consultas', 'Consultas SQL por petición', ['vista'], BUCKETS_CONSULTAS)
+db_segundos = REGISTRO.histograma(
+    'gamerly_peticion_db_segundos', 'Tiempo en la BD por petición', ['vista'])
+cache_consultas = REGISTRO.contador(
+    'gamerly_cache_consultas_total', 'Lecturas de caché por resultado (acierto/fallo)', ['cache', 'resultado'])
+correo_segundos = REGISTRO.histograma(
+    'gamerly_correo_segundos', 'Duración del envío de correo', ['resultado'])
+correo_fallos = REGISTRO.contador(
+    'gamerly_correo_fallos_total', 'Mensajes de correo que no se pudieron enviar')
+operacion_segundos = REGISTRO.histograma(
+    'gamerly_operacion_segundos', 'Duración de operaciones internas', ['operacion'])
+
+
+def registrar_peticion(vista, metodo, estado, segundos, consultas, segundos_db):
+    peticiones_segundos.observar(segundos, vista=vista, metodo=metodo, estado=estado)
+    db_consultas.observar(consultas, vista=vista)
+    db_segundos.observar(segundos_db, vista=vista)
+    REGISTRO.volcar()
+
+
+def registrar_cache(cache, acierto):
+    cache_consultas.inc(cache=cache, resultado='acierto' if acierto else 'fallo')
+
+
+@contextmanager
+def cronometro(operacion):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        operacion_segundos.observar(time.perf_counter() - inicio, operacion=operacion)
@@ -0,0 +1,28 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0009_tokenlogin'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tokenlogin',
+            name='token',
+            field=models.CharField(max_length=64),
+        ),
+        # Los tokens existentes estaban en claro: quedan expirados al migrar
+        migrations.AddField(
+            model_name='tokenlogin',
+            name='fecha_expiracion',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='tokenlogin',
+            index=models.Index(fields=['usuario', 'token', 'fecha_expiracion'], name='tokenlogin_verificacion_idx'),
+        ),
+    ]
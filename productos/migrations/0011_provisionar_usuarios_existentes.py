@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def provisionar(apps, schema_editor):
+    """Perfil y carrito para usuarios antiguos o creados con bulk_create"""
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    PerfilUsuario = apps.get_model('productos', 'PerfilUsuario')
+    Carrito = apps.get_model('productos', 'Carrito')
+
+    sin_perfil = User.objects.filter(perfilusuario__isnull=True).values_list('id', flat=True)
+    PerfilUsuario.objects.bulk_create([PerfilUsuario(usuario_id=uid) for uid in sin_perfil], batch_size=1000)
+
+    sin_carrito = User.objects.filter(carrito__isnull=True).values_list('id', flat=True)
+    Carrito.objects.bulk_create([Carrito(usuario_id=uid) for uid in sin_carrito], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0010_tokenlogin_hash_expiracion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(provisionar, migrations.RunPython.noop),
+    ]
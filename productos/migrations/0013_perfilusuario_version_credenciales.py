@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 12:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0012_producto_cambios'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='perfilusuario',
+            name='version_credenciales',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,10 +1,16 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models.functions import Coalesce
 from django.utils import timezone
+from django.utils.crypto import salted_hmac
 from datetime import timedelta
 from decimal import Decimal
+import secrets
 import uuid
 
+from . import eventos, metricas
+
 
 class Categoria(models.Model):
     nombre = models.CharField(max_length=100, unique=True)
@@ -42,6 +48,10 @@ class Producto(models.Model):
 
     class Meta:
         ordering = ['-fecha_creacion']
+        indexes = [
+            # Sincronización incremental (/api/productos/cambios/)
+            models.Index(fields=['fecha_actualizacion', 'id'], name='producto_cambios_idx'),
+        ]
 
     def __str__(self):
         return self.nombre
@@ -108,6 +118,22 @@ class Producto(models.Model):
         return self.stock > 0 and self.estado == 'disponible'
 
 
+class ProductoEliminado(models.Model):
+    """Marca de borrado para que los clientes sincronizados eliminen su copia"""
+    producto_id = models.BigIntegerField()
+    fecha_eliminacion = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Producto eliminado"
+        verbose_name_plural = "Productos eliminados"
+        indexes = [
+            models.Index(fields=['fecha_eliminacion', 'id'], name='productoeliminado_cambios_idx'),
+        ]
+
+    def __str__(self):
+        return f"Producto {self.producto_id} eliminado"
+
+
 class PerfilUsuario(models.Model):
     TIPOS_USUARIO = [
         ('cliente', 'Cliente'),
@@ -122,6 +148,8 @@ class PerfilUsuario(models.Model):
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
     activo = models.BooleanField(default=True)
     fecha_registro = models.DateTimeField(auto_now_add=True)
+    # Sube al cambiar la contraseña y revoca los tokens del API (authentication.py)
+    version_credenciales = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         verbose_name = "Perfil de Usuario"
@@ -133,6 +161,32 @@ class PerfilUsuario(models.Model):
     def es_admin(self):
         return self.tipo_usuario == 'admin' or self.usuario.is_superuser
 
+    @staticmethod
+    def clave_rol(usuario_id):
+        """Clave de caché del tipo_usuario (ver roles.py)"""
+        return f'perfil:rol:{usuario_id}'
+
+
+def suma_items(ruta='items__'):
+    """Total de unidades; ``ruta`` lleva hasta ItemCarrito ('carrito__items__' desde User)"""
+    return Coalesce(models.Sum(f'{ruta}cantidad'), 0)
+
+
+def suma_precio(ruta='items__'):
+    """Total del carrito en SQL, con la misma regla que Producto.precio_actual()"""
+    subtotal = models.Case(
+        models.When(
+            models.Q(**{f'{ruta}producto__precio_oferta__isnull': False})
+            & ~models.Q(**{f'{ruta}producto__precio_oferta': 0}),
+            then=models.F(f'{ruta}producto__precio_oferta'),
+        ),
+        default=models.F(f'{ruta}producto__precio'),
+    ) * models.F(f'{ruta}cantidad')
+    return Coalesce(
+        models.Sum(subtotal, output_field=models.DecimalField(max_digits=14, decimal_places=2)),
+        Decimal('0.00'),
+    )
+
 
 class Carrito(models.Model):
     usuario = models.OneToOneField(User, on_delete=models.CASCADE, related_name='carrito')
@@ -148,10 +202,11 @@ class Carrito(models.Model):
 
     def total_precio(self):
         """Calcula el precio total del carrito"""
-        total = Decimal('0.00')
-        for item in self.items.all():
-            total += item.subtotal()
-        return total
+        with metricas.cronometro('carrito_total'):
+            total = Decimal('0.00')
+            for item in self.items.all():
+                total += item.subtotal()
+            return total
 
     def total_precio_formateado(self):
         """Retorna el total formateado en pesos colombianos: $XXX.XXX COL"""
@@ -228,54 +283,148 @@ class TokenRecuperacion(models.Model):
         verbose_name_plural = "Tokens de Recuperación"
 
 
-# Señales para crear perfil y carrito automáticamente
-from django.db.models.signals import post_save
+# Señal para crear perfil y carrito automáticamente (altas una a una: admin,
+# createsuperuser, crear_usuario). Las altas en bloque usan
+# usuarios.crear_usuarios_en_bloque, porque bulk_create no dispara post_save.
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
 
 @receiver(post_save, sender=User)
-def crear_perfil_usuario(sender, instance, created, **kwargs):
+def provisionar_usuario(sender, instance, created, **kwargs):
+    """Crear perfil y carrito junto con el usuario, en la misma transacción"""
     if created:
-        PerfilUsuario.objects.create(usuario=instance)
+        with transaction.atomic():
+            PerfilUsuario.objects.create(usuario=instance)
+            Carrito.objects.create(usuario=instance)
 
 
-@receiver(post_save, sender=User)
-def crear_carrito_usuario(sender, instance, created, **kwargs):
-    """Crear carrito automáticamente cuando se crea un usuario"""
-    if created:
-        Carrito.objects.create(usuario=instance)
+@receiver(post_delete, sender=Producto)
+def registrar_producto_eliminado(sender, instance, **kwargs):
+    """Vale para eliminar_producto, el admin y el borrado en cascada de categorías"""
+    ProductoEliminado.objects.create(producto_id=instance.pk)
+
+
+@receiver(post_save, sender=ItemCarrito)
+@receiver(post_delete, sender=ItemCarrito)
+def notificar_cambio_carrito(sender, instance, **kwargs):
+    """Avisa a las conexiones SSE del carrito (ver eventos.py)"""
+    canal = eventos.canal_carrito(instance.carrito_id)
+    if eventos.hay_suscriptores(canal):
+        transaction.on_commit(lambda: eventos.publicar(canal, {'tipo': 'carrito'}))
+
+
+@receiver(post_save, sender=Producto)
+def notificar_cambio_stock(sender, instance, **kwargs):
+    """Stock, estado y precio nuevos para quienes tienen el producto en el carrito"""
+    canal = eventos.canal_producto(instance.pk)
+    if eventos.hay_suscriptores(canal):
+        evento = {'tipo': 'stock', 'producto_id': instance.pk, 'stock': instance.stock, 'estado': instance.estado}
+        transaction.on_commit(lambda: eventos.publicar(canal, evento))
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def invalidar_estadisticas(sender, **kwargs):
+    """Las estadísticas del catálogo se recalculan en la próxima lectura"""
+    from .estadisticas import invalidar
+    invalidar()
+
+
+@receiver(post_save, sender=PerfilUsuario)
+@receiver(post_delete, sender=PerfilUsuario)
+def invalidar_rol(sender, instance, **kwargs):
+    """El rol cacheado deja de valer en cuanto cambia el perfil"""
+    clave = PerfilUsuario.clave_rol(instance.usuario_id)
+    cache.delete(clave)
+    # Y otra vez al confirmar, por si otra petición lo recacheó con el valor viejo
+    transaction.on_commit(lambda: cache.delete(clave))
 
 
 class TokenLogin(models.Model):
     """Token de verificación para login de dos factores"""
+    VIGENCIA = timedelta(minutes=10)
+    MAX_INTENTOS = 5
+
     usuario = models.ForeignKey(User, on_delete=models.CASCADE)
-    token = models.CharField(max_length=6)  # 6 dígitos
+    token = models.CharField(max_length=64)  # HMAC-SHA256 del código de 6 dígitos
     fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_expiracion = models.DateTimeField()
     usado = models.BooleanField(default=False)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
 
     def __str__(self):
-        return f"Token para {self.usuario.username} - {self.token}"
+        return f"Token para {self.usuario.username}"
 
     def es_valido(self):
         """Verifica si el token es válido (no expirado y no usado)"""
-        if self.usado:
-            return False
-        # Token expira en 10 minutos
-        expiracion = self.fecha_creacion + timedelta(minutes=10)
-        return timezone.now() < expiracion
+        return not self.usado and timezone.now() < self.fecha_expiracion
+
+    @staticmethod
+    def _hash_codigo(usuario_id, codigo):
+        """El código nunca se guarda en claro, solo su HMAC ligado al usuario"""
+        return salted_hmac('productos.TokenLogin', f'{usuario_id}:{codigo}', algorithm='sha256').hexdigest()
+
+    @staticmethod
+    def _clave_intentos(usuario_id):
+        return f'tokenlogin:intentos:{usuario_id}'
 
     @classmethod
-    def crear_token(cls, usuario, ip_address=None):
-        """Crea un token de 6 dígitos para el usuario"""
-        import random
-        # Eliminar tokens anteriores del usuario
-        cls.objects.filter(usuario=usuario, usado=False).delete()
+    def emitir_codigo(cls, usuario, ip_address=None):
+        """Genera un código de 6 dígitos para el usuario y retorna el código en claro para el email"""
+        codigo = f'{secrets.randbelow(10 ** 6):06d}'
+        ahora = timezone.now()
+        valores = {
+            'token': cls._hash_codigo(usuario.pk, codigo),
+            'fecha_creacion': ahora,
+            'fecha_expiracion': ahora + cls.VIGENCIA,
+            'ip_address': ip_address,
+        }
+
+        # Reutilizar la fila pendiente en lugar de borrar e insertar en cada reenvío
+        if not cls.objects.filter(usuario=usuario, usado=False).update(**valores):
+            cls.objects.create(usuario=usuario, **valores)
+
+        # El cupo de intentos fallidos no se renueva al reenviar: dura hasta que
+        # expira (VIGENCIA desde el primer fallo) o hasta un código correcto
+        return codigo
+
+    @classmethod
+    def intentos_agotados(cls, usuario):
+        """True si el usuario superó el máximo de intentos fallidos (sin consultar la BD)"""
+        return cache.get(cls._clave_intentos(usuario.pk), 0) >= cls.MAX_INTENTOS
+
+    @classmethod
+    def verificar(cls, usuario, codigo):
+        """Valida el código y lo marca como usado en un único UPDATE indexado"""
+        clave = cls._clave_intentos(usuario.pk)
+        if cache.get(clave, 0) >= cls.MAX_INTENTOS:
+            return False
 
-        # Generar token de 6 dígitos
-        token = ''.join([str(random.randint(0, 9)) for _ in range(6)])
-        return cls.objects.create(usuario=usuario, token=token, ip_address=ip_address)
+        valido = cls.objects.filter(
+            usuario=usuario,
+            token=cls._hash_codigo(usuario.pk, codigo),
+            usado=False,
+            fecha_expiracion__gt=timezone.now(),
+        ).update(usado=True) > 0
+
+        if valido:
+            cache.delete(clave)
+        else:
+            cache.add(clave, 0, int(cls.VIGENCIA.total_seconds()))
+            try:
+                cache.incr(clave)
+            except ValueError:
+                # La clave expiró entre add() e incr()
+                cache.set(clave, 1, int(cls.VIGENCIA.total_seconds()))
+        return valido
 
     class Meta:
         verbose_name = "Token de Login"
-        verbose_name_plural = "Tokens de Login"
\ No newline at end of file
+        verbose_name_plural = "Tokens de Login"
+        indexes = [
+            models.Index(fields=['usuario', 'token', 'fecha_expiracion'], name='tokenlogin_verificacion_idx'),
+        ]
@@ -0,0 +1,264 @@
+"""
+Perfilado bajo demanda de una petición, solo para staff.
+
+Con la cabecera ``X-Gamerly-Perfilar: 1`` o ``?perfilar=1`` la petición se
+ejecuta bajo cProfile y se guardan en ``PERFILADO_DIR``:
+
+- ``<id>.prof``: estadísticas de pstats (``python -m pstats``, snakeviz...)
+- ``<id>.json``: ruta, vista, estado, tiempos y cada consulta SQL con su
+  duración y las líneas de ``productos/`` que la originaron
+
+El directorio es un buffer circular: se conservan los ``PERFILADO_MAXIMO``
+perfiles más recientes. La respuesta lleva el id en ``X-Gamerly-Perfil`` y
+los perfiles se ven en /admin/perfiles/.
+
+Sin la marca el costo es mirar una cabecera y un parámetro por petición, y
+un ContextVar vacío por consulta. Se perfila una petición a la vez por
+proceso (si hay otra en curso, la nueva se atiende sin perfilar). En modo
+ASGI solo se perfila el hilo del event loop: el código que corre en
+sync_to_async no aparece en el .prof, aunque sus consultas sí en el .json.
+"""
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import threading
+import time
+import traceback
+import uuid
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils import timezone
+
+CABECERA = 'X-Gamerly-Perfilar'
+CABECERA_RESPUESTA = 'X-Gamerly-Perfil'
+PARAMETRO = 'perfilar'
+ID_VALIDO = re.compile(r'^\d{20}-[0-9a-f]{6}$')
+_DIRECTORIO_APP = os.path.dirname(os.path.abspath(__file__)) + os.sep
+_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Envoltorios de execute y medición
+_MODULOS_INTERNOS = {'perfilado.py', 'instrumentacion.py', 'metricas.py', 'replicas.py', 'sqlite.py',
+                     'consultas_lentas.py'}
+
+logger = logging.getLogger('productos.peticiones')
+
+_sql = ContextVar('gamerly_perfil_sql', default=None)
+_candado = threading.Lock()  # cProfile no admite dos perfiles activos a la vez
+
+
+@dataclass
+class Consulta:
+    sql: str
+    ms: float
+    origen: list = field(default_factory=list)
+
+
+def _directorio():
+    return getattr(settings, 'PERFILADO_DIR', None)
+
+
+def maximo():
+    valor = getattr(settings, 'PERFILADO_MAXIMO', 50)
+    if valor < 1:
+        # Con 0 el recorte borraría todos los perfiles, incluido el recién guardado
+        raise ImproperlyConfigured('PERFILADO_MAXIMO debe ser al menos 1')
+    return valor
+
+
+def _marcada(request):
+    if not getattr(settings, 'PERFILADO_ACTIVO', True) or not _directorio():
+        return False
+    return request.headers.get(CABECERA) == '1' or request.GET.get(PARAMETRO) == '1'
+
+
+# ---------- SQL con su origen ----------
+
+@receiver(connection_created)
+def capturar_sql(sender, connection, **kwargs):
+    if _registrar_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_registrar_consulta)
+
+
+def origen_en_app(limite=4):
+    """Últimos ``limite`` marcos de la pila dentro de productos/ (sin medición ni middlewares)"""
+    marcos = []
+    for marco in traceback.extract_stack()[:-1]:
+        if not marco.filename.startswith(_DIRECTORIO_APP):
+            continue
+        if os.path.basename(marco.filename) in _MODULOS_INTERNOS or marco.name in ('__call__', '__acall__'):
+            continue  # medición y middlewares: aparecen en toda pila
+        marcos.append(f'{os.path.relpath(marco.filename, _RAIZ)}:{marco.lineno} en {marco.name}')
+    return marcos[-limite:]
+
+
+def _registrar_consulta(execute, sql, params, many, context):
+    consultas = _sql.get()
+    if consultas is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        consultas.append(Consulta(sql=sql, ms=round((time.perf_counter() - inicio) * 1000, 3),
+                                  origen=origen_en_app()))
+
+
+# ---------- almacenamiento ----------
+
+def _nuevo_id():
+    return f'{timezone.now().strftime("%Y%m%d%H%M%S%f")}-{uuid.uuid4().hex[:6]}'
+
+
+def _ruta(perfil_id, extension):
+    if not ID_VALIDO.match(perfil_id):
+        raise FileNotFoundError(perfil_id)
+    return os.path.join(_directorio(), f'{perfil_id}.{extension}')
+
+
+def _guardar(perfil_id, perfil, datos):
+    """True si se guardó; un disco lleno o sin permisos no tumba la petición perfilada"""
+    directorio = _directorio()
+    try:
+        os.makedirs(directorio, exist_ok=True)
+        perfil.dump_stats(_ruta(perfil_id, 'prof'))
+        with open(_ruta(perfil_id, 'json'), 'w', encoding='utf-8') as archivo:
+            json.dump(datos, archivo, ensure_ascii=False)
+        _recortar(directorio)
+    except OSError:
+        logger.exception('No se pudo guardar el perfil %s en %s', perfil_id, directorio)
+        return False
+    return True
+
+
+def _recortar(directorio):
+    """Conserva solo los PERFILADO_MAXIMO más recientes (los ids ordenan por fecha)"""
+    ids = sorted(nombre[:-5] for nombre in os.listdir(directorio) if nombre.endswith('.json'))
+    for perfil_id in ids[:-maximo()]:
+        for extension in ('json', 'prof'):
+            try:
+                os.remove(os.path.join(directorio, f'{perfil_id}.{extension}'))
+            except FileNotFoundError:
+                pass
+
+
+def listar():
+    """Metadatos de los perfiles guardados, del más reciente al más antiguo (sin las consultas)"""
+    directorio = _directorio()
+    if not directorio or not os.path.isdir(directorio):
+        return []
+    perfiles = []
+    for nombre in sorted(os.listdir(directorio), reverse=True):
+        if not nombre.endswith('.json') or not ID_VALIDO.match(nombre[:-5]):
+            continue
+        try:
+            datos = leer(nombre[:-5])
+        except (OSError, ValueError):
+            continue  # recortado mientras se listaba
+        datos['total_consultas'] = len(datos.pop('consultas', []))
+        perfiles.append(datos)
+    return perfiles
+
+
+def leer(perfil_id):
+    with open(_ruta(perfil_id, 'json'), encoding='utf-8') as archivo:
+        return json.load(archivo)
+
+
+def ruta_prof(perfil_id):
+    ruta = _ruta(perfil_id, 'prof')
+    if not os.path.exists(ruta):
+        raise FileNotFoundError(perfil_id)
+    return ruta
+
+
+def resumen(perfil_id, orden='cumulative', limite=40):
+    """Salida de pstats con las ``limite`` funciones más costosas"""
+    salida = io.StringIO()
+    estadisticas = pstats.Stats(ruta_prof(perfil_id), stream=salida)
+    estadisticas.strip_dirs().sort_stats(orden).print_stats(limite)
+    return salida.getvalue()
+
+
+# ---------- middleware ----------
+
+class PerfiladoMiddleware:
+    """Perfila la petición si un usuario staff lo pide; va después de AuthenticationMiddleware"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        maximo()  # configuración inválida: falla al arrancar, no en la primera petición perfilada
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _iniciar(self):
+        perfil = cProfile.Profile()
+        consultas = []
+        token = _sql.set(consultas)
+        perfil.enable()
+        return perfil, consultas, token, time.perf_counter()
+
+    def _terminar(self, request, user, respuesta, perfil, consultas, inicio):
+        perfil_id = _nuevo_id()
+        coincidencia = getattr(request, 'resolver_match', None)
+        guardado = _guardar(perfil_id, perfil, {
+            'id': perfil_id,
+            'fecha': timezone.now().isoformat(timespec='seconds'),
+            'metodo': request.method,
+            'ruta': request.get_full_path(),
+            'vista': coincidencia.view_name if coincidencia else None,
+            'estado': respuesta.status_code,
+            'usuario': user.get_username(),
+            'request_id': getattr(request, 'request_id', None),
+            'total_ms': round((time.perf_counter() - inicio) * 1000, 2),
+            'db_ms': round(sum(consulta.ms for consulta in consultas), 2),
+            'consultas': [asdict(consulta) for consulta in consultas],
+        })
+        if guardado:
+            respuesta[CABECERA_RESPUESTA] = perfil_id
+        return respuesta
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        if not _marcada(request) or not request.user.is_staff or not _candado.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            perfil, consultas, token, inicio = self._iniciar()
+            try:
+                respuesta = self.get_response(request)
+            finally:
+                perfil.disable()
+                _sql.reset(token)
+            return self._terminar(request, request.user, respuesta, perfil, consultas, inicio)
+        finally:
+            _candado.release()
+
+    async def __acall__(self, request):
+        if not _marcada(request):
+            return await self.get_response(request)
+        user = await request.auser()
+        if not user.is_staff or not _candado.acquire(blocking=False):
+            return await self.get_response(request)
+        try:
+            perfil, consultas, token, inicio = self._iniciar()
+            try:
+                respuesta = await self.get_response(request)
+            finally:
+                perfil.disable()
+                _sql.reset(token)
+            return self._terminar(request, user, respuesta, perfil, consultas, inicio)
+        finally:
+            _candado.release()
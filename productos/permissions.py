@@ -0,0 +1,35 @@
+"""
+Permisos de DRF basados en roles.py: sin consultas mientras el rol esté en caché.
+"""
+from rest_framework.permissions import BasePermission
+
+from . import roles
+
+ATRIBUTO_ES_ADMIN = 'es_admin_catalogo'
+
+
+class EsAdministradorOLectura(BasePermission):
+    """
+    Las acciones de ``view.acciones_lectura`` para cualquier usuario
+    autenticado; el resto (escrituras, acciones de gestión) solo para staff.
+
+    De paso resuelve el rol desde la caché (roles.es_admin) y lo deja en el
+    request: get_queryset decide con ``es_admin_catalogo(request)`` qué
+    filas ve el usuario sin volver a consultarlo.
+    """
+    message = 'Se requieren permisos de administrador.'
+
+    def has_permission(self, request, view):
+        user = request.user
+        if not (user and user.is_authenticated):
+            return False
+        setattr(request, ATRIBUTO_ES_ADMIN, roles.es_admin(user))
+        if getattr(view, 'action', None) in getattr(view, 'acciones_lectura', ()):
+            return True
+        return bool(user.is_staff)
+
+
+def es_admin_catalogo(request):
+    """El rol que resolvió EsAdministradorOLectura (o, fuera de la vista, el de la caché)"""
+    es_admin = getattr(request, ATRIBUTO_ES_ADMIN, None)
+    return roles.es_admin(request.user) if es_admin is None else es_admin
@@ -0,0 +1,214 @@
+"""
+Límite de peticiones con ventana deslizante sobre la caché de Django.
+
+Cada regla guarda dos contadores (ventana actual y anterior) y estima las
+peticiones de los últimos ``ventana`` segundos ponderando la anterior. Decidir
+si se rechaza cuesta una sola lectura a la caché, antes de ``authenticate()``
+o ``send_mail``.
+"""
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import render
+
+MENSAJE_LIMITE = 'Demasiados intentos. Espera unos minutos antes de volver a intentarlo.'
+
+
+def ip_cliente(request):
+    """IP del cliente (REMOTE_ADDR; el proxy debe reescribirla si existe)"""
+    return request.META.get('REMOTE_ADDR') or 'desconocida'
+
+
+def _claves(clave, ventana, ahora):
+    bloque = int(ahora // ventana)
+    return f'rl:{clave}:{bloque}', f'rl:{clave}:{bloque - 1}'
+
+
+def _estimado(valores, actual, anterior, ahora, ventana):
+    peso_anterior = 1 - (ahora % ventana) / ventana
+    return valores.get(anterior, 0) * peso_anterior + valores.get(actual, 0)
+
+
+def excede_limite(clave, limite, ventana):
+    """Registra una petición para ``clave`` y retorna True si supera el límite"""
+    ahora = time.time()
+    actual, anterior = _claves(clave, ventana, ahora)
+    if _estimado(cache.get_many([actual, anterior]), actual, anterior, ahora, ventana) >= limite:
+        return True
+
+    cache.add(actual, 0, ventana * 2)
+    try:
+        cache.incr(actual)
+    except ValueError:
+        cache.set(actual, 1, ventana * 2)
+    return False
+
+
+async def aexcede_limite(clave, limite, ventana):
+    """Versión async de ``excede_limite``"""
+    ahora = time.time()
+    actual, anterior = _claves(clave, ventana, ahora)
+    if _estimado(await cache.aget_many([actual, anterior]), actual, anterior, ahora, ventana) >= limite:
+        return True
+
+    await cache.aadd(actual, 0, ventana * 2)
+    try:
+        await cache.aincr(actual)
+    except ValueError:
+        await cache.aset(actual, 1, ventana * 2)
+    return False
+
+
+def _normalizar_usuario(valor):
+    return str(valor).strip().lower() if valor else None
+
+
+def _clave_regla_usuario(alcance, usuario):
+    return f'{alcance}:usuario:{_normalizar_usuario(usuario)}'
+
+
+def limpiar_limite(alcance, ventana, usuario):
+    """Reinicia el contador por usuario de ``alcance`` (p. ej. tras un login correcto)"""
+    cache.delete_many(_claves(_clave_regla_usuario(alcance, usuario), ventana, time.time()))
+
+
+def _clave_usuario(request, campo_usuario):
+    if campo_usuario is None:
+        return None
+    if callable(campo_usuario):
+        return _normalizar_usuario(campo_usuario(request))
+    return _normalizar_usuario(request.POST.get(campo_usuario))
+
+
+async def _aclave_usuario(request, campo_usuario):
+    if campo_usuario is None:
+        return None
+    if iscoroutinefunction(campo_usuario):
+        return _normalizar_usuario(await campo_usuario(request))
+    if callable(campo_usuario):
+        return _normalizar_usuario(await sync_to_async(campo_usuario)(request))
+    return _normalizar_usuario(request.POST.get(campo_usuario))
+
+
+def _respuesta_rechazo(request, ventana, plantilla=None, respuesta_json=False):
+    if respuesta_json:
+        respuesta = JsonResponse({'success': False, 'message': MENSAJE_LIMITE}, status=429)
+    elif plantilla:
+        messages.error(request, MENSAJE_LIMITE)
+        respuesta = render(request, plantilla, status=429)
+    else:
+        respuesta = HttpResponse(MENSAJE_LIMITE, status=429, content_type='text/plain; charset=utf-8')
+    respuesta['Retry-After'] = str(ventana)
+    return respuesta
+
+
+def peticion_limitada(request, alcance, limite, ventana, campo_usuario=None):
+    """Aplica la regla por IP y, si hay usuario, también por usuario"""
+    if not getattr(settings, 'RATELIMIT_ACTIVO', True):
+        return False
+
+    if excede_limite(f'{alcance}:ip:{ip_cliente(request)}', limite, ventana):
+        return True
+
+    usuario = _clave_usuario(request, campo_usuario)
+    if usuario and excede_limite(_clave_regla_usuario(alcance, usuario), limite, ventana):
+        return True
+    return False
+
+
+async def apeticion_limitada(request, alcance, limite, ventana, campo_usuario=None):
+    """Versión async de ``peticion_limitada``"""
+    if not getattr(settings, 'RATELIMIT_ACTIVO', True):
+        return False
+
+    if await aexcede_limite(f'{alcance}:ip:{ip_cliente(request)}', limite, ventana):
+        return True
+
+    usuario = await _aclave_usuario(request, campo_usuario)
+    if usuario and await aexcede_limite(_clave_regla_usuario(alcance, usuario), limite, ventana):
+        return True
+    return False
+
+
+def limitar_peticiones(limite, ventana, campo_usuario=None, metodos=('POST',),
+                       plantilla=None, respuesta_json=False, alcance=None):
+    """
+    Decorador de vistas: rechaza con 429 cuando la IP o el usuario superan
+    ``limite`` peticiones en ``ventana`` segundos.
+
+    ``campo_usuario`` puede ser el nombre de un campo POST o una función que
+    recibe la petición y retorna el identificador del usuario. Funciona
+    también sobre vistas async (``campo_usuario`` puede ser entonces async).
+
+    ``alcance`` nombra los contadores (por defecto, módulo y nombre de la
+    vista); con el mismo alcance, las versiones sync y async de una vista
+    comparten cupo y ``limpiar_limite`` sirve para ambas.
+    """
+    def decorador(vista):
+        nombre = alcance or f'{vista.__module__}.{vista.__name__}'
+
+        if iscoroutinefunction(vista):
+            @wraps(vista)
+            async def envoltura_async(request, *args, **kwargs):
+                if request.method in metodos and await apeticion_limitada(
+                        request, nombre, limite, ventana, campo_usuario):
+                    return await sync_to_async(_respuesta_rechazo)(request, ventana, plantilla, respuesta_json)
+                return await vista(request, *args, **kwargs)
+
+            return envoltura_async
+
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            if request.method in metodos and peticion_limitada(request, nombre, limite, ventana, campo_usuario):
+                return _respuesta_rechazo(request, ventana, plantilla, respuesta_json)
+            return vista(request, *args, **kwargs)
+
+        return envoltura
+
+    return decorador
+
+
+class LimitePeticionesMiddleware:
+    """
+    Aplica ``RATELIMIT_RUTAS`` a rutas que no pasan por nuestras vistas
+    (login del admin, login del API navegable). Formato::
+
+        RATELIMIT_RUTAS = {'/admin/login/': (limite, ventana_en_segundos)}
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _regla(self, request):
+        if request.method == 'POST':
+            return getattr(settings, 'RATELIMIT_RUTAS', {}).get(request.path_info)
+        return None
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        regla = self._regla(request)
+        if regla:
+            limite, ventana = regla
+            if peticion_limitada(request, f'ruta:{request.path_info}', limite, ventana, 'username'):
+                return _respuesta_rechazo(request, ventana)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        regla = self._regla(request)
+        if regla:
+            limite, ventana = regla
+            if await apeticion_limitada(request, f'ruta:{request.path_info}', limite, ventana, 'username'):
+                return _respuesta_rechazo(request, ventana)
+        return await self.get_response(request)
@@ -0,0 +1,31 @@
+"""
+Renderer JSON rápido para el API.
+
+Usa orjson si está instalado (deploy/requirements.txt) y si no, cae al
+JSONRenderer de DRF, así que la salida es la misma en ambos casos: los
+Decimal sueltos como número (los DecimalField de los serializers ya llegan
+como string), fechas ISO 8601 y UTF-8 sin escapar.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+
+class JSONRapidoRenderer(JSONRenderer):
+    """JSONRenderer con orjson; con indentación solicitada o sin orjson usa el de DRF"""
+
+    # Lo que orjson no serializa solo (Decimal, lazy strings, querysets...)
+    # se resuelve igual que en DRF
+    _por_defecto = JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if data is None:
+            return b''
+        return orjson.dumps(data, default=self._por_defecto, option=orjson.OPT_NON_STR_KEYS)
@@ -0,0 +1,237 @@
+"""
+Réplicas de lectura para el catálogo.
+
+Las lecturas de ``Producto`` y ``Categoria`` (home, dashboard, detalle,
+listado del API, estadísticas) van a una réplica de ``DATABASE_REPLICAS``
+solo dentro de peticiones GET/HEAD/OPTIONS; todo lo demás (escrituras,
+peticiones POST, comandos, shell, tests) usa ``default``.
+
+- Lectura de lo propio: quien escribe (carrito, perfil...) queda pegado al
+  primario ``REPLICA_PEGAJOSO_SEGUNDOS`` mediante la cookie
+  ``gamerly_primario``, y también el resto de esa misma petición.
+- Caída de una réplica: si no conecta al elegirla, o una consulta falla
+  en ella, queda marcada como caída ``REPLICA_REVISION_SEGUNDOS``. La
+  consulta que falló se repite en el primario (``_pasar_al_primario``, un
+  execute wrapper de la conexión de la réplica) y el resto de la petición
+  ya lee del primario; la vista no se entera ni se vuelve a ejecutar.
+
+Para probar en local con dos archivos SQLite::
+
+    GAMERLY_DB_REPLICAS=db_replica.sqlite3 python manage.py copiar_replicas
+    GAMERLY_DB_REPLICAS=db_replica.sqlite3 python manage.py runserver
+"""
+import contextvars
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from itertools import islice
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.db.utils import DatabaseError, IntegrityError
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+COOKIE = 'gamerly_primario'
+MODELOS_CATALOGO = {'productos.producto', 'productos.categoria'}
+METODOS_LECTURA = {'GET', 'HEAD', 'OPTIONS'}
+
+_caidas = {}  # alias -> instante hasta el que no se usa
+_candado = threading.Lock()
+
+
+@dataclass
+class _Estado:
+    """Decisión de ruteo de la petición en curso"""
+    usar_replica: bool
+    replica: str = None
+    escribio: bool = False
+
+
+_estado = contextvars.ContextVar('gamerly_replicas', default=None)
+
+
+def replicas_configuradas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+def marcar_caida(alias):
+    segundos = getattr(settings, 'REPLICA_REVISION_SEGUNDOS', 30)
+    with _candado:
+        _caidas[alias] = time.monotonic() + segundos
+    logger.warning('Réplica %s no disponible; lecturas al primario durante %s s', alias, segundos)
+
+
+def _disponible(alias):
+    with _candado:
+        hasta = _caidas.get(alias)
+    if hasta is not None and time.monotonic() < hasta:
+        return False
+    try:
+        connections[alias].ensure_connection()  # no hace nada si ya está conectada
+    except DatabaseError:
+        marcar_caida(alias)
+        return False
+    return True
+
+
+def alias_lectura():
+    """Réplica para las lecturas del catálogo en esta petición, o None si van al primario"""
+    estado = _estado.get()
+    if estado is None or not estado.usar_replica or estado.escribio:
+        return None
+    if estado.replica is None:
+        candidatas = replicas_configuradas()
+        random.shuffle(candidatas)
+        estado.replica = next((alias for alias in candidatas if _disponible(alias)), '')
+    return estado.replica or None
+
+
+@contextmanager
+def primario():
+    """Fuerza el primario dentro del bloque (p. ej. lecturas que no toleran retraso)"""
+    token = _estado.set(_Estado(usar_replica=False))
+    try:
+        yield
+    finally:
+        _estado.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower in MODELOS_CATALOGO:
+            replica = alias_lectura()
+            if replica:
+                return replica
+        if _estado.get() is not None:
+            # Dentro de una petición nada más sale de la réplica, aunque el
+            # objeto del que se parte (hint 'instance') viniera de ella
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        estado = _estado.get()
+        if estado is not None:
+            estado.escribio = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplicas y primario tienen los mismos datos
+        bases = {DEFAULT_DB_ALIAS, *replicas_configuradas()}
+        if obj1._state.db in bases and obj2._state.db in bases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Las réplicas se sincronizan desde el primario, no se migran
+        if db in replicas_configuradas():
+            return False
+        return None
+
+
+@receiver(connection_created)
+def vigilar_replica(sender, connection, **kwargs):
+    if connection.alias in replicas_configuradas() and _pasar_al_primario not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_pasar_al_primario)
+
+
+class _FilasDelPrimario:
+    """Resultado ya leído del primario, con la parte de DB-API que usa el ORM"""
+
+    def __init__(self, cursor):
+        self.description = cursor.description
+        self.rowcount = cursor.rowcount
+        self.lastrowid = cursor.lastrowid
+        self._filas = iter(cursor.fetchall() if cursor.description else ())
+
+    def fetchone(self):
+        return next(self._filas, None)
+
+    def fetchmany(self, size=1):
+        return list(islice(self._filas, size))
+
+    def fetchall(self):
+        return list(self._filas)
+
+    def __iter__(self):
+        return self._filas
+
+    def close(self):
+        pass
+
+
+def _pasar_al_primario(execute, sql, params, many, context):
+    """
+    Si la consulta falla en la réplica la marca caída y la ejecuta en el
+    primario. El ORM lee las filas del cursor de la réplica
+    (``context['cursor']``): se cierra el cursor que falló y en su lugar
+    quedan las filas ya leídas del primario, cuyo cursor se cierra aquí
+    """
+    try:
+        return execute(sql, params, many, context)
+    except IntegrityError:
+        raise
+    except DatabaseError:
+        marcar_caida(context['connection'].alias)
+        estado = _estado.get()
+        if estado is not None:
+            estado.replica = ''  # lo que queda de la petición, al primario
+
+        context['cursor'].close()
+        with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            resultado = cursor.executemany(sql, params) if many else cursor.execute(sql, params)
+            context['cursor'].cursor = _FilasDelPrimario(cursor)
+        return resultado
+
+
+class ReplicaMiddleware:
+    """
+    Decide por petición si el catálogo se lee de una réplica y mantiene la
+    cookie que pega al primario después de escribir. Va antes que cualquier
+    middleware que consulte la BD.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _estado_inicial(self, request):
+        return _Estado(usar_replica=bool(replicas_configuradas()) and request.method in METODOS_LECTURA
+                       and COOKIE not in request.COOKIES)
+
+    def _terminar(self, estado, respuesta):
+        if estado.escribio and replicas_configuradas():
+            respuesta.set_cookie(COOKIE, '1', max_age=getattr(settings, 'REPLICA_PEGAJOSO_SEGUNDOS', 10),
+                                 httponly=True, samesite='Lax')
+        return respuesta
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        estado = self._estado_inicial(request)
+        token = _estado.set(estado)
+        try:
+            respuesta = self.get_response(request)
+        finally:
+            _estado.reset(token)
+        return self._terminar(estado, respuesta)
+
+    async def __acall__(self, request):
+        estado = self._estado_inicial(request)
+        token = _estado.set(estado)
+        try:
+            respuesta = await self.get_response(request)
+        finally:
+            _estado.reset(token)
+        return self._terminar(estado, respuesta)
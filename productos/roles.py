@@ -0,0 +1,68 @@
+"""
+Resolución de roles con caché.
+
+El ``tipo_usuario`` del perfil se guarda en la caché por usuario, así que
+decidir si alguien es administrador (vistas AJAX del admin, viewsets del
+API) no consulta la BD en el camino caliente. ``is_superuser`` ya viene en
+el propio ``user`` y no se cachea. La entrada se invalida al guardar o
+borrar el PerfilUsuario (models.invalidar_rol).
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metricas
+from .models import PerfilUsuario
+
+SIN_PERFIL = ''
+
+
+def _segundos():
+    return getattr(settings, 'ROLES_CACHE_SEGUNDOS', 900)
+
+
+def guardar_rol(usuario_id, tipo_usuario):
+    cache.set(PerfilUsuario.clave_rol(usuario_id), tipo_usuario or SIN_PERFIL, _segundos())
+
+
+def tipo_usuario_de(user):
+    """'cliente', 'admin' o '' si no tiene perfil; None para anónimos"""
+    if user is None or not user.is_authenticated:
+        return None
+
+    clave = PerfilUsuario.clave_rol(user.pk)
+    tipo = cache.get(clave)
+    metricas.registrar_cache('roles', tipo is not None)
+    if tipo is None:
+        tipo = PerfilUsuario.objects.filter(usuario_id=user.pk).values_list('tipo_usuario', flat=True).first()
+        guardar_rol(user.pk, tipo)
+        tipo = tipo or SIN_PERFIL
+    return tipo
+
+
+async def atipo_usuario_de(user):
+    """Versión async de tipo_usuario_de"""
+    if user is None or not user.is_authenticated:
+        return None
+
+    clave = PerfilUsuario.clave_rol(user.pk)
+    tipo = await cache.aget(clave)
+    metricas.registrar_cache('roles', tipo is not None)
+    if tipo is None:
+        tipo = await PerfilUsuario.objects.filter(usuario_id=user.pk).values_list('tipo_usuario', flat=True).afirst()
+        await cache.aset(clave, tipo or SIN_PERFIL, _segundos())
+        tipo = tipo or SIN_PERFIL
+    return tipo
+
+
+def es_admin(user):
+    """Superusuario o perfil de tipo administrador"""
+    if user is None or not user.is_authenticated:
+        return False
+    return user.is_superuser or tipo_usuario_de(user) == 'admin'
+
+
+async def aes_admin(user):
+    """Versión async de es_admin"""
+    if user is None or not user.is_authenticated:
+        return False
+    return user.is_superuser or await atipo_usuario_de(user) == 'admin'
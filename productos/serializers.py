@@ -1,21 +1,88 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
 from .models import Producto, Categoria, PerfilUsuario
-
-
-class CategoriaSerializer(serializers.ModelSerializer):
+from . import masivo
+from .usuarios import crear_usuario
+
+
+class CamposDinamicosMixin:
+    """
+    Selección de campos: ``?fields=id,nombre`` / ``?omit=descripcion`` (o los
+    kwargs ``fields=`` / ``omit=``). ``columnas_modelo()`` traduce los campos
+    que quedan a columnas para ``only()`` y a relaciones para
+    ``select_related()``.
+
+    Los campos que no mapean 1:1 a una columna (métodos del modelo,
+    SerializerMethodField) declaran sus columnas en ``Meta.columnas_calculadas``.
+    """
+
+    def __init__(self, *args, fields=None, omit=None, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        request = self.context.get('request')
+        if request is not None and request.method == 'GET':
+            fields = fields or self._lista_param(request, 'fields')
+            omit = omit or self._lista_param(request, 'omit')
+
+        self.campos_seleccionados = bool(fields or omit)
+        if fields:
+            for nombre in set(self.fields) - set(fields):
+                self.fields.pop(nombre)
+        for nombre in omit or ():
+            self.fields.pop(nombre, None)
+
+    @staticmethod
+    def _lista_param(request, nombre):
+        valor = request.query_params.get(nombre)
+        return [campo.strip() for campo in valor.split(',') if campo.strip()] if valor else None
+
+    def columnas_modelo(self):
+        """(columnas, relaciones) necesarias para los campos actuales; None si no se puede recortar"""
+        modelo = self.Meta.model
+        calculadas = getattr(self.Meta, 'columnas_calculadas', {})
+        columnas, relaciones = {modelo._meta.pk.name}, set()
+
+        for nombre, campo in self.fields.items():
+            if campo.write_only:
+                continue
+            if nombre in calculadas:
+                dependencias = calculadas[nombre]
+            elif campo.source == '*':
+                return None
+            else:
+                dependencias = [campo.source.replace('.', '__')]
+
+            for columna in dependencias:
+                raiz = columna.split('__')[0]
+                try:
+                    relacion = modelo._meta.get_field(raiz)
+                except FieldDoesNotExist:
+                    return None  # propiedad o método sin declarar en columnas_calculadas
+                if '__' in columna:
+                    if not relacion.many_to_one and not relacion.one_to_one:
+                        return None
+                    relaciones.add(raiz)
+                columnas.add(columna)
+
+        return sorted(columnas), sorted(relaciones)
+
+
+class CategoriaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     productos_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Categoria
         fields = ['id', 'nombre', 'descripcion', 'activo', 'fecha_creacion', 'productos_count']
         read_only_fields = ['fecha_creacion']
+        columnas_calculadas = {'productos_count': ['id']}
 
     def get_productos_count(self, obj):
         return obj.productos.filter(estado='disponible').count()
 
 
-class ProductoSerializer(serializers.ModelSerializer):
+class ProductoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     categoria_nombre = serializers.CharField(source='categoria.nombre', read_only=True)
     precio_actual = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
     descuento_porcentaje = serializers.IntegerField(read_only=True)
@@ -31,13 +98,18 @@ class ProductoSerializer(serializers.ModelSerializer):
             'fecha_creacion', 'fecha_actualizacion', 'creado_por_nombre'
         ]
         read_only_fields = ['fecha_creacion', 'fecha_actualizacion', 'creado_por']
+        columnas_calculadas = {
+            'precio_actual': ['precio', 'precio_oferta'],
+            'descuento_porcentaje': ['precio', 'precio_oferta'],
+            'en_stock': ['stock', 'estado'],
+        }
 
     def create(self, validated_data):
         validated_data['creado_por'] = self.context['request'].user
         return super().create(validated_data)
 
 
-class ProductoListSerializer(serializers.ModelSerializer):
+class ProductoListSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """Serializer simplificado para listas de productos"""
     categoria_nombre = serializers.CharField(source='categoria.nombre', read_only=True)
     precio_actual = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
@@ -50,6 +122,10 @@ class ProductoListSerializer(serializers.ModelSerializer):
             'descuento_porcentaje', 'categoria_nombre', 'imagen',
             'estado', 'destacado', 'stock'
         ]
+        columnas_calculadas = {
+            'precio_actual': ['precio', 'precio_oferta'],
+            'descuento_porcentaje': ['precio', 'precio_oferta'],
+        }
 
 
 class PerfilUsuarioSerializer(serializers.ModelSerializer):
@@ -71,7 +147,7 @@ class PerfilUsuarioSerializer(serializers.ModelSerializer):
 
 
 class UsuarioRegistroSerializer(serializers.ModelSerializer):
-    password = serializers.CharField(write_only=True, min_length=8)
+    password = serializers.CharField(write_only=True)
     password_confirm = serializers.CharField(write_only=True)
 
     class Meta:
@@ -81,12 +157,42 @@ class UsuarioRegistroSerializer(serializers.ModelSerializer):
     def validate(self, data):
         if data['password'] != data['password_confirm']:
             raise serializers.ValidationError("Las contraseñas no coinciden.")
+
+        # Misma política que el registro web (AUTH_PASSWORD_VALIDATORS)
+        usuario = User(**{campo: data.get(campo, '') for campo in ['username', 'email', 'first_name', 'last_name']})
+        try:
+            validate_password(data['password'], usuario)
+        except DjangoValidationError as e:
+            raise serializers.ValidationError({'password': e.messages})
         return data
 
     def create(self, validated_data):
         validated_data.pop('password_confirm')
-        password = validated_data.pop('password')
-        user = User(**validated_data)
-        user.set_password(password)
-        user.save()
-        return user
\ No newline at end of file
+        return crear_usuario(password=validated_data.pop('password'), **validated_data)
+
+
+class OperacionMasivaSerializer(serializers.Serializer):
+    """
+    Cuerpo de POST /api/productos/masivo/: la operación (ver masivo.py), su
+    valor y el filtro de productos. Sin filtro hay que pedir ``todos: true``
+    explícitamente.
+    """
+    operacion = serializers.ChoiceField(choices=list(masivo.OPERACIONES))
+    valor = serializers.JSONField(required=False, default=None)
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    categoria = serializers.IntegerField(required=False)
+    estado = serializers.ChoiceField(choices=Producto.ESTADOS, required=False)
+    destacado = serializers.BooleanField(required=False)
+    todos = serializers.BooleanField(required=False, default=False)
+
+    FILTROS = {'ids': 'pk__in', 'categoria': 'categoria_id', 'estado': 'estado', 'destacado': 'destacado'}
+
+    def validate(self, data):
+        if not data['todos'] and not any(campo in data for campo in self.FILTROS):
+            raise serializers.ValidationError('Indica un filtro (ids, categoria, estado, destacado) o todos: true.')
+        return data
+
+    def filtrar(self, queryset):
+        filtro = {lookup: self.validated_data[campo] for campo, lookup in self.FILTROS.items()
+                  if campo in self.validated_data}
+        return queryset.filter(**filtro)
@@ -0,0 +1,135 @@
+"""
+Sincronización incremental del catálogo (/api/productos/cambios/).
+
+Los cambios son productos con ``fecha_actualizacion`` posterior a ``desde``
+(altas y modificaciones) más las marcas de ``ProductoEliminado``. Ambos se
+recorren por keyset sobre ``(fecha, id)``, de modo que una página cuesta lo
+mismo al principio que al final de 100k filas.
+
+El cursor va firmado y guarda la posición en cada lista y el instante
+``hasta`` de la primera página. Los cambios posteriores a ``hasta`` no
+entran en la sincronización en curso; el cliente los pide en la próxima,
+con ``desde=hasta``.
+
+``hasta`` va SINCRONIZACION_MARGEN_SEGUNDOS por detrás del reloj: una
+transacción que fijó su ``fecha_actualizacion`` antes de ``hasta`` pero
+confirma después aún cae en la próxima sincronización (el margen debe
+superar la transacción más larga). El precio es reenviar algunos upserts
+ya recibidos, que el cliente aplica de nuevo sin efecto.
+
+Las marcas de borrado se conservan SINCRONIZACION_RETENCION_DIAS
+(``manage.py limpiar_eliminados``), así que el ``desde`` más antiguo válido
+es ahora menos esa retención; uno anterior recibe ``DesdeVencido`` y el
+cliente debe descartar su copia y sincronizar sin ``desde``.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ProductoEliminado
+
+SAL = 'productos.sincronizacion'
+LIMITE_POR_DEFECTO = 500
+LIMITE_MAXIMO = 1000
+
+
+class ParametrosInvalidos(ValueError):
+    pass
+
+
+class DesdeVencido(ParametrosInvalidos):
+    """``desde`` es anterior a la retención de marcas de borrado"""
+
+
+def _fecha(valor):
+    fecha = parse_datetime(valor or '')
+    if fecha is None:
+        raise ParametrosInvalidos('Fecha inválida, usar ISO 8601 (p. ej. 2025-01-31T12:00:00Z)')
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    return fecha
+
+
+def desde_minimo(ahora=None):
+    """``desde`` más antiguo con todas sus marcas de borrado aún guardadas"""
+    return (ahora or timezone.now()) - timedelta(days=settings.SINCRONIZACION_RETENCION_DIAS)
+
+
+def estado_inicial(desde):
+    """
+    Posición de partida: todo lo modificado desde ``desde`` hasta ahora
+    (menos el margen). Sin ``desde`` es una copia completa
+    """
+    ahora = timezone.now()
+    if desde is None:
+        desde = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+    else:
+        desde = _fecha(desde)
+        if desde < desde_minimo(ahora):
+            raise DesdeVencido(
+                f'desde es anterior a {settings.SINCRONIZACION_RETENCION_DIAS} días: '
+                'descartar la copia local y sincronizar sin desde')
+
+    desde = desde.isoformat()
+    hasta = ahora - timedelta(seconds=settings.SINCRONIZACION_MARGEN_SEGUNDOS)
+    return {'hasta': hasta.isoformat(), 'productos': [desde, 0], 'eliminados': [desde, 0]}
+
+
+def limpiar_eliminados(ahora=None):
+    """Borra las marcas de borrado fuera de la retención; retorna cuántas"""
+    return ProductoEliminado.objects.filter(fecha_eliminacion__lt=desde_minimo(ahora)).delete()[0]
+
+
+def leer_cursor(cursor):
+    try:
+        return signing.loads(cursor, salt=SAL)
+    except signing.BadSignature:
+        raise ParametrosInvalidos('Cursor inválido')
+
+
+def _despues_de(campo_fecha, posicion):
+    fecha, ultimo_id = _fecha(posicion[0]), posicion[1]
+    return Q(**{f'{campo_fecha}__gt': fecha}) | Q(**{campo_fecha: fecha, 'id__gt': ultimo_id})
+
+
+def _pagina(queryset, campo_fecha, posicion, hasta, limite):
+    filas = list(
+        queryset.filter(_despues_de(campo_fecha, posicion), **{f'{campo_fecha}__lte': hasta})
+        .order_by(campo_fecha, 'id')[:limite + 1]
+    )
+    hay_mas = len(filas) > limite
+    filas = filas[:limite]
+    if filas:
+        posicion = [getattr(filas[-1], campo_fecha).isoformat(), filas[-1].id]
+    return filas, posicion, hay_mas
+
+
+def pagina_de_cambios(productos, estado, limite, visible=None):
+    """
+    Una página de cambios. ``productos`` es el queryset (ya recortado con
+    only()/select_related) y ``visible(producto)`` decide si un producto
+    modificado se envía como upsert o, si el cliente ya no debe verlo, como
+    eliminado. Retorna (upserts, ids_eliminados, cursor_siguiente, hasta).
+    """
+    limite = max(1, min(limite or LIMITE_POR_DEFECTO, LIMITE_MAXIMO))
+    hasta = _fecha(estado['hasta'])
+
+    filas, estado['productos'], mas_productos = _pagina(
+        productos, 'fecha_actualizacion', estado['productos'], hasta, limite)
+    marcas, estado['eliminados'], mas_eliminados = _pagina(
+        ProductoEliminado.objects.only('id', 'producto_id', 'fecha_eliminacion'),
+        'fecha_eliminacion', estado['eliminados'], hasta, limite)
+
+    upserts, eliminados = [], [marca.producto_id for marca in marcas]
+    for producto in filas:
+        if visible is None or visible(producto):
+            upserts.append(producto)
+        else:
+            eliminados.append(producto.id)
+
+    siguiente = signing.dumps(estado, salt=SAL) if (mas_productos or mas_eliminados) else None
+    return upserts, eliminados, siguiente, estado['hasta']
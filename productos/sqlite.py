@@ -0,0 +1,29 @@
+"""
+Ajustes de SQLite para escrituras concurrentes (despliegues pequeños sobre db.sqlite3).
+
+Con el journal por defecto (rollback) un escritor bloquea a los lectores y
+los ``agregar_al_carrito`` simultáneos terminan en ``database is locked``.
+Al abrir cada conexión se aplican los ``SQLITE_PRAGMAS`` de settings:
+
+- ``journal_mode=WAL``: lectores y un escritor a la vez (queda guardado en el archivo)
+- ``synchronous=NORMAL``: con WAL no pierde consistencia, solo la última
+  transacción ante un corte de luz, y evita un fsync por commit
+- ``busy_timeout``: milisegundos que una escritura espera el candado antes de fallar
+- ``cache_size`` / ``mmap_size``: caché de páginas por conexión y lectura mapeada
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def aplicar_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if connection.is_in_memory_db():
+        # WAL y mmap no aplican a una BD en memoria (p. ej. la de los tests)
+        pragmas = {nombre: valor for nombre, valor in pragmas.items() if nombre not in ('journal_mode', 'mmap_size')}
+    with connection.cursor() as cursor:
+        for nombre, valor in pragmas.items():
+            cursor.execute(f'PRAGMA {nombre} = {valor}')
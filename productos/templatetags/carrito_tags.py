@@ -1,5 +1,7 @@
 from django import template
-from ..models import Carrito
+from django.conf import settings
+from django.urls import reverse
+from ..contexto import contexto_de
 
 register = template.Library()
 
@@ -7,24 +9,18 @@ register = template.Library()
 @register.simple_tag
 def carrito_items_count(user):
     """Retorna el número de items en el carrito del usuario"""
-    if not user.is_authenticated:
-        return 0
-
-    try:
-        carrito = user.carrito
-        return carrito.total_items()
-    except Carrito.DoesNotExist:
-        return 0
+    return contexto_de(user).total_items
 
 
 @register.simple_tag
 def carrito_total_precio(user):
     """Retorna el precio total del carrito del usuario"""
-    if not user.is_authenticated:
-        return 0
+    return contexto_de(user).total_precio
+
 
-    try:
-        carrito = user.carrito
-        return carrito.total_precio()
-    except Carrito.DoesNotExist:
-        return 0
\ No newline at end of file
+@register.simple_tag
+def carrito_eventos_url():
+    """URL del stream SSE del carrito, o '' si no se sirve con vistas async (ASGI)"""
+    if not settings.GAMERLY_VISTAS_ASYNC:
+        return ''
+    return reverse('carrito_eventos')
@@ -0,0 +1,16 @@
+from django import template
+from .. import estadisticas
+
+register = template.Library()
+
+
+@register.simple_tag
+def estadisticas_catalogo():
+    """Estadísticas cacheadas del catálogo (ver productos/estadisticas.py)"""
+    return estadisticas.obtener()
+
+
+@register.filter
+def pesos(valor):
+    """Formato colombiano: $129.000 COL"""
+    return f"${int(valor or 0):,} COL".replace(',', '.')
@@ -1,3 +1,1415 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import io
+import json
+import os
+import runpy
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import check_password, identify_hasher, make_password
+from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core import mail
+from django.core.mail import send_mail
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import (authentication, carrito_ajax, consultas_lentas, estadisticas, instrumentacion, masivo, metricas,
+               perfilado, ratelimit, replicas, roles, urls, validators, views, views_async)
+from .contexto import contexto_de
+from .generador_datos import GeneradorDatos
+from .models import Producto, Categoria, Carrito, ItemCarrito, PerfilUsuario, ProductoEliminado, TokenLogin
+from .usuarios import crear_usuario, crear_usuarios_en_bloque
+
+# URLconf de las pruebas con GAMERLY_VISTAS_ASYNC=1 (ROOT_URLCONF=__name__)
+urlpatterns = [path('', include(urls.rutas(views_async)))]
+
+
+class TokenLoginTests(TestCase):
+    """Códigos de 2FA: guardados con HMAC, de un solo uso y con cupo de intentos"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = crear_usuario('jugador', 'jugador@example.com', 'Clave-Segura-987')
+
+    def setUp(self):
+        cache.clear()
+
+    def _fallar(self, veces):
+        for _ in range(veces):
+            self.assertFalse(TokenLogin.verificar(self.usuario, 'no-es'))
+
+    def test_codigo_guardado_con_hash(self):
+        codigo = TokenLogin.emitir_codigo(self.usuario, '127.0.0.1')
+        token = TokenLogin.objects.get(usuario=self.usuario)
+        self.assertRegex(codigo, r'^\d{6}$')
+        self.assertNotEqual(token.token, codigo)
+        self.assertEqual(len(token.token), 64)
+        self.assertFalse(TokenLogin.objects.filter(token=codigo).exists())
+
+    def test_reenvio_reutiliza_la_fila(self):
+        anterior = TokenLogin.emitir_codigo(self.usuario)
+        codigo = TokenLogin.emitir_codigo(self.usuario)
+        self.assertEqual(TokenLogin.objects.filter(usuario=self.usuario).count(), 1)
+        if anterior != codigo:
+            self.assertFalse(TokenLogin.verificar(self.usuario, anterior))
+        self.assertTrue(TokenLogin.verificar(self.usuario, codigo))
+
+    def test_un_solo_uso(self):
+        codigo = TokenLogin.emitir_codigo(self.usuario)
+        with self.assertNumQueries(1):
+            self.assertTrue(TokenLogin.verificar(self.usuario, codigo))
+        self.assertFalse(TokenLogin.verificar(self.usuario, codigo))
+
+    def test_codigo_expirado(self):
+        codigo = TokenLogin.emitir_codigo(self.usuario)
+        TokenLogin.objects.filter(usuario=self.usuario).update(fecha_expiracion=timezone.now())
+        self.assertFalse(TokenLogin.verificar(self.usuario, codigo))
+
+    def test_intentos_agotados(self):
+        codigo = TokenLogin.emitir_codigo(self.usuario)
+        self._fallar(TokenLogin.MAX_INTENTOS)
+        self.assertTrue(TokenLogin.intentos_agotados(self.usuario))
+        # Ni siquiera el código correcto pasa, y no se consulta la BD
+        with self.assertNumQueries(0):
+            self.assertFalse(TokenLogin.verificar(self.usuario, codigo))
+
+    def test_reenvio_no_renueva_intentos(self):
+        TokenLogin.emitir_codigo(self.usuario)
+        self._fallar(TokenLogin.MAX_INTENTOS)
+        codigo = TokenLogin.emitir_codigo(self.usuario)
+        self.assertTrue(TokenLogin.intentos_agotados(self.usuario))
+        self.assertFalse(TokenLogin.verificar(self.usuario, codigo))
+
+        # El cupo vuelve cuando expira el contador
+        cache.delete(TokenLogin._clave_intentos(self.usuario.pk))
+        self.assertTrue(TokenLogin.verificar(self.usuario, codigo))
+
+    def test_codigo_correcto_reinicia_intentos(self):
+        codigo = TokenLogin.emitir_codigo(self.usuario)
+        self._fallar(TokenLogin.MAX_INTENTOS - 1)
+        self.assertTrue(TokenLogin.verificar(self.usuario, codigo))
+        self.assertFalse(TokenLogin.intentos_agotados(self.usuario))
+
+        TokenLogin.emitir_codigo(self.usuario)
+        self._fallar(TokenLogin.MAX_INTENTOS - 1)
+        self.assertFalse(TokenLogin.intentos_agotados(self.usuario))
+
+
+class LimitePeticionesTests(TestCase):
+    """Ventana deslizante por IP y por usuario, reiniciada tras un login correcto"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = crear_usuario('jugador', 'jugador@example.com', 'Clave-Segura-987')
+
+    def setUp(self):
+        cache.clear()
+        # Reloj fijo: que una prueba no cruce el borde de una ventana
+        reloj = mock.patch('productos.ratelimit.time.time', return_value=1000.0)
+        reloj.start()
+        self.addCleanup(reloj.stop)
+
+    def _excede(self, ahora, clave='prueba', limite=3, ventana=100):
+        with mock.patch('productos.ratelimit.time.time', return_value=ahora):
+            return ratelimit.excede_limite(clave, limite, ventana)
+
+    def _login(self, username='jugador', password='Clave-Segura-987', ip='10.0.0.1'):
+        return self.client.post('/login/', {'username': username, 'password': password}, REMOTE_ADDR=ip)
+
+    def test_ventana_deslizante(self):
+        self.assertEqual([self._excede(1000) for _ in range(4)], [False, False, False, True])
+        # A mitad de la ventana siguiente la anterior pesa 0.5: 1.5 estimadas
+        self.assertEqual([self._excede(1150) for _ in range(3)], [False, False, True])
+        # Dos ventanas después ya no cuenta ninguna
+        self.assertEqual([self._excede(1300) for _ in range(4)], [False, False, False, True])
+        # Las claves no se mezclan
+        self.assertFalse(self._excede(1300, clave='otra'))
+
+    def test_limite_por_ip(self):
+        for numero in range(10):
+            self.assertEqual(self._login(username=f'usuario{numero}', password='x').status_code, 200)
+        respuesta = self._login(username='otro', password='x')
+        self.assertEqual(respuesta.status_code, 429)
+        self.assertEqual(respuesta['Retry-After'], '300')
+        self.assertEqual(self._login(username='otro', password='x', ip='10.0.0.2').status_code, 200)
+
+    def test_limite_por_usuario(self):
+        for numero in range(10):
+            self._login(password='x', ip=f'10.0.1.{numero}')
+        # Desde una IP nueva, y sin distinguir mayúsculas
+        self.assertEqual(self._login(username='JUGADOR ', password='x', ip='10.0.2.1').status_code, 429)
+        self.assertEqual(self._login(username='otro', password='x', ip='10.0.2.1').status_code, 200)
+
+    def test_desactivado(self):
+        with self.settings(RATELIMIT_ACTIVO=False):
+            for _ in range(11):
+                self.assertEqual(self._login(password='x').status_code, 200)
+
+    def test_login_correcto_reinicia_el_usuario(self):
+        for numero in range(9):
+            self._login(password='x', ip=f'10.0.1.{numero}')
+        self.assertEqual(self._login(ip='10.0.3.1').status_code, 302)
+        codigo = mail.outbox[-1].body.rsplit(' ', 1)[-1]
+        self.assertEqual(self.client.post('/verificar-token/', {'token': codigo}).status_code, 302)
+        self.client.logout()
+
+        for numero in range(10):
+            self.assertEqual(self._login(password='x', ip=f'10.0.4.{numero}').status_code, 200)
+        self.assertEqual(self._login(password='x', ip='10.0.4.99').status_code, 429)
+
+
+class HashersTests(TestCase):
+    """Hasher preferido por entorno, costo configurable y rehash en el login"""
+
+    PBKDF2 = 'productos.hashers.PBKDF2GamerlyHasher'
+    MD5 = 'django.contrib.auth.hashers.MD5PasswordHasher'
+
+    def _hashers_con(self, **entorno):
+        with mock.patch.dict(os.environ, entorno):
+            return runpy.run_module('tienda.settings')['PASSWORD_HASHERS']
+
+    def test_configuracion_por_entorno(self):
+        hashers = self._hashers_con(GAMERLY_HASHER='pbkdf2')
+        self.assertEqual(hashers[0], self.PBKDF2)
+        self.assertNotIn(self.MD5, hashers)
+
+        hashers = self._hashers_con(GAMERLY_HASHER='scrypt')
+        self.assertEqual(hashers[0], 'productos.hashers.ScryptGamerlyHasher')
+        self.assertIn(self.PBKDF2, hashers)
+        self.assertEqual(self._hashers_con(GAMERLY_HASHER='md5')[0], self.MD5)
+
+    @override_settings(PASSWORD_HASHERS=[PBKDF2, MD5], GAMERLY_PBKDF2_ITERACIONES=1000)
+    def test_iteraciones_configurables(self):
+        codificado = make_password('Clave-Segura-987')
+        self.assertTrue(codificado.startswith('pbkdf2_sha256$1000$'))
+        self.assertTrue(check_password('Clave-Segura-987', codificado))
+        self.assertFalse(identify_hasher(codificado).must_update(codificado))
+
+        with self.settings(GAMERLY_PBKDF2_ITERACIONES=2000):
+            self.assertTrue(identify_hasher(codificado).must_update(codificado))
+
+    @override_settings(PASSWORD_HASHERS=[PBKDF2, MD5], GAMERLY_PBKDF2_ITERACIONES=1000)
+    def test_rehash_en_el_login(self):
+        usuario = User.objects.create_user('antiguo', password='x')
+        User.objects.filter(pk=usuario.pk).update(password=make_password('Clave-Segura-987', hasher='md5'))
+
+        self.assertIsNotNone(authenticate(username='antiguo', password='Clave-Segura-987'))
+        usuario.refresh_from_db()
+        self.assertTrue(usuario.password.startswith('pbkdf2_sha256$1000$'))
+
+        with self.settings(GAMERLY_PBKDF2_ITERACIONES=2000):
+            self.assertIsNotNone(authenticate(username='antiguo', password='Clave-Segura-987'))
+        usuario.refresh_from_db()
+        self.assertTrue(usuario.password.startswith('pbkdf2_sha256$2000$'))
+
+    @override_settings(PASSWORD_HASHERS=[PBKDF2, MD5], GAMERLY_PBKDF2_ITERACIONES=1000)
+    def test_medir_hashers(self):
+        salida = io.StringIO()
+        call_command('medir_hashers', '--repeticiones', '2', '--logins-por-segundo', '10', stdout=salida)
+        lineas = salida.getvalue().splitlines()
+        self.assertTrue(lineas[1].startswith('PBKDF2GamerlyHasher (preferido)'))
+        self.assertIn('10 logins/s', lineas[2])
+        self.assertTrue(lineas[3].startswith('MD5PasswordHasher '))
+
+
+class PoliticaPasswordTests(TestCase):
+    """AUTH_PASSWORD_VALIDATORS: composición, lista de comunes y parecido con el usuario"""
+
+    def setUp(self):
+        self.usuario = User(username='jugador', email='valeria@example.com',
+                            first_name='Valentina', last_name='Restrepo')
+
+    def _codigos(self, password, usuario=None):
+        try:
+            validate_password(password, usuario or self.usuario)
+        except ValidationError as e:
+            return {error.code for error in e.error_list}
+        return set()
+
+    def test_acepta(self):
+        for password in ['Clave-Segura-987', 'torre9Norte!', 'xq7-Lluvia-Azul']:
+            self.assertEqual(self._codigos(password), set(), password)
+        self.assertEqual(validators.errores_password('Clave-Segura-987', self.usuario), [])
+
+    def test_composicion(self):
+        self.assertEqual(self._codigos('t9x#Q2'), {'password_too_short'})
+        self.assertIn('password_entirely_numeric', self._codigos('48151623429'))
+        self.assertIn('password_entirely_alpha', self._codigos('torreNorteAzul'))
+        self.assertEqual(self._codigos('torre-norte!'), {'password_sin_mezcla'})
+
+    def test_comunes(self):
+        self.assertEqual(self._codigos('password1'), {'password_too_common'})
+        # Las nuestras y sin distinguir mayúsculas
+        self.assertEqual(self._codigos('GAMERLY123'), {'password_too_common'})
+
+    def test_lista_extra(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as archivo:
+            archivo.write('filtrada2024\n')
+        self.addCleanup(os.unlink, archivo.name)
+        validador = validators.PasswordComunValidator(rutas=[archivo.name])
+        with self.assertRaises(ValidationError):
+            validador.validate('Filtrada2024')
+        validador.validate('torre9Norte!')
+
+    def test_parecido_con_el_usuario(self):
+        # Los casos de UserAttributeSimilarityValidator: usuario, nombre, apellido y email
+        for password in ['jugador1', 'Valentina12', 'Restrepo2024', 'valeria@example']:
+            self.assertIn('password_too_similar', self._codigos(password), password)
+
+    def test_usuario_contenido(self):
+        # Demasiado larga para la similitud, pero contiene el usuario
+        codigos = self._codigos('mi-clave-de-jugador-2024')
+        self.assertEqual(codigos, {'password_contiene_usuario'})
+        self.assertEqual(self._codigos('mi-clave-de-jugador-2024', User(username='otro')), set())
+
+    def test_mensajes(self):
+        self.assertEqual(validators.errores_password('a1', self.usuario),
+                         ['La contraseña debe tener al menos 8 caracteres'])
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class VistasAsyncTests(TestCase):
+    """Login con 2FA y carrito servidos por views_async, con la lógica compartida de views.py"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = crear_usuario('jugador', 'jugador@example.com', 'Clave-Segura-987')
+        categoria = Categoria.objects.create(nombre='Mandos')
+        cls.producto = Producto.objects.create(nombre='Mando', precio=Decimal('1000'), categoria=categoria, stock=5)
+
+    def setUp(self):
+        cache.clear()
+        self.client = AsyncClient()
+
+    async def _post_json(self, url, datos):
+        return await self.client.post(url, json.dumps(datos), content_type='application/json')
+
+    async def test_login_con_2fa(self):
+        respuesta = await self.client.post('/login/', {'username': 'jugador', 'password': 'Clave-Segura-987'})
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertEqual(respuesta['Location'], '/verificar-token/')
+        self.assertEqual(len(mail.outbox), 1)
+        codigo = mail.outbox[0].body.rsplit(' ', 1)[-1]
+
+        incorrecto = f'{(int(codigo) + 1) % 10 ** 6:06d}'
+        respuesta = await self.client.post('/verificar-token/', {'token': incorrecto})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIsNone(await (await self.client.asession()).aget('_auth_user_id'))
+
+        respuesta = await self.client.post('/verificar-token/', {'token': codigo})
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertEqual(respuesta['Location'], '/dashboard/')
+        sesion = await self.client.asession()
+        self.assertEqual(await sesion.aget('_auth_user_id'), str(self.usuario.pk))
+        self.assertIsNone(await sesion.aget('pending_user_id'))
+
+    async def test_login_credenciales_invalidas(self):
+        respuesta = await self.client.post('/login/', {'username': 'jugador', 'password': 'x'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(mail.outbox, [])
+
+    async def test_reenviar_codigo(self):
+        await self.client.post('/login/', {'username': 'jugador', 'password': 'Clave-Segura-987'})
+        respuesta = await self.client.post('/reenviar-token/')
+        self.assertTrue(json.loads(respuesta.content)['success'])
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[1].subject, 'Nuevo código de verificación - GAMERLY')
+
+    async def test_carrito(self):
+        await self.client.aforce_login(self.usuario)
+
+        datos = json.loads((await self._post_json(
+            '/ajax/carrito/agregar/', {'producto_id': self.producto.pk, 'cantidad': 2})).content)
+        self.assertEqual((datos['success'], datos['carrito_items'], datos['carrito_total']), (True, 2, 2000))
+
+        datos = json.loads((await self._post_json(
+            '/ajax/carrito/agregar/', {'producto_id': self.producto.pk, 'cantidad': 4})).content)
+        self.assertEqual(datos, {'success': False, 'message': 'Solo puedes agregar 3 unidades más'})
+
+        datos = json.loads((await self.client.get('/ajax/carrito/items/')).content)
+        self.assertEqual((datos['total_items'], datos['total_precio'], datos['items_count']), (2, 2000, 1))
+        item_id = datos['items'][0]['id']
+
+        datos = json.loads((await self._post_json(f'/ajax/carrito/actualizar/{item_id}/', {'cantidad': 3})).content)
+        self.assertEqual((datos['item_subtotal'], datos['carrito_items']), (3000, 3))
+
+        datos = json.loads((await self.client.delete(f'/ajax/carrito/eliminar/{item_id}/')).content)
+        self.assertEqual((datos['success'], datos['carrito_items'], datos['carrito_total']), (True, 0, 0))
+
+        await self._post_json('/ajax/carrito/agregar/', {'producto_id': self.producto.pk})
+        datos = json.loads((await self.client.post('/ajax/carrito/limpiar/')).content)
+        self.assertEqual(datos['carrito_items'], 0)
+        self.assertFalse(await ItemCarrito.objects.filter(carrito__usuario=self.usuario).aexists())
+
+    async def test_carrito_requiere_login(self):
+        respuesta = await self.client.get('/ajax/carrito/items/')
+        self.assertEqual(respuesta.status_code, 302)
+
+
+class GeneradorDatosTests(TestCase):
+    """generar_datos a escala pequeña: conteos por tabla y la misma salida con la misma semilla"""
+
+    def _generar(self, semilla=7):
+        call_command('generar_datos', categorias=3, productos=40, usuarios=6, max_items_carrito=3,
+                     semilla=semilla, lote=15, silencioso=True, stdout=io.StringIO())
+
+    def _foto(self):
+        return (
+            list(Categoria.objects.order_by('nombre').values_list('nombre', 'activo')),
+            list(Producto.objects.order_by('nombre').values_list(
+                'nombre', 'precio', 'precio_oferta', 'categoria__nombre', 'stock', 'estado', 'destacado')),
+            list(ItemCarrito.objects.order_by('carrito__usuario__username', 'producto__nombre').values_list(
+                'carrito__usuario__username', 'producto__nombre', 'cantidad')),
+        )
+
+    def _borrar(self):
+        ItemCarrito.objects.all().delete()
+        Producto.objects.all().delete()
+        Categoria.objects.all().delete()
+        User.objects.all().delete()
+
+    def test_conteos(self):
+        self._generar()
+        self.assertEqual(Categoria.objects.count(), 3)
+        self.assertEqual(Producto.objects.count(), 40)
+        self.assertEqual(User.objects.filter(username__startswith='sintetico_').count(), 6)
+        self.assertEqual(PerfilUsuario.objects.count(), 6)
+        self.assertEqual(Carrito.objects.count(), 6)
+        self.assertLessEqual(ItemCarrito.objects.count(), 6 * 3)
+        usuario = User.objects.get(username='sintetico_0')
+        self.assertTrue(usuario.check_password('Gamerly-sintetico-1'))
+
+    def test_semilla_repetible(self):
+        self._generar()
+        primera = self._foto()
+        self._borrar()
+        self._generar()
+        self.assertEqual(self._foto(), primera)
+
+        self._borrar()
+        self._generar(semilla=8)
+        self.assertNotEqual(self._foto(), primera)
+
+    def test_prefijo_continua_la_numeracion(self):
+        GeneradorDatos(semilla=1).usuarios(2)
+        GeneradorDatos(semilla=1).usuarios(2)
+        self.assertEqual(
+            sorted(User.objects.values_list('username', flat=True)),
+            ['sintetico_0', 'sintetico_1', 'sintetico_2', 'sintetico_3'],
+        )
+
+
+class ProvisionUsuariosTests(TestCase):
+    """Cada User nace con PerfilUsuario y Carrito, uno a uno o en bloque"""
+
+    def test_crear_usuario(self):
+        usuario = crear_usuario('jugador', 'jugador@example.com', 'Clave-Segura-987', first_name='Ana')
+        usuario = User.objects.select_related('perfilusuario', 'carrito').get(pk=usuario.pk)
+        self.assertEqual(usuario.first_name, 'Ana')
+        self.assertTrue(usuario.check_password('Clave-Segura-987'))
+        self.assertEqual(usuario.perfilusuario.tipo_usuario, 'cliente')
+        self.assertEqual(usuario.carrito.total_items(), 0)
+
+    def test_crear_usuario_es_atomico(self):
+        with mock.patch('productos.models.Carrito.objects.create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                crear_usuario('jugador', 'jugador@example.com', 'Clave-Segura-987')
+        self.assertFalse(User.objects.filter(username='jugador').exists())
+        self.assertFalse(PerfilUsuario.objects.exists())
+
+    def _en_bloque(self, cantidad, prefijo='bloque'):
+        usuarios = [User(username=f'{prefijo}{i}', password='!') for i in range(cantidad)]
+        with CaptureQueriesContext(connection) as consultas:
+            ids = crear_usuarios_en_bloque(usuarios, batch_size=1000)
+        return ids, len(consultas)
+
+    def test_en_bloque_crea_perfiles_y_carritos(self):
+        ids, _ = self._en_bloque(5)
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(set(PerfilUsuario.objects.values_list('usuario_id', flat=True)), set(ids))
+        self.assertEqual(set(Carrito.objects.values_list('usuario_id', flat=True)), set(ids))
+
+    def test_en_bloque_consultas_acotadas(self):
+        # Un INSERT por lote y tabla (SQLite parte los lotes por su límite de
+        # parámetros), nunca uno por usuario
+        _, pocas = self._en_bloque(5)
+        _, muchas = self._en_bloque(200, prefijo='masivo')
+        self.assertLessEqual(pocas, 5)
+        self.assertLessEqual(muchas, 10)
+
+    def test_migracion_provisiona_existentes(self):
+        migracion = importlib.import_module('productos.migrations.0011_provisionar_usuarios_existentes')
+        completo = crear_usuario('completo')
+        sin_nada = User.objects.bulk_create([User(username='antiguo', password='!')])[0]
+        sin_carrito = User.objects.bulk_create([User(username='sin_carrito', password='!')])[0]
+        PerfilUsuario.objects.create(usuario=sin_carrito, tipo_usuario='admin')
+
+        migracion.provisionar(django_apps, None)
+        migracion.provisionar(django_apps, None)  # idempotente
+
+        for usuario in (completo, sin_nada, sin_carrito):
+            self.assertEqual(PerfilUsuario.objects.filter(usuario=usuario).count(), 1)
+            self.assertEqual(Carrito.objects.filter(usuario=usuario).count(), 1)
+        self.assertEqual(PerfilUsuario.objects.get(usuario=sin_carrito).tipo_usuario, 'admin')
+
+
+class ContextoUsuarioTests(TestCase):
+    """Perfil, rol y carrito se cargan con una sola consulta por petición"""
+
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nombre='Periféricos')
+        cls.producto = Producto.objects.create(nombre='Teclado', precio=Decimal('1000'),
+                                               precio_oferta=Decimal('800'), categoria=categoria, stock=5)
+        otro = Producto.objects.create(nombre='Mouse', precio=Decimal('500'), categoria=categoria, stock=5)
+
+        cls.cliente = crear_usuario('cliente', 'cliente@example.com', 'Clave-Segura-987')
+        ItemCarrito.objects.create(carrito=cls.cliente.carrito, producto=cls.producto, cantidad=2)
+        ItemCarrito.objects.create(carrito=cls.cliente.carrito, producto=otro, cantidad=3)
+
+        cls.admin = crear_usuario('administrador', 'admin@example.com', 'Clave-Segura-987')
+        cls.admin.perfilusuario.tipo_usuario = 'admin'
+        cls.admin.perfilusuario.save()
+
+    def setUp(self):
+        cache.clear()
+
+    def _get(self, usuario, url, consultas, de_contexto=None):
+        """GET con ``consultas`` queries en total y ``de_contexto`` sobre perfil/carrito"""
+        if usuario:
+            self.client.force_login(usuario)
+        with self.assertNumQueries(consultas), CaptureQueriesContext(connection) as capturadas:
+            respuesta = self.client.get(url)
+        self.assertLess(respuesta.status_code, 400)
+
+        if de_contexto is None:
+            de_contexto = 1 if usuario else 0
+        sobre_perfil_o_carrito = [q for q in capturadas.captured_queries
+                                  if '"productos_perfilusuario"' in q['sql'] or '"productos_carrito"' in q['sql']]
+        self.assertEqual(len(sobre_perfil_o_carrito), de_contexto)
+        return respuesta
+
+    def test_resumen_del_carrito(self):
+        contexto = contexto_de(User.objects.get(pk=self.cliente.pk))
+        self.assertFalse(contexto.es_admin)
+        self.assertEqual(contexto.total_items, 5)
+        self.assertEqual(contexto.total_precio, Decimal('3100'))
+
+    def test_contexto_se_carga_una_vez(self):
+        user = User.objects.get(pk=self.admin.pk)
+        with self.assertNumQueries(1):
+            self.assertTrue(contexto_de(user).es_admin)
+            self.assertTrue(contexto_de(user).es_admin)
+            user.perfilusuario
+            user.carrito
+
+    # sesión + usuario + contexto = 3 consultas base en cada vista autenticada
+
+    def test_home_anonimo(self):
+        self._get(None, '/', 3)
+
+    def test_home(self):
+        self._get(self.cliente, '/', 6)
+
+    def test_dashboard_cliente(self):
+        respuesta = self._get(self.cliente, '/dashboard/', 7)
+        self.assertTemplateUsed(respuesta, 'dashboard_cliente.html')
+
+    def test_dashboard_admin(self):
+        respuesta = self._get(self.admin, '/dashboard/', 5)
+        self.assertTemplateUsed(respuesta, 'dashboard_admin.html')
+
+    def test_perfil(self):
+        self._get(self.cliente, '/perfil/', 7)
+
+    def test_carrito(self):
+        self._get(self.cliente, '/carrito/', 10)
+
+    def test_es_admin_en_user_passes_test(self):
+        self._get(self.admin, '/ajax/crear-producto/', 3)
+        # Con el rol en caché la comprobación no consulta la BD
+        self._get(self.admin, '/ajax/crear-producto/', 2, de_contexto=0)
+
+    def test_es_admin_rechaza_cliente(self):
+        self.client.force_login(self.cliente)
+        with self.assertNumQueries(3):
+            respuesta = self.client.get('/ajax/crear-producto/')
+        self.assertEqual(respuesta.status_code, 302)
+
+    def test_api_productos(self):
+        self._get(self.cliente, '/api/productos/', 4)
+        self._get(self.cliente, '/api/productos/', 3, de_contexto=0)
+
+    def test_api_categorias(self):
+        self._get(self.cliente, '/api/categorias/', 5)
+        self._get(self.cliente, '/api/categorias/', 4, de_contexto=0)
+
+    def test_detalle_producto(self):
+        self._get(self.cliente, f'/producto/{self.producto.pk}/', 6)
+
+    def test_api_carrito_info(self):
+        respuesta = self._get(self.cliente, '/api/carrito-info/', 3)
+        self.assertEqual(respuesta.json(), {'total_items': 5, 'total_precio': 3100})
+
+    def test_api_mi_perfil(self):
+        respuesta = self._get(self.cliente, '/api/mi-perfil/', 3)
+        self.assertEqual(respuesta.json()['username'], 'cliente')
+
+    def test_actualizar_perfil(self):
+        self.client.force_login(self.cliente)
+        with CaptureQueriesContext(connection) as capturadas:
+            respuesta = self.client.post('/ajax/actualizar-perfil/', {'first_name': 'Ana', 'telefono': '3001234567'})
+        self.assertTrue(respuesta.json()['success'])
+        lecturas_perfil = [q for q in capturadas.captured_queries
+                           if q['sql'].startswith('SELECT') and '"productos_perfilusuario"' in q['sql']]
+        self.assertEqual(len(lecturas_perfil), 1)
+        self.assertEqual(PerfilUsuario.objects.get(usuario=self.cliente).telefono, '3001234567')
+
+
+class RolesTests(TestCase):
+    """El rol se resuelve desde la caché y se invalida al guardar el perfil"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = crear_usuario('gestor', 'gestor@example.com', 'Clave-Segura-987')
+        cls.categoria = Categoria.objects.create(nombre='Consolas')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_rol_cacheado(self):
+        self.assertFalse(roles.es_admin(self.usuario))
+        with self.assertNumQueries(0):
+            self.assertFalse(roles.es_admin(self.usuario))
+
+    def test_invalidacion_al_guardar_perfil(self):
+        self.assertFalse(roles.es_admin(self.usuario))
+        perfil = PerfilUsuario.objects.get(usuario=self.usuario)
+        perfil.tipo_usuario = 'admin'
+        perfil.save()
+        self.assertTrue(roles.es_admin(self.usuario))
+
+    def test_permiso_escritura_api(self):
+        self.client.force_login(self.usuario)
+        url = f'/api/categorias/{self.categoria.pk}/'
+        self.assertEqual(self.client.patch(url, {'activo': False}, content_type='application/json').status_code, 403)
+
+        # El perfil 'admin' no basta para escribir en la API: se requiere is_staff
+        PerfilUsuario.objects.filter(usuario=self.usuario).update(tipo_usuario='admin')
+        cache.delete(PerfilUsuario.clave_rol(self.usuario.pk))
+        self.assertEqual(self.client.patch(url, {'activo': False}, content_type='application/json').status_code, 403)
+
+        User.objects.filter(pk=self.usuario.pk).update(is_staff=True)
+        self.assertEqual(self.client.patch(url, {'activo': False}, content_type='application/json').status_code, 200)
+
+        # Con el rol ya en caché el permiso no consulta el perfil
+        with CaptureQueriesContext(connection) as capturadas:
+            respuesta = self.client.patch(url, {'activo': True}, content_type='application/json')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual([q for q in capturadas.captured_queries if '"productos_perfilusuario"' in q['sql']], [])
+
+    def test_permiso_lectura_api(self):
+        self.client.force_login(self.usuario)
+        self.assertEqual(self.client.get('/api/categorias/').status_code, 200)
+        self.assertEqual(self.client.get('/api/productos/cambios/').status_code, 200)
+        # destacados sigue siendo de gestión, como antes
+        self.assertEqual(self.client.get('/api/productos/destacados/').status_code, 403)
+        self.client.logout()
+        self.assertIn(self.client.get('/api/categorias/').status_code, (401, 403))
+
+
+class TokenFirmadoTests(TestCase):
+    """Token firmado: sin sesión y sin consultas de autenticación por petición"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = crear_usuario('movil', 'movil@example.com', 'Clave-Segura-987')
+        Categoria.objects.create(nombre='Sillas')
+
+    def setUp(self):
+        cache.clear()
+
+    def _pedir(self, **datos):
+        datos = {'username': 'movil', 'password': 'Clave-Segura-987', **datos}
+        return self.client.post('/api/token/', datos, content_type='application/json')
+
+    def _token(self):
+        self.assertEqual(self._pedir().status_code, 202)
+        respuesta = self._pedir(codigo=mail.outbox[-1].body.rsplit(' ', 1)[-1])
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()['token']
+
+    def test_credenciales_invalidas(self):
+        self.assertEqual(self._pedir(password='otra').status_code, 400)
+        self.assertEqual(mail.outbox, [])
+
+    def test_password_sola_no_emite_token(self):
+        respuesta = self._pedir()
+        self.assertEqual(respuesta.status_code, 202)
+        self.assertNotIn('token', respuesta.json())
+        self.assertEqual(len(mail.outbox), 1)
+
+        codigo = mail.outbox[-1].body.rsplit(' ', 1)[-1]
+        respuesta = self._pedir(codigo=f'{(int(codigo) + 1) % 10 ** 6:06d}')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertNotIn('token', respuesta.json())
+        # El código correcto con otra contraseña tampoco sirve
+        self.assertEqual(self._pedir(password='otra', codigo=codigo).status_code, 400)
+
+    def test_cache_sin_hash_de_password(self):
+        cabecera = {'HTTP_AUTHORIZATION': f'Token {self._token()}'}
+        self.assertEqual(self.client.get('/api/mi-perfil/', **cabecera).status_code, 200)
+
+        datos = cache.get(f'api:usuario:{self.usuario.pk}')
+        self.assertEqual(set(datos), {'id', 'is_active', 'is_staff', 'is_superuser', 'huella'})
+        self.assertNotIn(self.usuario.password, datos.values())
+
+        user, _ = authentication.usuario_en_cache(self.usuario.pk)
+        self.assertEqual((user.pk, user.is_active, user.is_staff), (self.usuario.pk, True, False))
+        self.assertIn('password', user.get_deferred_fields())
+
+    def test_peticion_con_token_no_consulta_usuario_ni_sesion(self):
+        cabecera = {'HTTP_AUTHORIZATION': f'Token {self._token()}'}
+        self.client.get('/api/categorias/', **cabecera)
+
+        # Solo las categorías y el conteo de productos de la única categoría
+        with self.assertNumQueries(2):
+            respuesta = self.client.get('/api/categorias/', **cabecera)
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_token_invalido(self):
+        respuesta = self.client.get('/api/categorias/', HTTP_AUTHORIZATION='Token basura')
+        self.assertEqual(respuesta.status_code, 401)
+
+    def test_cambiar_password_revoca_tokens(self):
+        cabecera = {'HTTP_AUTHORIZATION': f'Token {self._token()}'}
+        self.assertEqual(self.client.get('/api/categorias/', **cabecera).status_code, 200)
+
+        self.usuario.set_password('Otra-Clave-Segura-654')
+        self.usuario.save()
+        self.assertEqual(self.client.get('/api/categorias/', **cabecera).status_code, 401)
+
+    @override_settings(PASSWORD_HASHERS=[HashersTests.PBKDF2, HashersTests.MD5], GAMERLY_PBKDF2_ITERACIONES=1000)
+    def test_rehash_no_revoca_tokens(self):
+        cabecera = {'HTTP_AUTHORIZATION': f'Token {self._token()}'}
+        hash_anterior = User.objects.get(pk=self.usuario.pk).password
+
+        with self.settings(GAMERLY_PBKDF2_ITERACIONES=2000):
+            self.assertIsNotNone(authenticate(username='movil', password='Clave-Segura-987'))
+        self.assertNotEqual(User.objects.get(pk=self.usuario.pk).password, hash_anterior)
+        self.assertEqual(self.client.get('/api/categorias/', **cabecera).status_code, 200)
+
+
+class JSONRapidoRendererTests(TestCase):
+    def test_misma_salida_que_drf(self):
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import JSONRapidoRenderer
+
+        data = {'total_precio': Decimal('3100.50'), 'nombre': 'Teclado ñandú', 'items': [1, 2], 'vacio': None}
+        self.assertEqual(json.loads(JSONRapidoRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+        self.assertEqual(json.loads(JSONRapidoRenderer().render(data))['total_precio'], 3100.5)
+
+
+class CamposDinamicosTests(TestCase):
+    """?fields= / ?omit= recortan la respuesta y las columnas consultadas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nombre='Audio')
+        cls.producto = Producto.objects.create(nombre='Headset', precio=Decimal('1000'),
+                                               precio_oferta=Decimal('800'), categoria=categoria, stock=5)
+        cls.usuario = crear_usuario('consumidor', 'consumidor@example.com', 'Clave-Segura-987')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def _sql_productos(self, url):
+        with CaptureQueriesContext(connection) as capturadas:
+            respuesta = self.client.get(url)
+        sql = [q['sql'] for q in capturadas.captured_queries if 'FROM "productos_producto"' in q['sql']]
+        return respuesta.json(), sql[0]
+
+    def test_fields(self):
+        data, sql = self._sql_productos('/api/productos/?fields=id,nombre,precio_actual')
+        self.assertEqual(data, [{'id': self.producto.pk, 'nombre': 'Headset', 'precio_actual': '800.00'}])
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('"descripcion"', sql)
+
+    def test_omit_conserva_join_necesario(self):
+        data, sql = self._sql_productos(f'/api/productos/{self.producto.pk}/?omit=descripcion,creado_por_nombre')
+        self.assertNotIn('descripcion', data)
+        self.assertEqual(data['categoria_nombre'], 'Audio')
+        self.assertIn('"productos_categoria"', sql)
+        self.assertNotIn('"auth_user"', sql)
+
+    def test_categorias_sin_conteo(self):
+        self.client.get('/api/categorias/?fields=id,nombre')
+        with self.assertNumQueries(3):  # sesión + usuario + categorías; sin el COUNT por categoría
+            respuesta = self.client.get('/api/categorias/?fields=id,nombre')
+        self.assertEqual(list(respuesta.json()[0]), ['id', 'nombre'])
+
+    def test_destacados_con_fields(self):
+        Producto.objects.filter(pk=self.producto.pk).update(destacado=True)
+        self.client.force_login(crear_usuario('encargado', 'encargado@example.com', 'Clave-Segura-987', is_staff=True))
+        self.client.get('/api/productos/destacados/?fields=id,nombre')
+
+        with self.assertNumQueries(3):  # sesión + usuario + productos
+            data, sql = self._sql_productos('/api/productos/destacados/?fields=id,nombre')
+        self.assertEqual(data, [{'id': self.producto.pk, 'nombre': 'Headset'}])
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('"descripcion"', sql)
+
+
+@override_settings(SINCRONIZACION_MARGEN_SEGUNDOS=0)
+class CambiosCatalogoTests(TestCase):
+    """/api/productos/cambios/ devuelve solo lo modificado o borrado desde una fecha"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categoria = Categoria.objects.create(nombre='Monitores')
+        cls.productos = [
+            Producto.objects.create(nombre=f'Monitor {i}', precio=Decimal('1000'), categoria=cls.categoria, stock=5)
+            for i in range(3)
+        ]
+        cls.usuario = crear_usuario('espejo', 'espejo@example.com', 'Clave-Segura-987')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def _sincronizar(self, desde=None, limite=500):
+        upserts, eliminados = [], []
+        parametros = {'limite': limite} if desde is None else {'desde': desde, 'limite': limite}
+        respuesta = self.client.get('/api/productos/cambios/', parametros).json()
+        while True:
+            upserts += [p['id'] for p in respuesta['upserts']]
+            eliminados += respuesta['eliminados']
+            if not respuesta['siguiente']:
+                return upserts, eliminados, respuesta['hasta']
+            respuesta = self.client.get('/api/productos/cambios/', {'cursor': respuesta['siguiente']}).json()
+
+    def test_sincronizacion_completa_paginada(self):
+        upserts, eliminados, _ = self._sincronizar(limite=1)
+        self.assertEqual(upserts, [p.pk for p in self.productos])
+        self.assertEqual(eliminados, [])
+
+    def test_solo_cambios_desde_hasta(self):
+        _, _, hasta = self._sincronizar()
+
+        modificado, borrado, agotado = self.productos
+        modificado.precio_oferta = Decimal('900')
+        modificado.save()
+        borrado_id = borrado.pk
+        borrado.delete()
+        agotado.estado = 'agotado'
+        agotado.save()
+
+        upserts, eliminados, _ = self._sincronizar(hasta)
+        self.assertEqual(upserts, [modificado.pk])
+        self.assertCountEqual(eliminados, [borrado_id, agotado.pk])
+
+    def test_desde_invalido(self):
+        self.assertEqual(self.client.get('/api/productos/cambios/', {'desde': 'ayer'}).status_code, 400)
+
+    def test_margen_no_salta_confirmaciones_tardias(self):
+        with self.settings(SINCRONIZACION_MARGEN_SEGUNDOS=60):
+            upserts, _, hasta = self._sincronizar()
+            # Recién guardados: quedan para la próxima sincronización
+            self.assertEqual(upserts, [])
+            self.assertLess(timezone.now() - timedelta(seconds=61), parse_datetime(hasta))
+
+        upserts, _, _ = self._sincronizar(hasta)
+        self.assertEqual(upserts, [p.pk for p in self.productos])
+
+    def test_desde_vencido(self):
+        respuesta = self.client.get('/api/productos/cambios/', {'desde': '2000-01-01T00:00:00Z'})
+        self.assertEqual(respuesta.status_code, 410)
+
+    def test_limpiar_eliminados(self):
+        viejo = ProductoEliminado.objects.create(producto_id=1)
+        ProductoEliminado.objects.filter(pk=viejo.pk).update(
+            fecha_eliminacion=timezone.now() - timedelta(days=settings.SINCRONIZACION_RETENCION_DIAS + 1))
+        reciente = ProductoEliminado.objects.create(producto_id=2)
+
+        salida = io.StringIO()
+        call_command('limpiar_eliminados', stdout=salida)
+        self.assertIn('1 marcas', salida.getvalue())
+        self.assertEqual(list(ProductoEliminado.objects.values_list('pk', flat=True)), [reciente.pk])
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class EventosCarritoTests(TransactionTestCase):
+    """El stream SSE empuja el resumen del carrito y el stock sin polling"""
+
+    async def test_stream_carrito_y_stock(self):
+        categoria = await Categoria.objects.acreate(nombre='Volantes')
+        producto = await Producto.objects.acreate(nombre='Volante', precio=Decimal('1000'), categoria=categoria, stock=5)
+        usuario = await sync_to_async(crear_usuario)('piloto', 'piloto@example.com', 'Clave-Segura-987')
+
+        client = AsyncClient()
+        await client.aforce_login(usuario)
+        respuesta = await client.get('/eventos/carrito/')
+        self.assertEqual(respuesta['Content-Type'], 'text/event-stream')
+
+        stream = respuesta.streaming_content.__aiter__()
+
+        async def siguiente_evento():
+            while True:
+                bloque = (await asyncio.wait_for(stream.__anext__(), 5)).decode()
+                if bloque.startswith('event:'):
+                    tipo, datos = bloque.strip().split('\n')
+                    return tipo[len('event: '):], json.loads(datos[len('data: '):])
+
+        self.assertEqual(await siguiente_evento(), ('carrito', {'total_items': 0, 'total_precio': 0}))
+
+        carrito = await Carrito.objects.aget(usuario=usuario)
+        await ItemCarrito.objects.acreate(carrito=carrito, producto=producto, cantidad=2)
+        self.assertEqual(await siguiente_evento(), ('carrito', {'total_items': 2, 'total_precio': 2000}))
+
+        producto.stock = 3
+        await producto.asave()
+        tipo, datos = await siguiente_evento()
+        self.assertEqual((tipo, datos['producto_id'], datos['stock']), ('stock', producto.pk, 3))
+
+    async def test_total_igual_que_carrito_ajax(self):
+        categoria = await Categoria.objects.acreate(nombre='Pedales')
+        usuario = await sync_to_async(crear_usuario)('copiloto', 'copiloto@example.com', 'Clave-Segura-987')
+        carrito = await Carrito.objects.aget(usuario=usuario)
+        for precio in ('0.60', '0.70'):
+            producto = await Producto.objects.acreate(nombre=f'Pedal {precio}', precio=Decimal(precio),
+                                                      categoria=categoria, stock=5)
+            await ItemCarrito.objects.acreate(carrito=carrito, producto=producto, cantidad=1)
+
+        resumen, _ = await views_async._estado_carrito(carrito.id)
+        esperado = await sync_to_async(carrito_ajax.resumen)(carrito.id)
+        self.assertEqual(resumen['total_precio'], esperado['carrito_total'])
+        self.assertEqual(resumen['total_precio'], 1)
+
+    def test_solo_con_vistas_async(self):
+        nombres = {getattr(patron, 'name', None) for patron in urls.rutas(views)}
+        self.assertIn('carrito_items_ajax', nombres)
+        self.assertNotIn('carrito_eventos', nombres)
+
+
+class AdminChangelistTests(TestCase):
+    """Los changelists del admin hacen las mismas consultas con 10 o con 100 filas"""
+
+    URLS = [
+        '/admin/productos/producto/',
+        '/admin/productos/categoria/',
+        '/admin/productos/carrito/',
+        '/admin/productos/itemcarrito/',
+        '/admin/productos/perfilusuario/',
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('jefe', 'jefe@example.com', 'Clave-Segura-987')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def _poblar(self, desde, hasta):
+        for i in range(desde, hasta):
+            categoria = Categoria.objects.create(nombre=f'Categoría {i}')
+            producto = Producto.objects.create(nombre=f'Producto {i}', precio=Decimal('1000'),
+                                               categoria=categoria, stock=5)
+            usuario = crear_usuario(f'cliente{i}', f'cliente{i}@example.com', 'Clave-Segura-987')
+            ItemCarrito.objects.create(carrito=usuario.carrito, producto=producto, cantidad=2)
+
+    def _consultas(self):
+        consultas = {}
+        for url in self.URLS:
+            with CaptureQueriesContext(connection) as capturadas:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            consultas[url] = len(capturadas)
+        return consultas
+
+    def test_consultas_constantes(self):
+        self._poblar(0, 10)
+        con_10 = self._consultas()
+        self._poblar(10, 100)
+        self.assertEqual(self._consultas(), con_10)
+
+    def test_totales_del_carrito(self):
+        self._poblar(0, 1)
+        respuesta = self.client.get('/admin/productos/carrito/')
+        self.assertContains(respuesta, '📦 2 items')
+        self.assertContains(respuesta, '$2.000 COL')
+
+
+class EstadisticasTests(TestCase):
+    """Los KPIs del catálogo salen de una consulta y se comparten por la caché"""
+
+    @classmethod
+    def setUpTestData(cls):
+        consolas = Categoria.objects.create(nombre='Consolas')
+        Categoria.objects.create(nombre='Retro', activo=False)
+        Producto.objects.create(nombre='Consola', precio=Decimal('1000'), precio_oferta=Decimal('800'),
+                                categoria=consolas, stock=2, destacado=True)
+        Producto.objects.create(nombre='Control', precio=Decimal('100'), categoria=consolas, stock=0, estado='agotado')
+        cls.admin = User.objects.create_superuser('jefa', 'jefa@example.com', 'Clave-Segura-987')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_una_consulta(self):
+        with self.assertNumQueries(1):
+            stats = estadisticas.obtener()
+        with self.assertNumQueries(0):
+            estadisticas.obtener()
+
+        self.assertEqual(stats['productos']['total'], 2)
+        self.assertEqual(stats['productos']['disponibles'], 1)
+        self.assertEqual(stats['productos']['sin_stock'], 1)
+        self.assertEqual(stats['productos']['destacados'], 1)
+        self.assertEqual(stats['productos']['valor_inventario'], Decimal('1600'))
+        self.assertEqual(stats['categorias'], {'total': 2, 'activas': 1})
+
+    def test_invalidacion(self):
+        estadisticas.obtener()
+        Producto.objects.create(nombre='Juego', precio=Decimal('50'), categoria=Categoria.objects.first(), stock=1)
+        self.assertEqual(estadisticas.obtener()['productos']['total'], 3)
+
+    def test_vistas_comparten_estadisticas(self):
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get('/api/estadisticas/').json(),
+                         {'total_productos': 1, 'total_categorias': 1, 'productos_destacados': 1})
+        with self.assertNumQueries(0):
+            estadisticas.obtener()
+        self.assertContains(self.client.get('/admin/'), '$1.600 COL')
+        self.assertContains(self.client.get('/dashboard/'), 'Consolas')
+
+
+class OperacionesMasivasTests(TestCase):
+    """Cambios de oferta/stock/estado en un solo UPDATE, desde el admin y el API"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.consolas = Categoria.objects.create(nombre='Consolas')
+        cls.otros = Categoria.objects.create(nombre='Otros')
+        cls.productos = [
+            Producto.objects.create(nombre=f'Consola {i}', precio=Decimal('100000'), categoria=cls.consolas, stock=5)
+            for i in range(3)
+        ]
+        cls.ajeno = Producto.objects.create(nombre='Silla', precio=Decimal('50000'), categoria=cls.otros, stock=5)
+        cls.admin = User.objects.create_superuser('jefa', 'jefa@example.com', 'Clave-Segura-987')
+        cls.cliente = crear_usuario('cliente', 'cliente@example.com', 'Clave-Segura-987')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_un_update_por_lote(self):
+        antes = Producto.objects.get(pk=self.ajeno.pk).fecha_actualizacion
+        estadisticas.obtener()
+        with self.assertNumQueries(1), self.captureOnCommitCallbacks(execute=True):
+            actualizados = masivo.descuento_porcentaje(Producto.objects.filter(categoria=self.consolas), 15)
+        self.assertEqual(actualizados, 3)
+        self.assertEqual(set(Producto.objects.filter(categoria=self.consolas).values_list('precio_oferta', flat=True)),
+                         {Decimal('85000')})
+        self.assertEqual(Producto.objects.get(pk=self.ajeno.pk).fecha_actualizacion, antes)
+        self.assertGreater(Producto.objects.get(pk=self.productos[0].pk).fecha_actualizacion, antes)
+        # Estadísticas invalidadas una vez, al confirmar
+        self.assertIsNone(cache.get(estadisticas.CLAVE_CACHE))
+
+    def test_stock_no_baja_de_cero(self):
+        masivo.sumar_stock(Producto.objects.all(), -7)
+        self.assertEqual(set(Producto.objects.values_list('stock', flat=True)), {0})
+        with self.assertRaises(masivo.OperacionInvalida):
+            masivo.fijar_stock(Producto.objects.all(), '2.5')
+
+    def test_accion_admin(self):
+        self.client.force_login(self.admin)
+        respuesta = self.client.post('/admin/productos/producto/', {
+            'action': 'accion_descuento_fijo',
+            '_selected_action': [p.pk for p in self.productos[:2]],
+            'valor': '30000',
+        }, follow=True)
+        self.assertContains(respuesta, '2 productos actualizados')
+        self.assertEqual(Producto.objects.filter(precio_oferta=Decimal('70000')).count(), 2)
+
+        self.client.post('/admin/productos/producto/', {
+            'action': 'accion_cambiar_estado',
+            '_selected_action': [self.ajeno.pk],
+            'estado': 'descontinuado',
+        })
+        self.assertEqual(Producto.objects.get(pk=self.ajeno.pk).estado, 'descontinuado')
+
+    def test_api(self):
+        self.client.force_login(self.cliente)
+        cuerpo = {'operacion': 'destacar', 'valor': True, 'categoria': self.consolas.pk}
+        self.assertEqual(self.client.post('/api/productos/masivo/', cuerpo, content_type='application/json').status_code, 403)
+
+        # Solo staff: el perfil 'admin' sin is_staff tampoco puede
+        PerfilUsuario.objects.filter(usuario=self.cliente).update(tipo_usuario='admin')
+        self.assertEqual(self.client.post('/api/productos/masivo/', cuerpo, content_type='application/json').status_code, 403)
+
+        self.client.force_login(self.admin)
+        respuesta = self.client.post('/api/productos/masivo/', cuerpo, content_type='application/json')
+        self.assertEqual(respuesta.json(), {'actualizados': 3})
+        self.assertEqual(Producto.objects.filter(destacado=True).count(), 3)
+
+        sin_filtro = {'operacion': 'fijar_stock', 'valor': 0}
+        self.assertEqual(self.client.post('/api/productos/masivo/', sin_filtro, content_type='application/json').status_code, 400)
+        invalido = {'operacion': 'descuento_porcentaje', 'valor': 120, 'todos': True}
+        self.assertEqual(self.client.post('/api/productos/masivo/', invalido, content_type='application/json').status_code, 400)
+
+
+class SQLitePragmasTests(TestCase):
+    def test_pragmas_al_conectar(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Solo SQLite')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['cache_size'])
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+
+@override_settings(DATABASE_REPLICAS=['default'])
+class ReplicasTests(TestCase):
+    """Decisión de ruteo por petición (la réplica 'default' es el propio primario)"""
+
+    def setUp(self):
+        replicas._caidas.clear()
+        self.factory = RequestFactory()
+        self.router = replicas.ReplicaRouter()
+
+    def _peticion(self, request, escribir=False):
+        decisiones = []
+
+        def vista(request):
+            if escribir:
+                self.router.db_for_write(ItemCarrito)
+            decisiones.append(replicas.alias_lectura())
+            return HttpResponse()
+
+        respuesta = replicas.ReplicaMiddleware(vista)(request)
+        return decisiones[0], respuesta
+
+    def test_get_lee_de_la_replica(self):
+        self.assertEqual(self._peticion(self.factory.get('/'))[0], 'default')
+        self.assertIsNone(self._peticion(self.factory.post('/'))[0])
+        # Fuera de una petición (comandos, señales) todo va al primario
+        self.assertIsNone(replicas.alias_lectura())
+        self.assertIsNone(self.router.db_for_read(Producto))
+
+    def test_pegado_al_primario_tras_escribir(self):
+        replica, respuesta = self._peticion(self.factory.get('/'), escribir=True)
+        self.assertIsNone(replica)
+        self.assertIn(replicas.COOKIE, respuesta.cookies)
+
+        request = self.factory.get('/')
+        request.COOKIES[replicas.COOKIE] = '1'
+        self.assertIsNone(self._peticion(request)[0])
+
+    def test_replica_caida(self):
+        replicas.marcar_caida('default')
+        self.assertIsNone(self._peticion(self.factory.get('/'))[0])
+
+    def test_consulta_fallida_pasa_al_primario(self):
+        Producto.objects.create(nombre='Teclado', precio=Decimal('1000'),
+                                categoria=Categoria.objects.create(nombre='Periféricos'))
+        fallos = []
+
+        def caer_una_vez(execute, sql, params, many, context):
+            if sql not in fallos:
+                fallos.append(sql)
+                raise OperationalError('réplica caída')
+            return execute(sql, params, many, context)
+
+        def vista(request):
+            self.assertEqual(replicas.alias_lectura(), 'default')
+            # La conexión de prueba hace de réplica y de primario
+            with connection.execute_wrapper(replicas._pasar_al_primario), connection.execute_wrapper(caer_una_vez):
+                nombres = list(Producto.objects.values_list('nombre', flat=True))
+                total = Producto.objects.count()
+            self.assertIsNone(replicas.alias_lectura())
+            return HttpResponse(f"{','.join(nombres)}:{total}")
+
+        respuesta = replicas.ReplicaMiddleware(vista)(self.factory.get('/'))
+        self.assertEqual(respuesta.content, b'Teclado:1')
+        self.assertEqual(len(fallos), 2)
+        self.assertIn('default', replicas._caidas)
+
+
+class InstrumentacionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.categoria = Categoria.objects.create(nombre='Consolas')
+        Producto.objects.create(nombre='Consola', precio=Decimal('1000'), categoria=cls.categoria,
+                                stock=2, destacado=True)
+
+    def test_linea_por_peticion(self):
+        with self.assertLogs('productos.peticiones', 'INFO') as registros:
+            respuesta = self.client.get('/', HTTP_X_REQUEST_ID='prueba-123')
+        self.assertEqual(respuesta['X-Request-ID'], 'prueba-123')
+
+        registro = registros.records[0]
+        self.assertEqual(registro.request_id, 'prueba-123')
+        self.assertEqual(registro.vista, 'home')
+        self.assertEqual(registro.estado, 200)
+        self.assertGreater(registro.db_consultas, 0)
+        self.assertGreater(registro.plantillas_ms, 0)
+
+        # Y como JSON de una línea
+        datos = json.loads(instrumentacion.FormatoJSON().format(registro))
+        self.assertEqual(datos['request_id'], 'prueba-123')
+        self.assertEqual(datos['db_consultas'], registro.db_consultas)
+
+    def test_request_id_invalido_y_muestreo(self):
+        with self.settings(LOG_PETICIONES_MUESTREO=0), self.assertNoLogs('productos.peticiones', 'INFO'):
+            respuesta = self.client.get('/', HTTP_X_REQUEST_ID='no válido\n')
+        self.assertRegex(respuesta['X-Request-ID'], r'^[0-9a-f]{32}$')
+
+
+class MetricasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('operador', password='x', is_staff=True)
+        cls.cliente = crear_usuario('cliente', 'cliente@example.com', 'x')
+
+    def setUp(self):
+        metricas.REGISTRO.limpiar()
+        cache.clear()
+
+    def test_acceso_protegido(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.client.force_login(self.cliente)
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+
+        with self.settings(METRICAS_TOKEN='secreto'):
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer otro').status_code, 401)
+            respuesta = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    @override_settings(EMAIL_BACKEND='productos.correo.EmailBackendMedido',
+                       EMAIL_BACKEND_REAL='django.core.mail.backends.locmem.EmailBackend')
+    def test_peticiones_cache_y_correo(self):
+        self.client.force_login(self.cliente)
+        self.client.get('/api/estadisticas/')
+        self.client.get('/api/estadisticas/')
+        self.client.get('/ruta-que-no-existe/')
+        send_mail('Hola', 'Cuerpo', 'tienda@example.com', ['cliente@example.com'])
+
+        self.client.force_login(self.staff)
+        texto = self.client.get('/metrics').content.decode()
+        self.assertIn('gamerly_peticion_segundos_count{vista="estadisticas_publicas",metodo="GET",estado="200"} 2',
+                      texto)
+        self.assertIn('gamerly_peticion_segundos_count{vista="<sin_ruta>",metodo="GET",estado="404"} 1', texto)
+        self.assertIn('gamerly_peticion_db_consultas_bucket{vista="estadisticas_publicas",le="+Inf"} 2', texto)
+        self.assertIn('gamerly_cache_consultas_total{cache="estadisticas",resultado="acierto"} 1', texto)
+        self.assertIn('gamerly_cache_consultas_total{cache="estadisticas",resultado="fallo"} 1', texto)
+        self.assertIn('gamerly_operacion_segundos_count{operacion="estadisticas"} 1', texto)
+        self.assertIn('gamerly_correo_segundos_count{resultado="ok"} 1', texto)
+
+    def test_agregacion_entre_procesos(self):
+        with tempfile.TemporaryDirectory() as directorio, self.settings(METRICAS_DIR=directorio):
+            # Volcado de otro worker con el mismo formato que escribe volcar()
+            otro = metricas.Registro()
+            contador = otro.contador('gamerly_correo_fallos_total', '')
+            contador.inc(3)
+            with open(f'{directorio}/99999-1.json', 'w') as archivo:
+                json.dump(otro.exportar(), archivo)
+
+            metricas.correo_fallos.inc(2)
+            metricas.REGISTRO.volcar(forzar=True)
+            self.assertEqual(len(os.listdir(directorio)), 2)
+            texto = metricas.REGISTRO.texto()
+        self.assertIn('gamerly_correo_fallos_total 5', texto)
+
+    def test_volcado_fuera_del_hilo_de_la_peticion(self):
+        with tempfile.TemporaryDirectory() as directorio, self.settings(METRICAS_DIR=directorio):
+            registro = metricas.Registro()
+            registro.contador('gamerly_correo_fallos_total', '').inc(4)
+            escribir, hilos = registro._escribir, []
+
+            def escribir_anotando(*args):
+                hilos.append(threading.current_thread())
+                escribir(*args)
+
+            with mock.patch.object(registro, '_escribir', escribir_anotando):
+                registro.volcar()
+                registro._hilo_volcado.join()
+            self.assertEqual(hilos, [registro._hilo_volcado])
+            self.assertIsNot(hilos[0], threading.current_thread())
+            with open(os.path.join(directorio, registro._nombre_volcado())) as archivo:
+                self.assertEqual(json.load(archivo), {'gamerly_correo_fallos_total': [[[], 4]]})
+            # Dentro del intervalo no se vuelve a escribir
+            hilo = registro._hilo_volcado
+            registro.volcar()
+            self.assertIs(registro._hilo_volcado, hilo)
+
+    def test_volcados_de_workers_terminados_se_compactan(self):
+        terminado = subprocess.Popen([sys.executable, '-c', 'pass'])
+        terminado.wait()
+
+        with tempfile.TemporaryDirectory() as directorio, self.settings(METRICAS_DIR=directorio):
+            otro = metricas.Registro()
+            otro.contador('gamerly_correo_fallos_total', '').inc(3)
+            pid = os.getpid()
+            # Un worker terminado y uno anterior que tuvo nuestro mismo pid
+            for nombre in (f'{terminado.pid}-1.json', f'{terminado.pid}-2.json', f'{pid}-1.json'):
+                with open(os.path.join(directorio, nombre), 'w') as archivo:
+                    json.dump(otro.exportar(), archivo)
+
+            metricas.correo_fallos.inc(1)
+            metricas.REGISTRO.volcar(forzar=True)
+            self.assertIn('gamerly_correo_fallos_total 10', metricas.REGISTRO.texto())
+            archivos = {nombre for nombre in os.listdir(directorio) if nombre.endswith('.json')}
+            self.assertEqual(archivos, {metricas.AGREGADO, metricas.REGISTRO._nombre_volcado()})
+            # La suma no cambia al volver a leer
+            self.assertIn('gamerly_correo_fallos_total 10', metricas.REGISTRO.texto())
+
+
+class PerfiladoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('operador', password='x', is_staff=True)
+        cls.cliente = crear_usuario('cliente', 'cliente@example.com', 'x')
+        categoria = Categoria.objects.create(nombre='Consolas')
+        Producto.objects.create(nombre='Consola', precio=Decimal('1000'), categoria=categoria,
+                                stock=2, destacado=True)
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.directorio = directorio.name
+        ajustes = self.settings(PERFILADO_DIR=self.directorio)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def test_solo_staff(self):
+        respuesta = self.client.get('/?perfilar=1')
+        self.assertNotIn(perfilado.CABECERA_RESPUESTA, respuesta)
+        self.client.force_login(self.cliente)
+        respuesta = self.client.get('/?perfilar=1')
+        self.assertNotIn(perfilado.CABECERA_RESPUESTA, respuesta)
+        self.assertEqual(os.listdir(self.directorio), [])
+
+        self.assertEqual(self.client.get('/admin/perfiles/').status_code, 302)
+
+    def test_perfil_con_sql_y_admin(self):
+        self.client.force_login(self.staff)
+        respuesta = self.client.get('/', HTTP_X_GAMERLY_PERFILAR='1')
+        perfil_id = respuesta[perfilado.CABECERA_RESPUESTA]
+
+        datos = perfilado.leer(perfil_id)
+        self.assertEqual(datos['vista'], 'home')
+        self.assertTrue(datos['consultas'])
+        origenes = [linea for consulta in datos['consultas'] for linea in consulta['origen']]
+        self.assertTrue(any(linea.startswith('productos/views.py:') for linea in origenes))
+        self.assertIn('cumulative', perfilado.resumen(perfil_id))
+
+        self.assertContains(self.client.get('/admin/perfiles/'), perfil_id)
+        self.assertContains(self.client.get(f'/admin/perfiles/{perfil_id}/?orden=tottime'), 'productos/views.py:')
+        self.assertEqual(self.client.get(f'/admin/perfiles/{perfil_id}/descargar/').status_code, 200)
+        self.assertEqual(self.client.get('/admin/perfiles/..%2F..%2Fetc/').status_code, 404)
+
+    def test_buffer_circular(self):
+        self.client.force_login(self.staff)
+        with self.settings(PERFILADO_MAXIMO=2):
+            ids = [self.client.get('/?perfilar=1')[perfilado.CABECERA_RESPUESTA] for _ in range(3)]
+        self.assertEqual([perfil['id'] for perfil in perfilado.listar()], ids[:0:-1])
+        self.assertEqual(len(os.listdir(self.directorio)), 4)
+
+    def test_error_al_guardar_no_tumba_la_peticion(self):
+        self.client.force_login(self.staff)
+        ocupado = os.path.join(self.directorio, 'archivo')
+        open(ocupado, 'w').close()
+        with self.settings(PERFILADO_DIR=ocupado), self.assertLogs('productos.peticiones', 'ERROR') as registros:
+            respuesta = self.client.get('/?perfilar=1')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotIn(perfilado.CABECERA_RESPUESTA, respuesta)
+        self.assertIn('No se pudo guardar el perfil', registros.output[0])
+
+    def test_maximo_invalido(self):
+        with self.settings(PERFILADO_MAXIMO=0):
+            with self.assertRaises(ImproperlyConfigured):
+                perfilado.PerfiladoMiddleware(lambda request: HttpResponse())
+
+    def test_id_en_utc(self):
+        ahora = datetime(2026, 1, 2, 3, 4, 5, 6, tzinfo=dt_timezone.utc)
+        with mock.patch('productos.perfilado.timezone.now', return_value=ahora):
+            self.assertTrue(perfilado._nuevo_id().startswith('20260102030405000006-'))
+
+
+@override_settings(CONSULTAS_LENTAS_MS=0)
+class ConsultasLentasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('operador', password='x', is_staff=True)
+        categoria = Categoria.objects.create(nombre='Consolas')
+        Producto.objects.create(nombre='Consola', precio=Decimal('1000'), categoria=categoria,
+                                stock=2, destacado=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_normalizar(self):
+        self.assertEqual(
+            consultas_lentas.normalizar("SELECT *  FROM t\nWHERE id IN (%s, %s, %s) AND nombre = 'it''s' LIMIT 6"),
+            'SELECT * FROM t WHERE id IN (...) AND nombre = ? LIMIT ?',
+        )
+        self.assertEqual(consultas_lentas.huella('SELECT 1 WHERE x IN (%s)'),
+                         consultas_lentas.huella('SELECT 2 WHERE x IN (%s, %s)'))
+
+    def test_agrupa_por_huella_con_vista_y_origen(self):
+        self.client.get('/')
+        self.client.get('/')
+        entrada = next(entrada for entrada in consultas_lentas.reporte(orden='veces')
+                       if entrada['vista'] == 'home' and 'productos_producto' in entrada['sql'])
+        self.assertGreaterEqual(entrada['veces'], 2)
+        self.assertTrue(any(linea.startswith('productos/views.py:') for linea in entrada['origen']))
+
+    @override_settings(ROOT_URLCONF=__name__)
+    async def test_vista_async(self):
+        # Sin process_view: el nombre sale del resolver_match de la petición en curso
+        cliente = AsyncClient()
+        await cliente.aforce_login(self.staff)
+        await cliente.get('/ajax/carrito/items/')
+        vistas = {entrada['vista'] for entrada in await sync_to_async(consultas_lentas.reporte)(orden='veces')
+                  if 'productos_itemcarrito' in entrada['sql']}
+        self.assertEqual(vistas, {'carrito_items_ajax'})
+
+    def test_comando_y_admin(self):
+        self.client.get('/')
+        huella = consultas_lentas.reporte(1)[0]['huella']
+
+        salida = io.StringIO()
+        call_command('consultas_lentas', '--top', '5', stdout=salida)
+        self.assertIn(huella, salida.getvalue())
+
+        self.client.force_login(self.staff)
+        self.assertContains(self.client.get('/admin/consultas-lentas/?orden=max_ms'), 'home')
+        self.client.post('/admin/consultas-lentas/')
+        with self.settings(CONSULTAS_LENTAS_MS=None):
+            self.assertEqual(consultas_lentas.reporte(), [])
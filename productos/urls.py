@@ -1,55 +1,74 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import views, views_async
 
 # Router para API REST
 router = DefaultRouter()
 router.register(r'productos', views.ProductoViewSet)
 router.register(r'categorias', views.CategoriaViewSet)
 
-urlpatterns = [
-    # Páginas web
-    path('', views.home, name='home'),
-    path('login/', views.login_view, name='login'),
-    path('registro/', views.registro_view, name='registro'),
-    path('dashboard/', views.dashboard, name='dashboard'),
-    path('perfil/', views.perfil_view, name='perfil'),
-    path('logout/', views.logout_view, name='logout'),
-
-    # Detalle de producto
-    path('producto/<int:producto_id>/', views.detalle_producto, name='detalle_producto'),
-
-    # Recuperar contraseña (método anterior)
-    path('recuperar-password/', views.recuperar_password_view, name='recuperar_password'),
-
-    # Recuperación de contraseña por email (NUEVO)
-    path('recuperar-password-email/', views.solicitar_recuperacion_password, name='solicitar_recuperacion_password'),
-    path('confirmar-password/<str:token>/', views.confirmar_recuperacion_password, name='confirmar_recuperacion_password'),
-
-    # AJAX para admin
-    path('ajax/crear-producto/', views.crear_producto, name='crear_producto'),
-    path('ajax/eliminar-producto/<int:producto_id>/', views.eliminar_producto, name='eliminar_producto'),
-
-    # AJAX para perfil de usuario
-    path('ajax/actualizar-perfil/', views.actualizar_perfil, name='actualizar_perfil'),
-    path('ajax/cambiar-password/', views.cambiar_password, name='cambiar_password'),
-
-    # Carrito
-    path('carrito/', views.ver_carrito, name='ver_carrito'),
-    path('ajax/carrito/agregar/', views.agregar_al_carrito, name='agregar_al_carrito'),
-    path('ajax/carrito/actualizar/<int:item_id>/', views.actualizar_item_carrito, name='actualizar_item_carrito'),
-    path('ajax/carrito/eliminar/<int:item_id>/', views.eliminar_item_carrito, name='eliminar_item_carrito'),
-    path('ajax/carrito/limpiar/', views.limpiar_carrito, name='limpiar_carrito'),
-    path('ajax/carrito/items/', views.carrito_items_ajax, name='carrito_items_ajax'),
-
-    # API REST
-    path('api/', include(router.urls)),
-    path('api/mi-perfil/', views.mi_perfil, name='mi_perfil'),
-    path('api/carrito-info/', views.carrito_info, name='carrito_info'),
-    path('api/estadisticas/', views.estadisticas_publicas, name='estadisticas_publicas'),
-    path('api-auth/', include('rest_framework.urls')),
-
-    # Login con 2FA
-    path('verificar-token/', views.verificar_token_login, name='verificar_token_login'),
-    path('reenviar-token/', views.reenviar_token_login, name='reenviar_token_login'),
-]
\ No newline at end of file
+
+def rutas(vistas_io):
+    """Rutas de la app con las vistas ligadas a I/O (SMTP, carrito) de ``vistas_io``"""
+    patrones = [
+        # Páginas web
+        path('', views.home, name='home'),
+        path('login/', vistas_io.login_view, name='login'),
+        path('registro/', views.registro_view, name='registro'),
+        path('dashboard/', views.dashboard, name='dashboard'),
+        path('perfil/', views.perfil_view, name='perfil'),
+        path('logout/', views.logout_view, name='logout'),
+
+        # Detalle de producto
+        path('producto/<int:producto_id>/', views.detalle_producto, name='detalle_producto'),
+
+        # Recuperar contraseña (método anterior)
+        path('recuperar-password/', views.recuperar_password_view, name='recuperar_password'),
+
+        # Recuperación de contraseña por email (NUEVO)
+        path('recuperar-password-email/', vistas_io.solicitar_recuperacion_password, name='solicitar_recuperacion_password'),
+        path('confirmar-password/<str:token>/', views.confirmar_recuperacion_password, name='confirmar_recuperacion_password'),
+
+        # AJAX para admin
+        path('ajax/crear-producto/', views.crear_producto, name='crear_producto'),
+        path('ajax/eliminar-producto/<int:producto_id>/', views.eliminar_producto, name='eliminar_producto'),
+
+        # AJAX para perfil de usuario
+        path('ajax/actualizar-perfil/', views.actualizar_perfil, name='actualizar_perfil'),
+        path('ajax/cambiar-password/', views.cambiar_password, name='cambiar_password'),
+
+        # Carrito
+        path('carrito/', views.ver_carrito, name='ver_carrito'),
+        path('ajax/carrito/agregar/', vistas_io.agregar_al_carrito, name='agregar_al_carrito'),
+        path('ajax/carrito/actualizar/<int:item_id>/', vistas_io.actualizar_item_carrito, name='actualizar_item_carrito'),
+        path('ajax/carrito/eliminar/<int:item_id>/', vistas_io.eliminar_item_carrito, name='eliminar_item_carrito'),
+        path('ajax/carrito/limpiar/', vistas_io.limpiar_carrito, name='limpiar_carrito'),
+        path('ajax/carrito/items/', vistas_io.carrito_items_ajax, name='carrito_items_ajax'),
+
+        # API REST
+        path('api/', include(router.urls)),
+        path('api/token/', views.ObtenerTokenView.as_view(), name='api_token'),
+        path('api/mi-perfil/', views.mi_perfil, name='mi_perfil'),
+        path('api/carrito-info/', views.carrito_info, name='carrito_info'),
+        path('api/estadisticas/', views.estadisticas_publicas, name='estadisticas_publicas'),
+        path('api-auth/', include('rest_framework.urls')),
+
+        # Métricas (Prometheus)
+        path('metrics', views.metricas_view, name='metricas'),
+
+        # Login con 2FA
+        path('verificar-token/', vistas_io.verificar_token_login, name='verificar_token_login'),
+        path('reenviar-token/', vistas_io.reenviar_token_login, name='reenviar_token_login'),
+    ]
+
+    if vistas_io is views_async:
+        # Stream SSE del carrito: retiene una conexión por pestaña, así que
+        # solo se publica con las vistas async (ASGI); bajo WSGI base.html no
+        # lo pide (carrito_eventos_url retorna '')
+        patrones.append(path('eventos/carrito/', views_async.carrito_eventos, name='carrito_eventos'))
+    return patrones
+
+
+# Vistas ligadas a I/O: async bajo ASGI si GAMERLY_VISTAS_ASYNC está activo
+urlpatterns = rutas(views_async if settings.GAMERLY_VISTAS_ASYNC else views)
@@ -0,0 +1,13 @@
+from django.contrib import admin
+from django.urls import path
+
+from . import views_admin
+
+# Van antes que admin.site.urls en tienda/urls.py: su catch-all respondería 404
+urlpatterns = [
+    path('perfiles/', admin.site.admin_view(views_admin.perfiles), name='admin_perfiles'),
+    path('perfiles/<str:perfil_id>/', admin.site.admin_view(views_admin.perfil), name='admin_perfil'),
+    path('perfiles/<str:perfil_id>/descargar/', admin.site.admin_view(views_admin.descargar_perfil),
+         name='admin_perfil_descargar'),
+    path('consultas-lentas/', admin.site.admin_view(views_admin.consultas_lentas_view), name='admin_consultas_lentas'),
+]
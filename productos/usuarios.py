@@ -0,0 +1,39 @@
+"""
+Alta de usuarios: cada User nace con su PerfilUsuario y su Carrito.
+
+Las vistas pueden entonces leer ``user.perfilusuario`` y ``user.carrito``
+directamente, sin ``get_or_create`` defensivos en cada petición.
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .models import PerfilUsuario, Carrito
+
+
+@transaction.atomic
+def crear_usuario(username, email=None, password=None, **campos):
+    """Crea User, PerfilUsuario y Carrito en una sola transacción"""
+    # El post_save de User (models.provisionar_usuario) crea perfil y carrito
+    # dentro de esta misma transacción
+    return User.objects.create_user(username, email, password, **campos)
+
+
+@transaction.atomic
+def crear_usuarios_en_bloque(usuarios, batch_size=5000):
+    """
+    Inserta instancias de User (con el password ya hasheado) junto con sus
+    perfiles y carritos. bulk_create no dispara post_save, por eso el
+    aprovisionamiento se hace aquí. Retorna los ids creados.
+    """
+    usuarios = User.objects.bulk_create(usuarios, batch_size=batch_size)
+
+    usuario_ids = [u.pk for u in usuarios]
+    if None in usuario_ids:
+        # MySQL no devuelve las claves primarias desde bulk_create
+        usuario_ids = list(User.objects.filter(
+            username__in=[u.username for u in usuarios]
+        ).values_list('id', flat=True))
+
+    PerfilUsuario.objects.bulk_create([PerfilUsuario(usuario_id=uid) for uid in usuario_ids], batch_size=batch_size)
+    Carrito.objects.bulk_create([Carrito(usuario_id=uid) for uid in usuario_ids], batch_size=batch_size)
+    return usuario_ids
@@ -0,0 +1,95 @@
+"""
+Política de contraseñas de GAMERLY, registrada en AUTH_PASSWORD_VALIDATORS.
+
+Registro, cambio de contraseña, recuperación por email y el serializer de
+registro validan con ``validate_password`` y por lo tanto aplican las mismas
+reglas.
+"""
+import gzip
+from functools import lru_cache
+from pathlib import Path
+
+import django.contrib.auth
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+
+# Lista de Django (20.000 contraseñas comunes) más las que veníamos bloqueando a mano
+LISTA_DJANGO = Path(django.contrib.auth.__file__).resolve().parent / 'common-passwords.txt.gz'
+PASSWORDS_COMUNES_EXTRA = frozenset([
+    '12345678', 'password', 'contraseña', '11111111', 'qwerty123', 'abc12345', 'gamerly123',
+])
+
+
+@lru_cache(maxsize=None)
+def cargar_passwords_comunes(*rutas):
+    """Lee las listas una sola vez por proceso y las deja en un frozenset en minúsculas"""
+    passwords = set(PASSWORDS_COMUNES_EXTRA)
+    for ruta in rutas:
+        abrir = gzip.open if str(ruta).endswith('.gz') else open
+        with abrir(ruta, 'rt', encoding='utf-8', errors='ignore') as f:
+            passwords.update(linea.strip().lower() for linea in f)
+    passwords.discard('')
+    return frozenset(passwords)
+
+
+class ComposicionPasswordValidator:
+    """Longitud mínima y mezcla obligatoria de letras y números"""
+
+    def __init__(self, min_length=8):
+        self.min_length = min_length
+
+    def validate(self, password, user=None):
+        errores = []
+        if len(password) < self.min_length:
+            errores.append(ValidationError(
+                f'La contraseña debe tener al menos {self.min_length} caracteres', code='password_too_short'))
+        if password.isdigit():
+            errores.append(ValidationError('La contraseña no puede ser solo números', code='password_entirely_numeric'))
+        elif password.isalpha():
+            errores.append(ValidationError('La contraseña no puede ser solo letras', code='password_entirely_alpha'))
+        elif not any(c.isalpha() for c in password) or not any(c.isdigit() for c in password):
+            errores.append(ValidationError('La contraseña debe contener letras y números', code='password_sin_mezcla'))
+        if errores:
+            raise ValidationError(errores)
+
+    def get_help_text(self):
+        return f'Al menos {self.min_length} caracteres, con letras y números.'
+
+
+class PasswordComunValidator:
+    """
+    Rechaza contraseñas comunes o filtradas. ``rutas`` admite listas extra
+    (texto plano o .gz, una contraseña por línea); el chequeo es O(1).
+    """
+
+    def __init__(self, rutas=()):
+        self.passwords = cargar_passwords_comunes(LISTA_DJANGO, *rutas)
+
+    def validate(self, password, user=None):
+        if password.lower().strip() in self.passwords:
+            raise ValidationError('La contraseña es demasiado común. Usa una más segura', code='password_too_common')
+
+    def get_help_text(self):
+        return 'No puede ser una contraseña común.'
+
+
+class UsuarioEnPasswordValidator:
+    """La contraseña no puede contener el nombre de usuario"""
+
+    def validate(self, password, user=None):
+        username = getattr(user, 'username', '') or ''
+        if username and username.lower() in password.lower():
+            raise ValidationError('La contraseña no puede contener tu nombre de usuario',
+                                  code='password_contiene_usuario')
+
+    def get_help_text(self):
+        return 'No puede contener tu nombre de usuario.'
+
+
+def errores_password(password, user=None):
+    """Retorna la lista de mensajes de la política (vacía si la contraseña es válida)"""
+    try:
+        validate_password(password, user)
+    except ValidationError as e:
+        return e.messages
+    return []
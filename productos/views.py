@@ -3,26 +3,35 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.core.paginator import Paginator
 from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from django.contrib.sites.shortcuts import get_current_site
 from django.conf import settings
-from rest_framework import viewsets, permissions, status
+from django.utils.crypto import constant_time_compare
+from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.throttling import ScopedRateThrottle
 import json
-
-from .models import TokenLogin
-from .models import Producto, Categoria, PerfilUsuario, Carrito, ItemCarrito, TokenRecuperacion
+import logging
+
+from .models import Producto, Categoria, TokenRecuperacion
+from . import acceso, carrito_ajax, estadisticas, masivo, metricas, replicas, roles, sincronizacion
+from .authentication import emitir_token
+from .permissions import EsAdministradorOLectura, es_admin_catalogo
+from .ratelimit import limitar_peticiones
+from .usuarios import crear_usuario
+from .validators import errores_password
 from .serializers import (
     ProductoSerializer, ProductoListSerializer,
-    CategoriaSerializer, PerfilUsuarioSerializer
+    CategoriaSerializer, PerfilUsuarioSerializer, OperacionMasivaSerializer
 )
 
+logger = logging.getLogger(__name__)
+
 
 # ====================== VISTAS WEB ======================
 
@@ -44,6 +53,8 @@ def home(request):
 
 # ====================== LOGIN CON 2FA ======================
 
+@limitar_peticiones(limite=acceso.LOGIN_LIMITE, ventana=acceso.LOGIN_VENTANA, campo_usuario='username',
+                    plantilla='login.html', alcance=acceso.LOGIN_ALCANCE)
 def login_view(request):
     """Vista de login con 2FA por email"""
     if request.user.is_authenticated:
@@ -51,53 +62,27 @@ def login_view(request):
 
     if request.method == 'POST':
         username = request.POST.get('username')
-        password = request.POST.get('password')
+        user = authenticate(request, username=username, password=request.POST.get('password'))
 
-        user = authenticate(request, username=username, password=password)
-        if user is not None:
+        if user is None:
+            messages.error(request, acceso.MENSAJE_CREDENCIALES)
+        elif not user.email:
+            messages.error(request, acceso.MENSAJE_SIN_EMAIL)
+        else:
             # ✅ Usuario y contraseña correctos - Enviar token por email
-
-            if not user.email:
-                messages.error(request, 'Tu cuenta no tiene email configurado. Contacta al administrador.')
-                return render(request, 'login.html')
-
             try:
-                # Crear token
-                from .models import TokenLogin
-                ip_address = request.META.get('REMOTE_ADDR')
-                token_obj = TokenLogin.crear_token(user, ip_address)
-
-                # Enviar email con token
-                subject = 'Código de verificación - GAMERLY'
-                context = {
-                    'user': user,
-                    'token': token_obj.token,
-                    'ip_address': ip_address,
-                }
-                email_body = render_to_string('auth/email_token_login.html', context)
-
-                send_mail(
-                    subject=subject,
-                    message=f'Tu código de verificación es: {token_obj.token}',
-                    from_email=settings.EMAIL_HOST_USER,
-                    recipient_list=[user.email],
-                    html_message=email_body,
-                    fail_silently=False,
-                )
-
+                send_mail(**acceso.correo_codigo_login(user, request.META.get('REMOTE_ADDR')))
+            except Exception:
+                logger.exception('No se pudo enviar el código de login')
+                messages.error(request, acceso.MENSAJE_ERROR_CODIGO)
+            else:
                 # Guardar username en sesión para verificación
                 request.session['pending_username'] = username
                 request.session['pending_user_id'] = user.id
 
-                messages.success(request, f'✅ Se ha enviado un código de verificación a {user.email}')
+                messages.success(request, acceso.mensaje_codigo_enviado(user))
                 return redirect('verificar_token_login')
 
-            except Exception as e:
-                messages.error(request, 'Error al enviar el código. Intenta nuevamente.')
-                return render(request, 'login.html')
-        else:
-            messages.error(request, 'Usuario o contraseña incorrectos')
-
     return render(request, 'login.html')
 
 
@@ -105,122 +90,72 @@ def verificar_token_login(request):
     """Vista para verificar el token de login"""
     # Verificar que haya un login pendiente
     if 'pending_user_id' not in request.session:
-        messages.error(request, 'No hay un login pendiente.')
+        messages.error(request, acceso.MENSAJE_SIN_LOGIN_PENDIENTE)
         return redirect('login')
 
-    user_id = request.session.get('pending_user_id')
-
-    try:
-        user = User.objects.get(id=user_id)
-    except User.DoesNotExist:
-        messages.error(request, 'Usuario no encontrado.')
+    user = acceso.usuario_pendiente(request.session['pending_user_id'])
+    if user is None:
+        messages.error(request, acceso.MENSAJE_USUARIO_NO_ENCONTRADO)
         return redirect('login')
 
     if request.method == 'POST':
-        token_ingresado = request.POST.get('token', '').strip()
-
-        if not token_ingresado:
-            messages.error(request, 'Por favor ingresa el código')
-            return render(request, 'auth/verificar_token_login.html', {'user': user})
-
         try:
-            from .models import TokenLogin
-            token_obj = TokenLogin.objects.filter(
-                usuario=user,
-                token=token_ingresado,
-                usado=False
-            ).first()
-
-            if token_obj and token_obj.es_valido():
-                # ✅ Token correcto - Iniciar sesión
-                token_obj.usado = True
-                token_obj.save()
-
-                # Limpiar sesión
-                del request.session['pending_username']
-                del request.session['pending_user_id']
+            error = acceso.verificar_codigo_login(user, request.POST.get('token'))
+        except Exception:
+            logger.exception('Error al verificar el código de login')
+            error = acceso.MENSAJE_ERROR_VERIFICACION
 
-                # Login
-                login(request, user)
-                messages.success(request, f'¡Bienvenido, {user.first_name or user.username}!')
-                return redirect('dashboard')
-            else:
-                messages.error(request, '❌ Código inválido o expirado')
-                return render(request, 'auth/verificar_token_login.html', {'user': user})
+        if error is None:
+            # ✅ Token correcto - Limpiar sesión y entrar
+            del request.session['pending_username']
+            del request.session['pending_user_id']
 
-        except Exception as e:
-            messages.error(request, 'Error al verificar el código')
-            return render(request, 'auth/verificar_token_login.html', {'user': user})
+            login(request, user)
+            messages.success(request, acceso.mensaje_bienvenida(user))
+            return redirect('dashboard')
+        messages.error(request, error)
 
     return render(request, 'auth/verificar_token_login.html', {'user': user})
 
 
+@limitar_peticiones(limite=3, ventana=600, campo_usuario=lambda request: request.session.get('pending_user_id'),
+                    metodos=('GET', 'POST'), respuesta_json=True)
 def reenviar_token_login(request):
     """Reenviar código de verificación"""
-    if 'pending_user_id' not in request.session:
+    user = acceso.usuario_pendiente(request.session.get('pending_user_id'))
+    if user is None:
         return JsonResponse({'success': False, 'message': 'No hay un login pendiente'})
 
     try:
-        user = User.objects.get(id=request.session['pending_user_id'])
-
-        from .models import TokenLogin
-        ip_address = request.META.get('REMOTE_ADDR')
-        token_obj = TokenLogin.crear_token(user, ip_address)
-
-        # Enviar email
-        subject = 'Nuevo código de verificación - GAMERLY'
-        context = {
-            'user': user,
-            'token': token_obj.token,
-            'ip_address': ip_address,
-        }
-        email_body = render_to_string('auth/email_token_login.html', context)
-
-        send_mail(
-            subject=subject,
-            message=f'Tu nuevo código de verificación es: {token_obj.token}',
-            from_email=settings.EMAIL_HOST_USER,
-            recipient_list=[user.email],
-            html_message=email_body,
-            fail_silently=False,
-        )
-
-        return JsonResponse({'success': True, 'message': '✅ Código reenviado'})
-
-    except Exception as e:
+        send_mail(**acceso.correo_codigo_login(user, request.META.get('REMOTE_ADDR'), reenvio=True))
+    except Exception:
+        logger.exception('No se pudo reenviar el código de login')
         return JsonResponse({'success': False, 'message': 'Error al reenviar código'})
 
+    return JsonResponse({'success': True, 'message': '✅ Código reenviado'})
+
 
 # ====================== DASHBOARD ======================
 
 @login_required
 def dashboard(request):
     """Dashboard principal - diferente vista según el tipo de usuario"""
-    try:
-        perfil = request.user.perfilusuario
-    except PerfilUsuario.DoesNotExist:
-        perfil = PerfilUsuario.objects.create(usuario=request.user)
+    perfil = request.contexto_usuario.perfil
 
-    # Asegurar que el carrito exista
-    carrito, created = Carrito.objects.get_or_create(usuario=request.user)
-
-    es_admin = request.user.is_superuser or perfil.tipo_usuario == 'admin'
-
-    if es_admin:
+    if request.contexto_usuario.es_admin:
         # Vista de administrador
         productos = Producto.objects.select_related('categoria', 'creado_por').order_by('-fecha_creacion')
-        total_productos = productos.count()
-        productos_disponibles = productos.filter(estado='disponible').count()
-        productos_agotados = productos.filter(stock=0).count()
-        categorias = Categoria.objects.all()
+        stats = estadisticas.obtener()
 
         context = {
             'es_admin': True,
             'productos': productos[:10],
-            'total_productos': total_productos,
-            'productos_disponibles': productos_disponibles,
-            'productos_agotados': productos_agotados,
-            'categorias': categorias,
+            'total_productos': stats['productos']['total'],
+            'productos_disponibles': stats['productos']['disponibles'],
+            'productos_agotados': stats['productos']['sin_stock'],
+            'total_categorias': stats['categorias']['total'],
+            'categorias': stats['por_categoria'],
+            'estadisticas': stats,
             'perfil': perfil,
         }
         return render(request, 'dashboard_admin.html', context)
@@ -247,7 +182,6 @@ def dashboard(request):
             'categorias': categorias,
             'categoria_seleccionada': categoria_filtro,
             'perfil': perfil,
-            'carrito': carrito,
         }
         return render(request, 'dashboard_cliente.html', context)
 
@@ -262,14 +196,8 @@ def logout_view(request):
 # ====================== FUNCIONES DE AYUDA ======================
 
 def es_admin(user):
-    """Verifica si el usuario es administrador"""
-    if not user.is_authenticated:
-        return False
-    try:
-        perfil = user.perfilusuario
-        return user.is_superuser or perfil.tipo_usuario == 'admin'
-    except PerfilUsuario.DoesNotExist:
-        return user.is_superuser
+    """Verifica si el usuario es administrador (rol cacheado, ver roles.py)"""
+    return roles.es_admin(user)
 
 
 # ====================== VISTAS AJAX PARA ADMIN ======================
@@ -301,6 +229,7 @@ def crear_producto(request):
                 'producto_id': producto.id
             })
         except Exception as e:
+            logger.exception('Error al crear producto')
             return JsonResponse({
                 'success': False,
                 'message': f'Error: {str(e)}'
@@ -325,6 +254,7 @@ def eliminar_producto(request, producto_id):
                 'message': f'Producto "{nombre}" eliminado exitosamente'
             })
         except Exception as e:
+            logger.exception('Error al eliminar producto %s', producto_id)
             return JsonResponse({
                 'success': False,
                 'message': f'Error: {str(e)}'
@@ -340,55 +270,8 @@ def eliminar_producto(request, producto_id):
 def agregar_al_carrito(request):
     """Agregar producto al carrito vía AJAX"""
     if request.method == 'POST':
-        try:
-            data = json.loads(request.body)
-            producto_id = data.get('producto_id')
-            cantidad = int(data.get('cantidad', 1))
-
-            producto = get_object_or_404(Producto, id=producto_id, estado='disponible')
-
-            # Verificar stock
-            if cantidad > producto.stock:
-                return JsonResponse({
-                    'success': False,
-                    'message': f'Solo hay {producto.stock} unidades disponibles'
-                })
-
-            # Obtener o crear carrito
-            carrito, created = Carrito.objects.get_or_create(usuario=request.user)
-
-            # Obtener o crear item del carrito
-            item, item_created = ItemCarrito.objects.get_or_create(
-                carrito=carrito,
-                producto=producto,
-                defaults={'cantidad': cantidad}
-            )
-
-            if not item_created:
-                # Si el item ya existe, aumentar la cantidad
-                nueva_cantidad = item.cantidad + cantidad
-                if nueva_cantidad > producto.stock:
-                    return JsonResponse({
-                        'success': False,
-                        'message': f'Solo puedes agregar {producto.stock - item.cantidad} unidades más'
-                    })
-                item.cantidad = nueva_cantidad
-                item.save()
-
-            return JsonResponse({
-                'success': True,
-                'message': f'{producto.nombre} agregado al carrito',
-                'carrito_items': carrito.total_items(),
-                'carrito_total': int(carrito.total_precio())
-            })
-
-        except Exception as e:
-            return JsonResponse({
-                'success': False,
-                'message': f'Error: {str(e)}'
-            })
-
-    return JsonResponse({'success': False, 'message': 'Método no permitido'})
+        return carrito_ajax.respuesta_json('agregar al carrito', carrito_ajax.agregar, request.user, request.body)
+    return JsonResponse(carrito_ajax.METODO_NO_PERMITIDO)
 
 
 @login_required
@@ -396,104 +279,19 @@ def agregar_al_carrito(request):
 def actualizar_item_carrito(request, item_id):
     """Actualizar cantidad de un item del carrito vía AJAX"""
     if request.method == 'POST':
-        try:
-            data = json.loads(request.body)
-            nueva_cantidad = int(data.get('cantidad', 1))
-
-            print(f"🔄 Actualizando item {item_id} a cantidad {nueva_cantidad}")  # Debug
-
-            # Obtener el item del carrito
-            item = get_object_or_404(ItemCarrito, id=item_id, carrito__usuario=request.user)
-
-            # Verificar stock
-            if nueva_cantidad > item.producto.stock:
-                return JsonResponse({
-                    'success': False,
-                    'message': f'Solo hay {item.producto.stock} unidades disponibles'
-                })
-
-            if nueva_cantidad <= 0:
-                return JsonResponse({
-                    'success': False,
-                    'message': 'La cantidad debe ser mayor a 0'
-                })
-
-            # Actualizar cantidad
-            item.cantidad = nueva_cantidad
-            item.save()
-
-            carrito = item.carrito
-
-            # ✅ FORMATEAR CORRECTAMENTE
-            subtotal = int(item.subtotal())
-            total = int(carrito.total_precio())
-
-            print(f"✅ Item actualizado - Subtotal: {subtotal}, Total: {total}")  # Debug
-
-            return JsonResponse({
-                'success': True,
-                'message': 'Cantidad actualizada correctamente',
-                'item_subtotal': subtotal,
-                'carrito_items': carrito.total_items(),
-                'carrito_total': total
-            })
-
-        except Exception as e:
-            print(f"❌ Error al actualizar item: {str(e)}")  # Debug
-            return JsonResponse({
-                'success': False,
-                'message': f'Error: {str(e)}'
-            })
-
-    return JsonResponse({'success': False, 'message': 'Método no permitido'})
+        return carrito_ajax.respuesta_json(f'actualizar el item {item_id} del carrito', carrito_ajax.actualizar,
+                                           request.user, request.body, item_id)
+    return JsonResponse(carrito_ajax.METODO_NO_PERMITIDO)
 
 
 @login_required
 @csrf_exempt
 def eliminar_item_carrito(request, item_id):
-    """Eliminar un item del carrito vía AJAX - ✅ CORREGIDO"""
+    """Eliminar un item del carrito vía AJAX"""
     if request.method == 'DELETE':
-        try:
-            print(f"🗑️ Intentando eliminar item {item_id}")  # Debug
-
-            # Obtener el item del carrito
-            item = get_object_or_404(ItemCarrito, id=item_id, carrito__usuario=request.user)
-            producto_nombre = item.producto.nombre
-            carrito = item.carrito
-
-            print(f"📦 Item encontrado: {producto_nombre}")  # Debug
-
-            # Eliminar el item
-            item.delete()
-
-            print(f"✅ Item eliminado exitosamente")  # Debug
-
-            # ✅ FORMATEAR CORRECTAMENTE
-            total = int(carrito.total_precio())
-
-            return JsonResponse({
-                'success': True,
-                'message': f'{producto_nombre} eliminado del carrito',
-                'carrito_items': carrito.total_items(),
-                'carrito_total': total
-            })
-
-        except ItemCarrito.DoesNotExist:
-            print(f"❌ Item {item_id} no encontrado")  # Debug
-            return JsonResponse({
-                'success': False,
-                'message': 'El producto no existe en el carrito'
-            })
-        except Exception as e:
-            print(f"❌ Error al eliminar item: {str(e)}")  # Debug
-            import traceback
-            traceback.print_exc()  # Mostrar traceback completo
-            return JsonResponse({
-                'success': False,
-                'message': f'Error: {str(e)}'
-            })
-
-    return JsonResponse({'success': False, 'message': 'Método no permitido'})
+        return carrito_ajax.respuesta_json(f'eliminar el item {item_id} del carrito', carrito_ajax.eliminar,
+                                           request.user, item_id)
+    return JsonResponse(carrito_ajax.METODO_NO_PERMITIDO)
 
 
 @login_required
@@ -501,30 +299,14 @@ def eliminar_item_carrito(request, item_id):
 def limpiar_carrito(request):
     """Limpiar todo el carrito vía AJAX"""
     if request.method == 'POST':
-        try:
-            carrito = get_object_or_404(Carrito, usuario=request.user)
-            carrito.limpiar_carrito()
-
-            return JsonResponse({
-                'success': True,
-                'message': 'Carrito limpiado correctamente',
-                'carrito_items': 0,
-                'carrito_total': 0
-            })
-
-        except Exception as e:
-            return JsonResponse({
-                'success': False,
-                'message': f'Error: {str(e)}'
-            })
-
-    return JsonResponse({'success': False, 'message': 'Método no permitido'})
+        return carrito_ajax.respuesta_json('vaciar el carrito', carrito_ajax.vaciar, request.user)
+    return JsonResponse(carrito_ajax.METODO_NO_PERMITIDO)
 
 
 @login_required
 def ver_carrito(request):
     """Vista para mostrar el carrito completo"""
-    carrito, created = Carrito.objects.get_or_create(usuario=request.user)
+    carrito = request.contexto_usuario.carrito
     items = carrito.items.select_related('producto').all()
 
     context = {
@@ -537,45 +319,7 @@ def ver_carrito(request):
 @login_required
 def carrito_items_ajax(request):
     """Obtener items del carrito para mostrar en el dropdown"""
-    try:
-        carrito = request.user.carrito
-        items = carrito.items.select_related('producto').all()
-
-        items_data = []
-        for item in items:
-            items_data.append({
-                'id': item.id,
-                'producto_id': item.producto.id,
-                'nombre': item.producto.nombre,
-                'precio': int(item.producto.precio_actual()),
-                'cantidad': item.cantidad,
-                'subtotal': int(item.subtotal()),
-                'imagen_url': item.producto.imagen.url if item.producto.imagen else None,
-                'categoria': item.producto.categoria.nombre,
-            })
-
-        return JsonResponse({
-            'success': True,
-            'items': items_data,
-            'total_items': carrito.total_items(),
-            'total_precio': int(carrito.total_precio()),
-            'items_count': items.count(),
-            'has_more': False
-        })
-    except Carrito.DoesNotExist:
-        return JsonResponse({
-            'success': True,
-            'items': [],
-            'total_items': 0,
-            'total_precio': 0,
-            'items_count': 0,
-            'has_more': False
-        })
-    except Exception as e:
-        return JsonResponse({
-            'success': False,
-            'message': f'Error: {str(e)}'
-        })
+    return carrito_ajax.respuesta_json('listar los items del carrito', carrito_ajax.items, request.user)
 
 
 # ====================== VISTAS DE USUARIO ======================
@@ -608,20 +352,11 @@ def registro_view(request):
         if username and len(username) < 3:
             errores.append('El nombre de usuario debe tener al menos 3 caracteres')
 
-        # ✅ VALIDACIONES DE CONTRASEÑA ROBUSTAS
+        # ✅ POLÍTICA DE CONTRASEÑAS (AUTH_PASSWORD_VALIDATORS)
         if password1:
-            if len(password1) < 8:
-                errores.append('La contraseña debe tener al menos 8 caracteres')
-            elif password1.isdigit():
-                errores.append('La contraseña no puede ser solo números')
-            elif password1.isalpha():
-                errores.append('La contraseña no puede ser solo letras')
-            elif password1.lower() in ['12345678', 'password', 'contraseña', '11111111', 'qwerty123', 'abc12345']:
-                errores.append('La contraseña es demasiado común. Usa una más segura')
-            elif not any(c.isalpha() for c in password1) or not any(c.isdigit() for c in password1):
-                errores.append('La contraseña debe contener letras y números')
-            elif username and username.lower() in password1.lower():
-                errores.append('La contraseña no puede contener tu nombre de usuario')
+            errores.extend(errores_password(
+                password1, User(username=username, email=email, first_name=first_name, last_name=last_name)
+            ))
 
         # Validar que las contraseñas coincidan
         if password1 and password2 and password1 != password2:
@@ -641,8 +376,8 @@ def registro_view(request):
             return render(request, 'registro.html')
 
         try:
-            # Crear usuario
-            user = User.objects.create_user(
+            # Crear usuario (con perfil y carrito)
+            user = crear_usuario(
                 username=username,
                 email=email,
                 password=password1,
@@ -655,6 +390,7 @@ def registro_view(request):
             return redirect('dashboard')
 
         except Exception as e:
+            logger.exception('Error al crear la cuenta')
             messages.error(request, f'Error al crear la cuenta: {str(e)}')
             return render(request, 'registro.html')
 
@@ -664,16 +400,9 @@ def registro_view(request):
 @login_required
 def perfil_view(request):
     """Vista del perfil de usuario"""
-    try:
-        perfil = request.user.perfilusuario
-    except PerfilUsuario.DoesNotExist:
-        perfil = PerfilUsuario.objects.create(usuario=request.user)
-
-    carrito, created = Carrito.objects.get_or_create(usuario=request.user)
-
     context = {
-        'perfil': perfil,
-        'carrito': carrito,
+        'perfil': request.contexto_usuario.perfil,
+        'carrito': request.contexto_usuario.carrito,
     }
     return render(request, 'perfil.html', context)
 
@@ -684,7 +413,7 @@ def actualizar_perfil(request):
     """Actualizar perfil de usuario vía AJAX"""
     if request.method == 'POST':
         try:
-            perfil, created = PerfilUsuario.objects.get_or_create(usuario=request.user)
+            perfil = request.contexto_usuario.perfil
             user = request.user
 
             first_name = request.POST.get('first_name', '').strip()
@@ -739,6 +468,7 @@ def actualizar_perfil(request):
             })
 
         except Exception as e:
+            logger.exception('Error al actualizar perfil')
             return JsonResponse({
                 'success': False,
                 'message': f'Error al actualizar perfil: {str(e)}'
@@ -774,24 +504,8 @@ def cambiar_password(request):
                     'message': 'La contraseña actual es incorrecta'
                 })
 
-            # ✅ VALIDACIONES DE CONTRASEÑA ROBUSTAS
-            if len(new_password1) < 8:
-                errores.append('La contraseña debe tener al menos 8 caracteres')
-
-            if new_password1.isdigit():
-                errores.append('La contraseña no puede ser solo números')
-
-            if new_password1.isalpha():
-                errores.append('La contraseña no puede ser solo letras')
-
-            if new_password1.lower() in ['12345678', 'password', 'contraseña', '11111111', 'qwerty123', 'abc12345']:
-                errores.append('La contraseña es demasiado común. Usa una más segura')
-
-            if not any(c.isalpha() for c in new_password1) or not any(c.isdigit() for c in new_password1):
-                errores.append('La contraseña debe contener letras y números')
-
-            if request.user.username.lower() in new_password1.lower():
-                errores.append('La contraseña no puede contener tu nombre de usuario')
+            # ✅ POLÍTICA DE CONTRASEÑAS (AUTH_PASSWORD_VALIDATORS)
+            errores.extend(errores_password(new_password1, request.user))
 
             if new_password1 == current_password:
                 errores.append('La nueva contraseña debe ser diferente a la actual')
@@ -821,6 +535,7 @@ def cambiar_password(request):
             })
 
         except Exception as e:
+            logger.exception('Error al cambiar contraseña')
             return JsonResponse({
                 'success': False,
                 'message': f'Error al cambiar contraseña: {str(e)}'
@@ -831,6 +546,8 @@ def cambiar_password(request):
 
 # ====================== RECUPERACIÓN DE CONTRASEÑA POR EMAIL ======================
 
+@limitar_peticiones(limite=5, ventana=3600, campo_usuario='email_or_username',
+                    plantilla='auth/solicitar_recuperacion.html')
 def solicitar_recuperacion_password(request):
     """Vista para solicitar recuperación de contraseña por email"""
     if request.user.is_authenticated:
@@ -840,63 +557,29 @@ def solicitar_recuperacion_password(request):
         email_or_username = request.POST.get('email_or_username')
 
         if not email_or_username:
-            messages.error(request, 'Por favor ingresa tu email o nombre de usuario')
+            messages.error(request, acceso.MENSAJE_RECUPERACION_SIN_DATOS)
             return render(request, 'auth/solicitar_recuperacion.html')
 
         try:
-            try:
-                if '@' in email_or_username:
-                    user = User.objects.get(email=email_or_username)
-                else:
-                    user = User.objects.get(username=email_or_username)
-            except User.DoesNotExist:
-                messages.success(request, 'Si el usuario existe, se ha enviado un email con instrucciones.')
-                return render(request, 'auth/solicitar_recuperacion.html')
-
-            if not user.email:
-                messages.error(request, 'Este usuario no tiene email configurado.')
-                return render(request, 'auth/solicitar_recuperacion.html')
-
-            try:
-                token_obj = TokenRecuperacion.crear_token(user)
-            except Exception:
-                messages.error(request, 'Error interno. Contacta al administrador.')
-                return render(request, 'auth/solicitar_recuperacion.html')
-
-            subject = 'Recuperación de contraseña - GAMERLY'
-            current_site = get_current_site(request)
-
-            context = {
-                'user': user,
-                'domain': current_site.domain,
-                'site_name': 'GAMERLY',
-                'token': token_obj.token,
-                'protocol': 'https' if request.is_secure() else 'http',
-            }
+            user, correo = acceso.preparar_recuperacion(request, email_or_username)
+        except Exception:
+            logger.exception('No se pudo preparar el email de recuperación')
+            messages.error(request, acceso.MENSAJE_RECUPERACION_ERROR_INTERNO)
+            return render(request, 'auth/solicitar_recuperacion.html')
 
+        if user is None:
+            messages.success(request, acceso.MENSAJE_RECUPERACION_ENVIADA)
+        elif correo is None:
+            messages.error(request, acceso.MENSAJE_RECUPERACION_SIN_EMAIL)
+        else:
             try:
-                email_body = render_to_string('auth/email_recuperacion.html', context)
+                send_mail(**correo)
             except Exception:
-                messages.error(request, 'Error interno del sistema.')
-                return render(request, 'auth/solicitar_recuperacion.html')
-
-            try:
-                send_mail(
-                    subject=subject,
-                    message='Versión en texto plano: Para recuperar tu contraseña, usa el enlace en la versión HTML de este email.',
-                    from_email=settings.EMAIL_HOST_USER,
-                    recipient_list=[user.email],
-                    html_message=email_body,
-                    fail_silently=False,
-                )
-                messages.success(request, 'Se ha enviado un email con instrucciones para recuperar tu contraseña.')
+                logger.exception('No se pudo enviar el email de recuperación')
+                messages.error(request, acceso.MENSAJE_RECUPERACION_ERROR_ENVIO)
+            else:
+                messages.success(request, acceso.MENSAJE_RECUPERACION_OK)
                 return redirect('login')
-            except Exception:
-                messages.error(request, 'Error al enviar el email. Por favor intenta más tarde.')
-                return render(request, 'auth/solicitar_recuperacion.html')
-
-        except Exception:
-            messages.error(request, 'Error interno. Por favor intenta más tarde.')
 
     return render(request, 'auth/solicitar_recuperacion.html')
 
@@ -922,14 +605,10 @@ def confirmar_recuperacion_password(request, token):
 
             if not new_password1 or not new_password2:
                 errores.append('Ambos campos son obligatorios')
-            elif len(new_password1) < 8:
-                errores.append('La contraseña debe tener al menos 8 caracteres')
             elif new_password1 != new_password2:
                 errores.append('Las contraseñas no coinciden')
-            elif new_password1.lower() in ['12345678', 'password', 'contraseña', '11111111']:
-                errores.append('La contraseña es demasiado común. Usa una más segura')
-            elif not any(c.isalpha() for c in new_password1) or not any(c.isdigit() for c in new_password1):
-                errores.append('La contraseña debe contener letras y números')
+            else:
+                errores.extend(errores_password(new_password1, token_obj.usuario))
 
             if errores:
                 for error in errores:
@@ -950,7 +629,8 @@ def confirmar_recuperacion_password(request, token):
                 messages.success(request, '¡Contraseña cambiada exitosamente! Ya puedes iniciar sesión.')
                 return redirect('login')
 
-            except Exception as e:
+            except Exception:
+                logger.exception('Error al cambiar la contraseña por recuperación')
                 messages.error(request, 'Error al cambiar la contraseña. Intenta nuevamente.')
                 return render(request, 'auth/confirmar_recuperacion.html', {
                     'token': token,
@@ -967,6 +647,7 @@ def confirmar_recuperacion_password(request, token):
         messages.error(request, 'Enlace inválido o expirado.')
         return redirect('solicitar_recuperacion_password')
     except Exception:
+        logger.exception('Error al validar el enlace de recuperación')
         messages.error(request, 'Error al procesar la solicitud.')
         return redirect('solicitar_recuperacion_password')
 
@@ -990,8 +671,10 @@ def recuperar_password_view(request):
             messages.error(request, 'Las nuevas contraseñas no coinciden')
             return render(request, 'recuperar_password.html')
 
-        if len(new_password1) < 8:
-            messages.error(request, 'La nueva contraseña debe tener al menos 8 caracteres')
+        errores = errores_password(new_password1, User(username=username))
+        if errores:
+            for error in errores:
+                messages.error(request, error)
             return render(request, 'recuperar_password.html')
 
         try:
@@ -1012,6 +695,7 @@ def recuperar_password_view(request):
             messages.error(request, 'El usuario no existe')
             return render(request, 'recuperar_password.html')
         except Exception as e:
+            logger.exception('Error al cambiar contraseña')
             messages.error(request, f'Error al cambiar contraseña: {str(e)}')
             return render(request, 'recuperar_password.html')
 
@@ -1020,32 +704,46 @@ def recuperar_password_view(request):
 
 # ====================== API REST ======================
 
-class ProductoViewSet(viewsets.ModelViewSet):
+class CamposDinamicosViewSetMixin:
+    """Con ?fields= / ?omit= el queryset trae solo las columnas y joins que se usan"""
+
+    def recortar_queryset(self, queryset, columnas_extra=()):
+        if self.request.method != 'GET':
+            return queryset
+
+        serializer = self.get_serializer()
+        if not getattr(serializer, 'campos_seleccionados', False):
+            return queryset
+
+        seleccion = serializer.columnas_modelo()
+        if seleccion is None:
+            return queryset
+        columnas, relaciones = seleccion
+        queryset = queryset.select_related(None)
+        if relaciones:  # select_related() sin argumentos seguiría todas las FK
+            queryset = queryset.select_related(*relaciones)
+        return queryset.only(*columnas, *columnas_extra)
+
+
+class ProductoViewSet(CamposDinamicosViewSetMixin, viewsets.ModelViewSet):
     """API REST para productos con permisos diferenciados"""
     queryset = Producto.objects.select_related('categoria', 'creado_por').all()
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = 'productos'
 
     def get_serializer_class(self):
-        if self.action == 'list':
+        if self.action in ['list', 'destacados', 'cambios']:
             return ProductoListSerializer
         return ProductoSerializer
 
-    def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
-            permission_classes = [IsAuthenticated]
-        else:
-            permission_classes = [IsAdminUser]
-        return [permission() for permission in permission_classes]
+    permission_classes = [EsAdministradorOLectura]
+    acciones_lectura = ('list', 'retrieve', 'cambios')
 
     def get_queryset(self):
         queryset = super().get_queryset()
 
-        if not self.request.user.is_superuser:
-            try:
-                perfil = self.request.user.perfilusuario
-                if perfil.tipo_usuario != 'admin':
-                    queryset = queryset.filter(estado='disponible')
-            except PerfilUsuario.DoesNotExist:
-                queryset = queryset.filter(estado='disponible')
+        if not es_admin_catalogo(self.request):
+            queryset = queryset.filter(estado='disponible')
 
         categoria = self.request.query_params.get('categoria')
         if categoria:
@@ -1055,66 +753,146 @@ class ProductoViewSet(viewsets.ModelViewSet):
         if destacado:
             queryset = queryset.filter(destacado=True)
 
-        return queryset
+        return self.recortar_queryset(queryset)
 
     @action(detail=False, methods=['get'])
     def destacados(self, request):
         productos = self.get_queryset().filter(destacado=True, estado='disponible')[:6]
-        serializer = ProductoListSerializer(productos, many=True)
+        serializer = self.get_serializer(productos, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def cambios(self, request):
+        """
+        Sincronización incremental: ``?desde=<ISO 8601>`` para empezar (sin
+        ``desde``, copia completa) y luego ``?cursor=<siguiente>`` hasta que
+        ``siguiente`` sea null. Los productos borrados (o que dejaron de estar
+        disponibles para este usuario) llegan en ``eliminados``. La próxima
+        sincronización parte de ``hasta``; un ``desde`` más viejo que la
+        retención de borrados responde 410 (ver sincronizacion.py).
+        """
+        try:
+            if request.query_params.get('cursor'):
+                estado = sincronizacion.leer_cursor(request.query_params['cursor'])
+            else:
+                estado = sincronizacion.estado_inicial(request.query_params.get('desde'))
+            limite = int(request.query_params.get('limite', sincronizacion.LIMITE_POR_DEFECTO))
+        except sincronizacion.DesdeVencido as e:
+            return Response({'detail': str(e)}, status=status.HTTP_410_GONE)
+        except (sincronizacion.ParametrosInvalidos, ValueError) as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        productos = self.recortar_queryset(Producto.objects.select_related('categoria'),
+                                           columnas_extra=['fecha_actualizacion', 'estado'])
+        visible = None if es_admin_catalogo(request) else (lambda producto: producto.estado == 'disponible')
+
+        # Con réplicas, un cambio aún no replicado quedaría antes de 'hasta' y
+        # el cliente no lo vería nunca: la sincronización lee del primario
+        with replicas.primario():
+            upserts, eliminados, siguiente, hasta = sincronizacion.pagina_de_cambios(
+                productos, estado, limite, visible)
+        return Response({
+            'upserts': self.get_serializer(upserts, many=True).data,
+            'eliminados': eliminados,
+            'siguiente': siguiente,
+            'hasta': hasta,
+        })
 
-class CategoriaViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'])
+    def masivo(self, request):
+        """
+        Cambio masivo en un solo UPDATE (solo staff), p. ej.
+        ``{"operacion": "descuento_porcentaje", "valor": 15, "categoria": 3}``.
+        Operaciones: ver masivo.OPERACIONES.
+        """
+        serializer = OperacionMasivaSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            actualizados = masivo.aplicar(serializer.filtrar(Producto.objects.all()),
+                                          serializer.validated_data['operacion'],
+                                          serializer.validated_data['valor'])
+        except masivo.OperacionInvalida as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'actualizados': actualizados})
+
+
+class CategoriaViewSet(CamposDinamicosViewSetMixin, viewsets.ModelViewSet):
     """API REST para categorías"""
     queryset = Categoria.objects.all()
     serializer_class = CategoriaSerializer
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = 'categorias'
 
-    def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
-            permission_classes = [IsAuthenticated]
-        else:
-            permission_classes = [IsAdminUser]
-        return [permission() for permission in permission_classes]
+    permission_classes = [EsAdministradorOLectura]
+    acciones_lectura = ('list', 'retrieve')
 
     def get_queryset(self):
         queryset = super().get_queryset()
 
-        if not self.request.user.is_superuser:
-            try:
-                perfil = self.request.user.perfilusuario
-                if perfil.tipo_usuario != 'admin':
-                    queryset = queryset.filter(activo=True)
-            except PerfilUsuario.DoesNotExist:
-                queryset = queryset.filter(activo=True)
+        if not es_admin_catalogo(self.request):
+            queryset = queryset.filter(activo=True)
 
-        return queryset
+        return self.recortar_queryset(queryset)
 
 
 # ====================== API ENDPOINTS ======================
 
+class ObtenerTokenView(APIView):
+    """
+    Canjea usuario, contraseña y código 2FA por un token firmado
+    (Authorization: Token ...), en dos pasos como el login web:
+
+    1. ``{username, password}``: envía el código por email (202).
+    2. ``{username, password, codigo}``: retorna el token.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = 'api_token'
+
+    def post(self, request):
+        user = authenticate(request, username=request.data.get('username'), password=request.data.get('password'))
+        if user is None:
+            return Response({'detail': acceso.MENSAJE_CREDENCIALES}, status=status.HTTP_400_BAD_REQUEST)
+        if not user.email:
+            return Response({'detail': acceso.MENSAJE_SIN_EMAIL}, status=status.HTTP_400_BAD_REQUEST)
+
+        codigo = request.data.get('codigo')
+        if codigo is None:
+            try:
+                send_mail(**acceso.correo_codigo_login(user, request.META.get('REMOTE_ADDR')))
+            except Exception:
+                logger.exception('No se pudo enviar el código para el token de API')
+                return Response({'detail': acceso.MENSAJE_ERROR_CODIGO}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            return Response({'detail': acceso.mensaje_codigo_enviado(user)}, status=status.HTTP_202_ACCEPTED)
+
+        error = acceso.verificar_codigo_login(user, str(codigo))
+        if error is not None:
+            return Response({'detail': error}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'token': emitir_token(user),
+            'expira_en': settings.API_TOKEN_VIGENCIA,
+        })
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def mi_perfil(request):
     """Obtener perfil del usuario actual"""
-    try:
-        perfil = request.user.perfilusuario
-    except PerfilUsuario.DoesNotExist:
-        perfil = PerfilUsuario.objects.create(usuario=request.user)
-
-    serializer = PerfilUsuarioSerializer(perfil)
+    serializer = PerfilUsuarioSerializer(request.contexto_usuario.perfil)
     return Response(serializer.data)
 
 
 @api_view(['GET'])
 def estadisticas_publicas(request):
     """Estadísticas públicas de la tienda"""
-    total_productos = Producto.objects.filter(estado='disponible').count()
-    total_categorias = Categoria.objects.filter(activo=True).count()
+    stats = estadisticas.obtener()
 
     return Response({
-        'total_productos': total_productos,
-        'total_categorias': total_categorias,
-        'productos_destacados': Producto.objects.filter(destacado=True, estado='disponible').count()
+        'total_productos': stats['productos']['disponibles'],
+        'total_categorias': stats['categorias']['activas'],
+        'productos_destacados': stats['productos']['destacados'],
     })
 
 
@@ -1122,18 +900,11 @@ def estadisticas_publicas(request):
 @permission_classes([IsAuthenticated])
 def carrito_info(request):
     """Información del carrito del usuario actual"""
-    try:
-        carrito = request.user.carrito
-        return Response({
-            'total_items': carrito.total_items(),
-            'total_precio': carrito.total_precio()
-        })
-    except Carrito.DoesNotExist:
-        carrito = Carrito.objects.create(usuario=request.user)
-        return Response({
-            'total_items': 0,
-            'total_precio': 0
-        })
+    contexto = request.contexto_usuario
+    return Response({
+        'total_items': contexto.total_items,
+        'total_precio': contexto.total_precio
+    })
 
 
 def detalle_producto(request, producto_id):
@@ -1145,13 +916,22 @@ def detalle_producto(request, producto_id):
         estado='disponible'
     ).exclude(id=producto.id)[:4]
 
-    carrito = None
-    if request.user.is_authenticated:
-        carrito, created = Carrito.objects.get_or_create(usuario=request.user)
-
     context = {
         'producto': producto,
         'productos_relacionados': productos_relacionados,
-        'carrito': carrito,
     }
-    return render(request, 'detalle_producto.html', context)
\ No newline at end of file
+    return render(request, 'detalle_producto.html', context)
+
+
+def metricas_view(request):
+    """
+    Métricas en formato de texto de Prometheus. Acceso para staff con sesión
+    o con ``Authorization: Bearer <METRICAS_TOKEN>`` (el scraper).
+    """
+    token = getattr(settings, 'METRICAS_TOKEN', '')
+    recibido = request.headers.get('Authorization', '')
+    autorizado = (token and constant_time_compare(recibido, f'Bearer {token}')) or request.user.is_staff
+    if not autorizado:
+        return HttpResponse('No autorizado\n', status=401, content_type='text/plain; charset=utf-8',
+                            headers={'WWW-Authenticate': 'Bearer'})
+    return HttpResponse(metricas.REGISTRO.texto(), content_type=metricas.CONTENT_TYPE)
@@ -0,0 +1,71 @@
+"""
+Páginas propias del admin (fuera de los ModelAdmin): perfiles de peticiones
+y consultas lentas.
+
+Se enrutan en urls_admin.py bajo /admin/ y pasan por ``admin.site.admin_view``,
+que exige staff y redirige al login del admin.
+"""
+from django.contrib import admin, messages
+from django.http import FileResponse, Http404
+from django.shortcuts import redirect, render
+
+from . import consultas_lentas, perfilado
+
+
+def _contexto(request, titulo, **extra):
+    return {**admin.site.each_context(request), 'title': titulo, **extra}
+
+
+def perfiles(request):
+    return render(request, 'admin/perfiles.html', _contexto(
+        request, 'Perfiles de peticiones',
+        perfiles=perfilado.listar(),
+        maximo=perfilado.maximo(),
+        cabecera=perfilado.CABECERA,
+        parametro=perfilado.PARAMETRO,
+    ))
+
+
+ORDENES_PERFIL = [('cumulative', 'tiempo acumulado'), ('tottime', 'tiempo propio'), ('ncalls', 'llamadas')]
+
+
+def perfil(request, perfil_id):
+    orden = request.GET.get('orden')
+    if orden not in dict(ORDENES_PERFIL):
+        orden = 'cumulative'
+    try:
+        datos = perfilado.leer(perfil_id)
+        resumen = perfilado.resumen(perfil_id, orden)
+    except (OSError, ValueError):
+        raise Http404('Perfil no encontrado (puede haber salido del buffer)')
+    consultas = sorted(datos.pop('consultas'), key=lambda consulta: consulta['ms'], reverse=True)
+    return render(request, 'admin/perfil_detalle.html', _contexto(
+        request, f'Perfil {perfil_id}',
+        perfil=datos, consultas=consultas, resumen=resumen, orden=orden, ordenes=ORDENES_PERFIL,
+    ))
+
+
+def descargar_perfil(request, perfil_id):
+    try:
+        ruta = perfilado.ruta_prof(perfil_id)
+    except OSError:
+        raise Http404('Perfil no encontrado')
+    return FileResponse(open(ruta, 'rb'), as_attachment=True, filename=f'{perfil_id}.prof')
+
+
+def consultas_lentas_view(request):
+    if request.method == 'POST':
+        consultas_lentas.limpiar()
+        messages.success(request, '✅ Registro de consultas lentas vaciado')
+        return redirect('admin_consultas_lentas')
+
+    orden = request.GET.get('orden')
+    if orden not in consultas_lentas.ORDENES:
+        orden = 'suma_ms'
+    return render(request, 'admin/consultas_lentas.html', _contexto(
+        request, 'Consultas lentas',
+        entradas=consultas_lentas.reporte(50, orden),
+        orden=orden,
+        ordenes=consultas_lentas.ORDENES.items(),
+        umbral=consultas_lentas.umbral(),
+    ))
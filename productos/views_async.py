@@ -0,0 +1,263 @@
+"""
+Versiones async de las vistas que esperan por SMTP o por la BD (login/2FA,
+recuperación de contraseña y endpoints JSON del carrito).
+
+Se enrutan cuando GAMERLY_VISTAS_ASYNC está activo y conviene servirlas con
+un servidor ASGI (ver deploy/). La lógica es la de acceso.py y
+carrito_ajax.py, la misma que usa views.py: cada vista hace un solo
+``sync_to_async`` para la BD y las plantillas, y el correo se envía en el
+pool de hilos (``enviar_correo_async``) sin ocupar el hilo compartido.
+"""
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth import aauthenticate, alogin
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import redirect, render
+from django.views.decorators.csrf import csrf_exempt
+
+from . import acceso, carrito_ajax, eventos
+from .correo import enviar_correo_async
+from .models import Carrito, ItemCarrito, suma_items, suma_precio
+from .ratelimit import limitar_peticiones
+
+logger = logging.getLogger(__name__)
+
+# render() puede tocar la BD (context processors, sesión)
+arender = sync_to_async(render)
+
+
+async def _usuario_pendiente(request):
+    return await request.session.aget('pending_user_id')
+
+
+# ====================== LOGIN CON 2FA ======================
+
+@limitar_peticiones(limite=acceso.LOGIN_LIMITE, ventana=acceso.LOGIN_VENTANA, campo_usuario='username',
+                    plantilla='login.html', alcance=acceso.LOGIN_ALCANCE)
+async def login_view(request):
+    """Vista de login con 2FA por email"""
+    if (await request.auser()).is_authenticated:
+        return redirect('dashboard')
+
+    if request.method == 'POST':
+        username = request.POST.get('username')
+        user = await aauthenticate(request, username=username, password=request.POST.get('password'))
+
+        if user is None:
+            messages.error(request, acceso.MENSAJE_CREDENCIALES)
+        elif not user.email:
+            messages.error(request, acceso.MENSAJE_SIN_EMAIL)
+        else:
+            try:
+                correo = await sync_to_async(acceso.correo_codigo_login)(user, request.META.get('REMOTE_ADDR'))
+                await enviar_correo_async(**correo)
+            except Exception:
+                logger.exception('No se pudo enviar el código de login')
+                messages.error(request, acceso.MENSAJE_ERROR_CODIGO)
+            else:
+                await request.session.aset('pending_username', username)
+                await request.session.aset('pending_user_id', user.id)
+
+                messages.success(request, acceso.mensaje_codigo_enviado(user))
+                return redirect('verificar_token_login')
+
+    return await arender(request, 'login.html')
+
+
+async def verificar_token_login(request):
+    """Vista para verificar el token de login"""
+    user_id = await _usuario_pendiente(request)
+    if user_id is None:
+        messages.error(request, acceso.MENSAJE_SIN_LOGIN_PENDIENTE)
+        return redirect('login')
+
+    user = await sync_to_async(acceso.usuario_pendiente)(user_id)
+    if user is None:
+        messages.error(request, acceso.MENSAJE_USUARIO_NO_ENCONTRADO)
+        return redirect('login')
+
+    if request.method == 'POST':
+        try:
+            error = await sync_to_async(acceso.verificar_codigo_login)(user, request.POST.get('token'))
+        except Exception:
+            logger.exception('Error al verificar el código de login')
+            error = acceso.MENSAJE_ERROR_VERIFICACION
+
+        if error is None:
+            await request.session.apop('pending_username', None)
+            await request.session.apop('pending_user_id', None)
+
+            await alogin(request, user)
+            messages.success(request, acceso.mensaje_bienvenida(user))
+            return redirect('dashboard')
+        messages.error(request, error)
+
+    return await arender(request, 'auth/verificar_token_login.html', {'user': user})
+
+
+@limitar_peticiones(limite=3, ventana=600, campo_usuario=_usuario_pendiente,
+                    metodos=('GET', 'POST'), respuesta_json=True)
+async def reenviar_token_login(request):
+    """Reenviar código de verificación"""
+    user = await sync_to_async(acceso.usuario_pendiente)(await _usuario_pendiente(request))
+    if user is None:
+        return JsonResponse({'success': False, 'message': 'No hay un login pendiente'})
+
+    try:
+        correo = await sync_to_async(acceso.correo_codigo_login)(user, request.META.get('REMOTE_ADDR'), reenvio=True)
+        await enviar_correo_async(**correo)
+    except Exception:
+        logger.exception('No se pudo reenviar el código de login')
+        return JsonResponse({'success': False, 'message': 'Error al reenviar código'})
+
+    return JsonResponse({'success': True, 'message': '✅ Código reenviado'})
+
+
+# ====================== RECUPERACIÓN DE CONTRASEÑA POR EMAIL ======================
+
+@limitar_peticiones(limite=5, ventana=3600, campo_usuario='email_or_username',
+                    plantilla='auth/solicitar_recuperacion.html')
+async def solicitar_recuperacion_password(request):
+    """Vista para solicitar recuperación de contraseña por email"""
+    if (await request.auser()).is_authenticated:
+        return redirect('dashboard')
+
+    plantilla = 'auth/solicitar_recuperacion.html'
+
+    if request.method == 'POST':
+        email_or_username = request.POST.get('email_or_username')
+
+        if not email_or_username:
+            messages.error(request, acceso.MENSAJE_RECUPERACION_SIN_DATOS)
+            return await arender(request, plantilla)
+
+        try:
+            user, correo = await sync_to_async(acceso.preparar_recuperacion)(request, email_or_username)
+        except Exception:
+            logger.exception('No se pudo preparar el email de recuperación')
+            messages.error(request, acceso.MENSAJE_RECUPERACION_ERROR_INTERNO)
+            return await arender(request, plantilla)
+
+        if user is None:
+            messages.success(request, acceso.MENSAJE_RECUPERACION_ENVIADA)
+        elif correo is None:
+            messages.error(request, acceso.MENSAJE_RECUPERACION_SIN_EMAIL)
+        else:
+            try:
+                await enviar_correo_async(**correo)
+            except Exception:
+                logger.exception('No se pudo enviar el email de recuperación')
+                messages.error(request, acceso.MENSAJE_RECUPERACION_ERROR_ENVIO)
+            else:
+                messages.success(request, acceso.MENSAJE_RECUPERACION_OK)
+                return redirect('login')
+
+    return await arender(request, plantilla)
+
+
+# ====================== VISTAS DEL CARRITO ======================
+
+arespuesta_json = sync_to_async(carrito_ajax.respuesta_json)
+
+
+@login_required
+@csrf_exempt
+async def agregar_al_carrito(request):
+    """Agregar producto al carrito vía AJAX"""
+    if request.method == 'POST':
+        return await arespuesta_json('agregar al carrito', carrito_ajax.agregar, await request.auser(), request.body)
+    return JsonResponse(carrito_ajax.METODO_NO_PERMITIDO)
+
+
+@login_required
+@csrf_exempt
+async def actualizar_item_carrito(request, item_id):
+    """Actualizar cantidad de un item del carrito vía AJAX"""
+    if request.method == 'POST':
+        return await arespuesta_json(f'actualizar el item {item_id} del carrito', carrito_ajax.actualizar,
+                                     await request.auser(), request.body, item_id)
+    return JsonResponse(carrito_ajax.METODO_NO_PERMITIDO)
+
+
+@login_required
+@csrf_exempt
+async def eliminar_item_carrito(request, item_id):
+    """Eliminar un item del carrito vía AJAX"""
+    if request.method == 'DELETE':
+        return await arespuesta_json(f'eliminar el item {item_id} del carrito', carrito_ajax.eliminar,
+                                     await request.auser(), item_id)
+    return JsonResponse(carrito_ajax.METODO_NO_PERMITIDO)
+
+
+@login_required
+@csrf_exempt
+async def limpiar_carrito(request):
+    """Limpiar todo el carrito vía AJAX"""
+    if request.method == 'POST':
+        return await arespuesta_json('vaciar el carrito', carrito_ajax.vaciar, await request.auser())
+    return JsonResponse(carrito_ajax.METODO_NO_PERMITIDO)
+
+
+@login_required
+async def carrito_items_ajax(request):
+    """Obtener items del carrito para mostrar en el dropdown"""
+    return await arespuesta_json('listar los items del carrito', carrito_ajax.items, await request.auser())
+
+
+# ====================== EVENTOS DEL CARRITO (SSE) ======================
+
+def _evento_sse(tipo, datos):
+    return f'event: {tipo}\ndata: {json.dumps(datos)}\n\n'
+
+
+async def _estado_carrito(carrito_id):
+    """Resumen del carrito (mismo total que carrito_ajax.resumen) y productos que contiene"""
+    items = ItemCarrito.objects.filter(carrito_id=carrito_id)
+    totales = await items.aaggregate(total_items=suma_items(''), total_precio=suma_precio(''))
+    productos = [pid async for pid in items.values_list('producto_id', flat=True)]
+    return {'total_items': totales['total_items'], 'total_precio': int(totales['total_precio'])}, productos
+
+
+@login_required
+async def carrito_eventos(request):
+    """
+    Stream SSE con el resumen del carrito (``event: carrito``) y el stock de
+    sus productos (``event: stock``). Reemplaza el polling de base.html; una
+    conexión por pestaña, solo bajo ASGI.
+    """
+    carrito = await Carrito.objects.only('id').aget(usuario=await request.auser())
+    latido = settings.SSE_LATIDO_SEGUNDOS
+
+    async def flujo():
+        canal = eventos.canal_carrito(carrito.id)
+        with eventos.Suscripcion([canal]) as suscripcion:
+            yield f'retry: {latido * 1000}\n\n'
+            anterior = None
+            while True:
+                resumen, productos = await _estado_carrito(carrito.id)
+                suscripcion.cambiar([canal] + [eventos.canal_producto(pid) for pid in productos])
+                if resumen != anterior:
+                    yield _evento_sse('carrito', resumen)
+                    anterior = resumen
+
+                evento = await suscripcion.siguiente(timeout=latido)
+                if evento is None:
+                    # Mantiene viva la conexión; el resumen se revisa igual por
+                    # si el cambio ocurrió en otro worker
+                    yield ': latido\n\n'
+                    continue
+
+                # Una ráfaga de cambios se resuelve con un solo resumen
+                for evento in [evento] + suscripcion.pendientes():
+                    if evento['tipo'] == 'stock':
+                        yield _evento_sse('stock', evento)
+
+    respuesta = StreamingHttpResponse(flujo(), content_type='text/event-stream')
+    respuesta['Cache-Control'] = 'no-cache'
+    respuesta['X-Accel-Buffering'] = 'no'  # sin buffer en nginx
+    return respuesta
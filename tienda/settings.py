@@ -1,11 +1,12 @@
 import os
+import tempfile
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = 'django-insecure-tu-clave-secreta-aqui-cambiar-en-produccion'
 
-DEBUG = True
+DEBUG = os.environ.get('GAMERLY_DEBUG', '1') == '1'
 
 # ✅ HOSTS CORREGIDOS PARA DESARROLLO
 ALLOWED_HOSTS = ['localhost', '127.0.0.1', '0.0.0.0']
@@ -23,11 +24,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'productos.instrumentacion.InstrumentacionMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'productos.replicas.ReplicaMiddleware',
+    'productos.ratelimit.LimitePeticionesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'productos.contexto.ContextoUsuarioMiddleware',
+    'productos.perfilado.PerfiladoMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -36,7 +42,9 @@ ROOT_URLCONF = 'tienda.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates que además mide el render (productos/instrumentacion.py)
+        'BACKEND': 'productos.instrumentacion.PlantillasMedidas',
+        'NAME': 'django',
         'DIRS': [
             BASE_DIR / 'templates',
             BASE_DIR / 'productos/templates',  # Para que encuentre admin/ y auth/
@@ -54,40 +62,227 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'tienda.wsgi.application'
+ASGI_APPLICATION = 'tienda.asgi.application'
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Login/2FA, recuperación y JSON del carrito como vistas async (productos/views_async.py).
+# Activar solo al servir con ASGI (deploy/gunicorn_asgi.conf.py); bajo WSGI no aportan
+GAMERLY_VISTAS_ASYNC = os.environ.get('GAMERLY_VISTAS_ASYNC', '0') == '1'
+
+# Stream SSE del carrito (/eventos/carrito/): solo con GAMERLY_VISTAS_ASYNC,
+# bajo WSGI cada conexión abierta ocuparía un worker
+SSE_LATIDO_SEGUNDOS = 15
+
+# =========================== BASE DE DATOS ===========================
+
+# GAMERLY_DB: sqlite (desarrollo, por defecto) | mysql (producción).
+#
+# CONN_MAX_AGE deja la conexión abierta entre peticiones del mismo worker en
+# lugar de abrir y cerrar una por petición; CONN_HEALTH_CHECKS la verifica
+# antes de reutilizarla tras un reinicio del servidor o un wait_timeout.
+# Bajo ASGI (GAMERLY_VISTAS_ASYNC) cada petición puede caer en otro hilo y
+# las conexiones persistentes se acumulan: ahí va 0 y, si hace falta, el
+# pool (GAMERLY_DB_POOL). Comparar con: python -m benchmarks.conexiones
+GAMERLY_DB = os.environ.get('GAMERLY_DB', 'sqlite')
+DB_CONN_MAX_AGE = int(os.environ.get('GAMERLY_DB_CONN_MAX_AGE', '0' if GAMERLY_VISTAS_ASYNC else '60'))
+
+if GAMERLY_DB == 'mysql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.mysql',
+            'NAME': os.environ.get('GAMERLY_DB_NOMBRE', 'gamerly'),
+            'USER': os.environ.get('GAMERLY_DB_USUARIO', 'gamerly'),
+            'PASSWORD': os.environ.get('GAMERLY_DB_PASSWORD', ''),
+            'HOST': os.environ.get('GAMERLY_DB_HOST', '127.0.0.1'),
+            'PORT': os.environ.get('GAMERLY_DB_PUERTO', '3306'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # utf8mb4: nombres, mensajes y descripciones llevan emojis
+                'charset': 'utf8mb4',
+                # Cada consulta ve lo confirmado hasta ese momento (menos bloqueos
+                # por gap locks que REPEATABLE READ en los updates del carrito)
+                'isolation_level': 'read committed',
+                'init_command': (
+                    "SET sql_mode='STRICT_TRANS_TABLES', "
+                    f"innodb_lock_wait_timeout={int(os.environ.get('GAMERLY_DB_LOCK_TIMEOUT', '10'))}"
+                ),
+            },
+            'TEST': {
+                'CHARSET': 'utf8mb4',
+                'COLLATION': 'utf8mb4_unicode_ci',
+            },
+        }
     }
+
+    # Pool opcional (django-db-connection-pool, ver deploy/requirements.txt):
+    # conexiones compartidas entre hilos, útil sobre todo bajo ASGI
+    if os.environ.get('GAMERLY_DB_POOL') == '1':
+        DATABASES['default']['ENGINE'] = 'dj_db_conn_pool.backends.mysql'
+        DATABASES['default']['POOL_OPTIONS'] = {
+            'POOL_SIZE': int(os.environ.get('GAMERLY_DB_POOL_TAMANO', '10')),
+            'MAX_OVERFLOW': int(os.environ.get('GAMERLY_DB_POOL_EXTRA', '10')),
+            'RECYCLE': 3600,  # por debajo del wait_timeout del servidor
+            'PRE_PING': True,
+        }
+        DATABASES['default']['CONN_MAX_AGE'] = 0  # el pool administra la vida de las conexiones
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # BEGIN IMMEDIATE: una transacción que lee y luego escribe toma el
+                # candado al empezar y espera busy_timeout, en vez de fallar al
+                # intentar pasar de lectura a escritura
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+
+# Pragmas de cada conexión SQLite (productos/sqlite.py); medir con
+# python -m benchmarks.carrito_concurrente
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': int(os.environ.get('GAMERLY_SQLITE_BUSY_TIMEOUT', '5000')),
+    'cache_size': -20000,  # negativo = KiB: ~20 MB por conexión
+    'mmap_size': 128 * 1024 * 1024,
+}
+
+# Réplicas de lectura del catálogo (productos/replicas.py). GAMERLY_DB_REPLICAS
+# lista, separados por comas, los hosts (mysql) o los archivos (sqlite, que se
+# refrescan con manage.py copiar_replicas) de cada réplica
+DATABASE_REPLICAS = []
+for numero, destino in enumerate(filter(None, os.environ.get('GAMERLY_DB_REPLICAS', '').split(',')), start=1):
+    replica = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+    if GAMERLY_DB == 'mysql':
+        replica['HOST'] = destino.strip()
+    else:
+        replica['NAME'] = BASE_DIR / destino.strip()
+    DATABASES[f'replica_{numero}'] = replica
+    DATABASE_REPLICAS.append(f'replica_{numero}')
+
+DATABASE_ROUTERS = ['productos.replicas.ReplicaRouter']
+# Tras escribir, el cliente lee del primario durante este tiempo (retraso de replicación)
+REPLICA_PEGAJOSO_SEGUNDOS = int(os.environ.get('GAMERLY_REPLICA_PEGAJOSO_SEGUNDOS', '10'))
+# Una réplica que falló no se vuelve a intentar durante este tiempo
+REPLICA_REVISION_SEGUNDOS = 30
+
+# =========================== CACHÉ ===========================
+
+# LocMemCache es por proceso: con varios workers usar Redis (GAMERLY_REDIS_URL)
+# para que contadores como los intentos de 2FA se compartan entre procesos
+if os.environ.get('GAMERLY_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['GAMERLY_REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'gamerly',
+        }
+    }
+
+# Tiempo que se guarda el tipo_usuario de cada perfil (productos/roles.py);
+# se invalida al guardar el perfil, el TTL solo acota updates masivos
+ROLES_CACHE_SEGUNDOS = 900
+
+# KPIs del catálogo (dashboard y admin); se invalidan al guardar productos o categorías
+ESTADISTICAS_CACHE_SEGUNDOS = int(os.environ.get('GAMERLY_ESTADISTICAS_CACHE_SEGUNDOS', '60'))
+
+# =========================== LÍMITE DE PETICIONES ===========================
+
+# Las vistas de login, reenvío de código y recuperación usan @limitar_peticiones;
+# estas rutas (logins que no son nuestros) se limitan desde el middleware
+RATELIMIT_ACTIVO = os.environ.get('GAMERLY_RATELIMIT_ACTIVO', '1') == '1'
+RATELIMIT_RUTAS = {
+    '/admin/login/': (10, 300),
+    '/api-auth/login/': (10, 300),
 }
 
 # Configuración REST Framework
+
+# Tokens firmados del API (productos/authentication.py)
+API_TOKEN_VIGENCIA = int(os.environ.get('GAMERLY_API_TOKEN_VIGENCIA', 7 * 24 * 3600))
+API_TOKEN_CACHE_SEGUNDOS = 300
+
+# Sincronización incremental (productos/sincronizacion.py): 'hasta' queda este
+# margen por detrás del reloj para no saltarse filas que confirman tarde, y las
+# marcas de borrado se conservan estos días (manage.py limpiar_eliminados)
+SINCRONIZACION_MARGEN_SEGUNDOS = int(os.environ.get('GAMERLY_SINCRONIZACION_MARGEN_SEGUNDOS', '30'))
+SINCRONIZACION_RETENCION_DIAS = int(os.environ.get('GAMERLY_SINCRONIZACION_RETENCION_DIAS', '30'))
+
+# El API navegable renderiza formularios HTML (y consulta las FK para los
+# desplegables) cada vez que un navegador abre el API: solo en desarrollo
+API_NAVEGABLE = os.environ.get('GAMERLY_API_NAVEGABLE', '1' if DEBUG else '0') == '1'
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        # Clientes máquina: token firmado sin sesión ni CSRF (POST /api/token/)
+        'productos.authentication.TokenFirmadoAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Límites por cliente (usuario autenticado o IP) para cada throttle_scope
+    'DEFAULT_THROTTLE_RATES': {
+        'productos': os.environ.get('GAMERLY_THROTTLE_PRODUCTOS', '1200/min'),
+        'categorias': os.environ.get('GAMERLY_THROTTLE_CATEGORIAS', '600/min'),
+        'api_token': os.environ.get('GAMERLY_THROTTLE_API_TOKEN', '10/min'),
+    },
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'productos.renderers.JSONRapidoRenderer',
+    ] + ([
         'rest_framework.renderers.BrowsableAPIRenderer',
-    ]
+    ] if API_NAVEGABLE else []),
+}
+
+# =========================== HASH DE CONTRASEÑAS ===========================
+
+# Hasher preferido por entorno (GAMERLY_HASHER): pbkdf2 | scrypt | argon2 | bcrypt.
+# Los demás quedan solo para verificar hashes antiguos, que se regeneran con el
+# hasher y costo actuales en el siguiente login correcto. Los tests usan md5
+# (tienda/settings_test.py). Medir el costo en el servidor real con:
+# python manage.py medir_hashers
+HASHERS_GAMERLY = {
+    'pbkdf2': 'productos.hashers.PBKDF2GamerlyHasher',
+    'scrypt': 'productos.hashers.ScryptGamerlyHasher',
+    'argon2': 'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'bcrypt': 'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'md5': 'django.contrib.auth.hashers.MD5PasswordHasher',
 }
+GAMERLY_HASHER = os.environ.get('GAMERLY_HASHER', 'pbkdf2')
+GAMERLY_PBKDF2_ITERACIONES = int(os.environ.get('GAMERLY_PBKDF2_ITERACIONES', 1_000_000))
+GAMERLY_SCRYPT_N = int(os.environ.get('GAMERLY_SCRYPT_N', 2 ** 14))
 
+PASSWORD_HASHERS = [HASHERS_GAMERLY[GAMERLY_HASHER]] + [
+    hasher for nombre, hasher in HASHERS_GAMERLY.items() if nombre not in (GAMERLY_HASHER, 'md5')
+]
+
+# Política única para registro, cambio y recuperación de contraseña (productos/validators.py).
+# PasswordComunValidator acepta OPTIONS {'rutas': [...]} con listas de contraseñas filtradas.
+# UserAttributeSimilarityValidator compara con usuario, nombre, apellido y email;
+# UsuarioEnPasswordValidator además rechaza el usuario contenido en una contraseña larga
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
     },
     {
-        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+        'NAME': 'productos.validators.ComposicionPasswordValidator',
+        'OPTIONS': {'min_length': 8},
     },
     {
-        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+        'NAME': 'productos.validators.PasswordComunValidator',
     },
     {
-        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+        'NAME': 'productos.validators.UsuarioEnPasswordValidator',
     },
 ]
 
@@ -124,8 +319,10 @@ SITE_ID = 1
 
 # =========================== CONFIGURACIÓN DE EMAIL ===========================
 
-# Configuración de Email con Gmail SMTP
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Configuración de Email con Gmail SMTP. EMAIL_BACKEND_REAL es el que envía;
+# EmailBackendMedido solo lo envuelve para medir el envío (productos/instrumentacion.py)
+EMAIL_BACKEND_REAL = os.environ.get('GAMERLY_EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_BACKEND = 'productos.correo.EmailBackendMedido'
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
@@ -165,21 +362,68 @@ GAMERLY_CONFIG = {
     'DEBUG_EMAIL': DEBUG,  # Usar console backend si DEBUG=True
 }
 
-# ✅ LOGGING PARA DEBUGGING (OPCIONAL)
-if DEBUG:
-    LOGGING = {
-        'version': 1,
-        'disable_existing_loggers': False,
-        'handlers': {
-            'console': {
-                'class': 'logging.StreamHandler',
-            },
+# =========================== LOGS ===========================
+
+# Logs estructurados (productos/instrumentacion.py): una línea JSON por
+# registro con su request_id y una por petición con los tiempos de vista,
+# BD, plantillas y correo. GAMERLY_LOG_FORMATO=texto para leerlos en consola
+LOG_NIVEL = os.environ.get('GAMERLY_LOG_NIVEL', 'INFO')
+LOG_FORMATO = os.environ.get('GAMERLY_LOG_FORMATO', 'texto' if DEBUG else 'json')
+# Fracción de peticiones que se registran; las lentas y los 5xx siempre
+LOG_PETICIONES_MUESTREO = float(os.environ.get('GAMERLY_LOG_MUESTREO', '1.0'))
+LOG_PETICIONES_LENTAS_MS = int(os.environ.get('GAMERLY_LOG_LENTAS_MS', '1000'))
+
+# Métricas Prometheus en /metrics (productos/metricas.py): staff o el scraper
+# con "Authorization: Bearer <GAMERLY_METRICAS_TOKEN>". Con varios workers,
+# GAMERLY_METRICAS_DIR es el directorio donde cada uno vuelca las suyas
+METRICAS_TOKEN = os.environ.get('GAMERLY_METRICAS_TOKEN', '')
+METRICAS_DIR = os.environ.get('GAMERLY_METRICAS_DIR') or None
+METRICAS_VOLCADO_SEGUNDOS = int(os.environ.get('GAMERLY_METRICAS_VOLCADO_SEGUNDOS', '5'))
+
+# Perfilado bajo demanda (productos/perfilado.py): un usuario staff agrega
+# ?perfilar=1 o "X-Gamerly-Perfilar: 1" y la petición se guarda con cProfile
+# y su SQL en PERFILADO_DIR; se ven en /admin/perfiles/
+PERFILADO_ACTIVO = os.environ.get('GAMERLY_PERFILADO', '1') == '1'
+PERFILADO_DIR = os.environ.get('GAMERLY_PERFILADO_DIR', os.path.join(tempfile.gettempdir(), 'gamerly-perfiles'))
+PERFILADO_MAXIMO = int(os.environ.get('GAMERLY_PERFILADO_MAXIMO', '50'))
+
+# Consultas más lentas que esto se agrupan por huella en la caché
+# (productos/consultas_lentas.py): manage.py consultas_lentas y
+# /admin/consultas-lentas/. GAMERLY_CONSULTAS_LENTAS_MS=off para desactivarlo
+_consultas_lentas_ms = os.environ.get('GAMERLY_CONSULTAS_LENTAS_MS', '100')
+CONSULTAS_LENTAS_MS = None if _consultas_lentas_ms == 'off' else float(_consultas_lentas_ms)
+CONSULTAS_LENTAS_CACHE_SEGUNDOS = int(os.environ.get('GAMERLY_CONSULTAS_LENTAS_CACHE_SEGUNDOS', '86400'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'productos.instrumentacion.FormatoJSON'},
+        'texto': {'format': '%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s'},
+    },
+    'filters': {
+        'request_id': {'()': 'productos.instrumentacion.FiltroRequestId'},
+    },
+    'handlers': {
+        'consola': {
+            '()': 'productos.instrumentacion.ManejadorEnCola',
+            'formatter': LOG_FORMATO,
+            'filters': ['request_id'],
         },
-        'loggers': {
-            'django.core.mail': {
-                'handlers': ['console'],
-                'level': 'DEBUG',
-                'propagate': True,
-            },
+    },
+    'root': {
+        'handlers': ['consola'],
+        'level': LOG_NIVEL,
+    },
+    'loggers': {
+        # Sin los handlers por defecto de Django: todo sale por 'consola'
+        'django': {
+            'handlers': ['consola'],
+            'level': LOG_NIVEL,
+            'propagate': False,
+        },
+        'django.core.mail': {
+            'level': 'DEBUG' if DEBUG else LOG_NIVEL,
         },
-    }
\ No newline at end of file
+    },
+}
@@ -0,0 +1,15 @@
+"""
+Ajustes para los tests: los de settings.py con hash MD5 (crear usuarios no
+cuesta un PBKDF2 de un millón de iteraciones) y logs solo de errores::
+
+    python manage.py test --settings=tienda.settings_test
+
+Con otro runner, exportar DJANGO_SETTINGS_MODULE=tienda.settings_test. Las
+variables de entorno explícitas siguen teniendo prioridad.
+"""
+import os
+
+os.environ.setdefault('GAMERLY_HASHER', 'md5')
+os.environ.setdefault('GAMERLY_LOG_NIVEL', 'ERROR')
+
+from .settings import *  # noqa: E402,F401,F403
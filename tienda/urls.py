@@ -9,6 +9,7 @@ admin.site.site_title = "GAMERLY Admin"
 admin.site.index_title = "Panel de Control Gaming"
 
 urlpatterns = [
+    path('admin/', include('productos.urls_admin')),
     path('admin/', admin.site.urls),
     path('', include('productos.urls')),
 ]